@@ -0,0 +1,68 @@
+"""add simulation aggregates table
+
+Revision ID: 3f1c9a7d2b84
+Revises: 650a9a53c36d
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3f1c9a7d2b84"
+down_revision: Union[str, None] = "650a9a53c36d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "simulation_aggregates",
+        sa.Column("llm_id", sa.UUID(), nullable=False),
+        sa.Column("metric_id", sa.UUID(), nullable=False),
+        sa.Column("sample_count", sa.BigInteger(), nullable=False),
+        sa.Column("value_sum", sa.Float(), nullable=False),
+        sa.Column("value_sum_squares", sa.Float(), nullable=False),
+        sa.Column("min_value", sa.Float(), nullable=False),
+        sa.Column("max_value", sa.Float(), nullable=False),
+        sa.Column(
+            "id", sa.UUID(), nullable=False, server_default=sa.text("gen_random_uuid()")
+        ),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["llm_id"],
+            ["llms.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["metric_id"],
+            ["metrics.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "llm_id", "metric_id", name="uq_simulation_aggregates_llm_id_metric_id"
+        ),
+    )
+    # backfill the aggregates from the samples that are already stored
+    op.execute(
+        """
+        INSERT INTO simulation_aggregates
+            (llm_id, metric_id, sample_count, value_sum, value_sum_squares, min_value, max_value)
+        SELECT llm_id, metric_id, COUNT(*), SUM(value), SUM(value * value), MIN(value), MAX(value)
+        FROM simulations
+        GROUP BY llm_id, metric_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("simulation_aggregates")
@@ -0,0 +1,142 @@
+"""partition simulations by run
+
+Revision ID: 8b2e4d61c0f7
+Revises: 3f1c9a7d2b84
+Create Date: 2026-10-18 13:41:07.552913
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8b2e4d61c0f7"
+down_revision: Union[str, None] = "3f1c9a7d2b84"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _timestamps():
+    return [
+        sa.Column(
+            "id", sa.UUID(), nullable=False, server_default=sa.text("gen_random_uuid()")
+        ),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+    ]
+
+
+def upgrade() -> None:
+    op.create_table(
+        "simulation_runs",
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("is_current", sa.Boolean(), nullable=False),
+        sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True),
+        *_timestamps(),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "uq_simulation_runs_is_current",
+        "simulation_runs",
+        ["is_current"],
+        unique=True,
+        postgresql_where=sa.text("is_current"),
+    )
+
+    # Simulated data is regenerated by every run, so the existing samples are
+    # dropped instead of being migrated into a partition.
+    op.drop_table("simulation_aggregates")
+    op.drop_index("ix_simulations_metric_id", table_name="simulations")
+    op.drop_index("ix_simulations_llm_id", table_name="simulations")
+    op.drop_table("simulations")
+
+    op.create_table(
+        "simulations",
+        sa.Column("value", sa.Float(), nullable=False),
+        sa.Column("llm_id", sa.UUID(), nullable=False),
+        sa.Column("metric_id", sa.UUID(), nullable=False),
+        sa.Column("run_id", sa.UUID(), nullable=False),
+        *_timestamps(),
+        sa.ForeignKeyConstraint(["llm_id"], ["llms.id"]),
+        sa.ForeignKeyConstraint(["metric_id"], ["metrics.id"]),
+        sa.ForeignKeyConstraint(["run_id"], ["simulation_runs.id"]),
+        sa.PrimaryKeyConstraint("run_id", "id"),
+        postgresql_partition_by="LIST (run_id)",
+    )
+    op.create_index("ix_simulations_llm_id", "simulations", ["llm_id"], unique=False)
+    op.create_index(
+        "ix_simulations_metric_id", "simulations", ["metric_id"], unique=False
+    )
+
+    op.create_table(
+        "simulation_aggregates",
+        sa.Column("run_id", sa.UUID(), nullable=False),
+        sa.Column("llm_id", sa.UUID(), nullable=False),
+        sa.Column("metric_id", sa.UUID(), nullable=False),
+        sa.Column("sample_count", sa.BigInteger(), nullable=False),
+        sa.Column("value_sum", sa.Float(), nullable=False),
+        sa.Column("value_sum_squares", sa.Float(), nullable=False),
+        sa.Column("min_value", sa.Float(), nullable=False),
+        sa.Column("max_value", sa.Float(), nullable=False),
+        *_timestamps(),
+        sa.ForeignKeyConstraint(["run_id"], ["simulation_runs.id"]),
+        sa.ForeignKeyConstraint(["llm_id"], ["llms.id"]),
+        sa.ForeignKeyConstraint(["metric_id"], ["metrics.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "run_id",
+            "llm_id",
+            "metric_id",
+            name="uq_simulation_aggregates_run_id_llm_id_metric_id",
+        ),
+    )
+
+
+def downgrade() -> None:
+    # dropping the partitioned table drops the partition of every run
+    op.drop_table("simulation_aggregates")
+    op.drop_index("ix_simulations_metric_id", table_name="simulations")
+    op.drop_index("ix_simulations_llm_id", table_name="simulations")
+    op.drop_table("simulations")
+    op.drop_index("uq_simulation_runs_is_current", table_name="simulation_runs")
+    op.drop_table("simulation_runs")
+
+    op.create_table(
+        "simulations",
+        sa.Column("value", sa.Float(), nullable=False),
+        sa.Column("llm_id", sa.UUID(), nullable=False),
+        sa.Column("metric_id", sa.UUID(), nullable=False),
+        *_timestamps(),
+        sa.ForeignKeyConstraint(["llm_id"], ["llms.id"]),
+        sa.ForeignKeyConstraint(["metric_id"], ["metrics.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_simulations_llm_id", "simulations", ["llm_id"], unique=False)
+    op.create_index(
+        "ix_simulations_metric_id", "simulations", ["metric_id"], unique=False
+    )
+    op.create_table(
+        "simulation_aggregates",
+        sa.Column("llm_id", sa.UUID(), nullable=False),
+        sa.Column("metric_id", sa.UUID(), nullable=False),
+        sa.Column("sample_count", sa.BigInteger(), nullable=False),
+        sa.Column("value_sum", sa.Float(), nullable=False),
+        sa.Column("value_sum_squares", sa.Float(), nullable=False),
+        sa.Column("min_value", sa.Float(), nullable=False),
+        sa.Column("max_value", sa.Float(), nullable=False),
+        *_timestamps(),
+        sa.ForeignKeyConstraint(["llm_id"], ["llms.id"]),
+        sa.ForeignKeyConstraint(["metric_id"], ["metrics.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "llm_id", "metric_id", name="uq_simulation_aggregates_llm_id_metric_id"
+        ),
+    )
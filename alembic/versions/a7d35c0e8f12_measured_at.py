@@ -0,0 +1,31 @@
+"""add measured_at to simulations
+
+Revision ID: a7d35c0e8f12
+Revises: f2c83a6e9b41
+Create Date: 2026-10-18 19:52:37.604118
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a7d35c0e8f12"
+down_revision: Union[str, None] = "f2c83a6e9b41"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # a nullable column without a default is added to the partitions without rewriting them
+    op.add_column(
+        "simulations",
+        sa.Column("measured_at", sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("simulations", "measured_at")
@@ -0,0 +1,57 @@
+"""add percentiles to simulation aggregates
+
+Revision ID: c5a7e19f3d20
+Revises: 8b2e4d61c0f7
+Create Date: 2026-10-18 16:05:32.184470
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c5a7e19f3d20"
+down_revision: Union[str, None] = "8b2e4d61c0f7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PERCENTILES = ["p50", "p90", "p95", "p99"]
+
+
+def upgrade() -> None:
+    op.add_column(
+        "simulation_aggregates", sa.Column("sketch", sa.LargeBinary(), nullable=True)
+    )
+    for percentile in PERCENTILES:
+        op.add_column(
+            "simulation_aggregates",
+            sa.Column(percentile, sa.Float(), nullable=True),
+        )
+    # backfill the percentiles of the existing runs from their samples, their sketches stay
+    # empty as the runs are complete and no more values are folded into them
+    op.execute(
+        """
+        UPDATE simulation_aggregates AS aggregates
+        SET p50 = percentiles.p[1], p90 = percentiles.p[2],
+            p95 = percentiles.p[3], p99 = percentiles.p[4]
+        FROM (
+            SELECT run_id, llm_id, metric_id,
+                percentile_cont(ARRAY[0.5, 0.9, 0.95, 0.99])
+                    WITHIN GROUP (ORDER BY value) AS p
+            FROM simulations
+            GROUP BY run_id, llm_id, metric_id
+        ) AS percentiles
+        WHERE aggregates.run_id = percentiles.run_id
+            AND aggregates.llm_id = percentiles.llm_id
+            AND aggregates.metric_id = percentiles.metric_id
+        """
+    )
+
+
+def downgrade() -> None:
+    for percentile in reversed(PERCENTILES):
+        op.drop_column("simulation_aggregates", percentile)
+    op.drop_column("simulation_aggregates", "sketch")
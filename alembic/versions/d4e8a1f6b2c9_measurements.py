@@ -0,0 +1,196 @@
+"""move ingested measurements out of the simulation runs
+
+Revision ID: d4e8a1f6b2c9
+Revises: a7d35c0e8f12
+Create Date: 2026-10-18 22:14:09.530281
+
+"""
+
+from typing import Sequence, Union
+
+import numpy as np
+import sqlalchemy as sa
+
+from alembic import op
+from database.quantile_sketch import QuantileSketch
+
+# revision identifiers, used by Alembic.
+revision: str = "d4e8a1f6b2c9"
+down_revision: Union[str, None] = "a7d35c0e8f12"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p95": 0.95, "p99": 0.99}
+
+
+def _aggregates(values: np.ndarray) -> dict:
+    """
+    The aggregates columns of a pair, with its sketch, as SimulatorRepository folds them.
+    """
+    sketch = QuantileSketch.from_values(values)
+    return {
+        "sample_count": int(values.size),
+        "value_sum": float(values.sum()),
+        "value_sum_squares": float(np.dot(values, values)),
+        "min_value": float(values.min()),
+        "max_value": float(values.max()),
+        "sketch": sketch.to_bytes(),
+        **dict(
+            zip(PERCENTILES, map(float, sketch.quantiles(list(PERCENTILES.values()))))
+        ),
+    }
+
+
+def _values(connection, query: str, keys: dict) -> np.ndarray:
+    return np.array(
+        connection.execute(sa.text(query), keys).scalars().all(), dtype=float
+    )
+
+
+def upgrade() -> None:
+    op.create_table(
+        "measurements",
+        sa.Column("value", sa.Float(), nullable=False),
+        sa.Column("llm_id", sa.UUID(), nullable=False),
+        sa.Column("metric_id", sa.UUID(), nullable=False),
+        sa.Column("measured_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column(
+            "id", sa.UUID(), nullable=False, server_default=sa.text("gen_random_uuid()")
+        ),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["llm_id"], ["llms.id"]),
+        sa.ForeignKeyConstraint(["metric_id"], ["metrics.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_measurements_metric_id_measured_at",
+        "measurements",
+        ["metric_id", "measured_at"],
+    )
+    op.create_table(
+        "measurement_aggregates",
+        sa.Column("llm_id", sa.UUID(), nullable=False),
+        sa.Column("metric_id", sa.UUID(), nullable=False),
+        sa.Column("sample_count", sa.BigInteger(), nullable=False),
+        sa.Column("value_sum", sa.Float(), nullable=False),
+        sa.Column("value_sum_squares", sa.Float(), nullable=False),
+        sa.Column("min_value", sa.Float(), nullable=False),
+        sa.Column("max_value", sa.Float(), nullable=False),
+        sa.Column("sketch", sa.LargeBinary(), nullable=True),
+        *(
+            sa.Column(percentile, sa.Float(), nullable=True)
+            for percentile in PERCENTILES
+        ),
+        sa.Column(
+            "id", sa.UUID(), nullable=False, server_default=sa.text("gen_random_uuid()")
+        ),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["llm_id"], ["llms.id"]),
+        sa.ForeignKeyConstraint(["metric_id"], ["metrics.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "llm_id", "metric_id", name="uq_measurement_aggregates_llm_id_metric_id"
+        ),
+    )
+
+    # move the measurements ingested into the runs to their own table, and take them back out of the
+    # aggregates of the runs, rebuilt from the simulated samples left
+    connection = op.get_bind()
+    connection.execute(
+        sa.text(
+            """
+            INSERT INTO measurements (llm_id, metric_id, value, measured_at)
+            SELECT llm_id, metric_id, value, measured_at
+            FROM simulations
+            WHERE measured_at IS NOT NULL
+            """
+        )
+    )
+    run_pairs = connection.execute(
+        sa.text(
+            """
+            SELECT DISTINCT run_id, llm_id, metric_id
+            FROM simulations
+            WHERE measured_at IS NOT NULL
+            """
+        )
+    ).all()
+    connection.execute(sa.text("DELETE FROM simulations WHERE measured_at IS NOT NULL"))
+    for run_id, llm_id, metric_id in run_pairs:
+        keys = {"run_id": run_id, "llm_id": llm_id, "metric_id": metric_id}
+        values = _values(
+            connection,
+            """
+            SELECT value FROM simulations
+            WHERE run_id = :run_id AND llm_id = :llm_id AND metric_id = :metric_id
+            """,
+            keys,
+        )
+        if values.size == 0:
+            # the pair only had measurements, the simulator still has to write it
+            connection.execute(
+                sa.text(
+                    """
+                    DELETE FROM simulation_aggregates
+                    WHERE run_id = :run_id AND llm_id = :llm_id AND metric_id = :metric_id
+                    """
+                ),
+                keys,
+            )
+            continue
+        aggregates = _aggregates(values)
+        connection.execute(
+            sa.text(
+                f"""
+                UPDATE simulation_aggregates
+                SET {", ".join(f"{column} = :{column}" for column in aggregates)}, updated_at = now()
+                WHERE run_id = :run_id AND llm_id = :llm_id AND metric_id = :metric_id
+                """
+            ),
+            {**keys, **aggregates},
+        )
+
+    pairs = connection.execute(
+        sa.text("SELECT DISTINCT llm_id, metric_id FROM measurements")
+    ).all()
+    for llm_id, metric_id in pairs:
+        keys = {"llm_id": llm_id, "metric_id": metric_id}
+        values = _values(
+            connection,
+            "SELECT value FROM measurements WHERE llm_id = :llm_id AND metric_id = :metric_id",
+            keys,
+        )
+        aggregates = _aggregates(values)
+        connection.execute(
+            sa.text(
+                f"""
+                INSERT INTO measurement_aggregates (llm_id, metric_id, {", ".join(aggregates)})
+                VALUES (:llm_id, :metric_id, {", ".join(f":{column}" for column in aggregates)})
+                """
+            ),
+            {**keys, **aggregates},
+        )
+    op.drop_column("simulations", "measured_at")
+
+
+def downgrade() -> None:
+    # the measurements belong to no run, so they are dropped with their tables
+    op.add_column(
+        "simulations",
+        sa.Column("measured_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.drop_table("measurement_aggregates")
+    op.drop_index("ix_measurements_metric_id_measured_at", table_name="measurements")
+    op.drop_table("measurements")
@@ -0,0 +1,57 @@
+"""keep run history
+
+Revision ID: e4b9d2a7c618
+Revises: c5a7e19f3d20
+Create Date: 2026-10-18 17:12:48.306215
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e4b9d2a7c618"
+down_revision: Union[str, None] = "c5a7e19f3d20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "simulation_runs",
+        sa.Column(
+            "samples_retained",
+            sa.Boolean(),
+            nullable=False,
+            server_default=sa.true(),
+        ),
+    )
+    op.create_index(
+        "ix_simulation_runs_completed_at",
+        "simulation_runs",
+        ["completed_at"],
+        unique=False,
+        postgresql_using="brin",
+    )
+    op.create_index(
+        "ix_simulation_aggregates_metric_id_run_id",
+        "simulation_aggregates",
+        ["metric_id", "run_id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_simulation_aggregates_metric_id_run_id",
+        table_name="simulation_aggregates",
+    )
+    op.drop_index(
+        "ix_simulation_runs_completed_at",
+        table_name="simulation_runs",
+        postgresql_using="brin",
+    )
+    op.drop_column("simulation_runs", "samples_retained")
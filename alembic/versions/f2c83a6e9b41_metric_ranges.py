@@ -0,0 +1,77 @@
+"""add metric ranges
+
+Revision ID: f2c83a6e9b41
+Revises: e4b9d2a7c618
+Create Date: 2026-10-18 18:40:11.529307
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f2c83a6e9b41"
+down_revision: Union[str, None] = "e4b9d2a7c618"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# the ranges the simulator hardcoded for the seeded metrics
+SEEDED_RANGES = {
+    "ttft": (0.05, 2.0),
+    "tps": (10, 150),
+    "e2e_latency": (0.2, 10.0),
+    "rps": (1, 100),
+}
+
+
+def upgrade() -> None:
+    op.add_column("metrics", sa.Column("min_value", sa.Float(), nullable=True))
+    op.add_column("metrics", sa.Column("max_value", sa.Float(), nullable=True))
+    metrics = sa.table(
+        "metrics",
+        sa.column("name", sa.String),
+        sa.column("min_value", sa.Float),
+        sa.column("max_value", sa.Float),
+    )
+    for name, (min_value, max_value) in SEEDED_RANGES.items():
+        op.execute(
+            metrics.update()
+            .where(metrics.c.name == name)
+            .values(min_value=min_value, max_value=max_value)
+        )
+    # any other metric could not be simulated without a range, and fails the migration here
+    op.alter_column("metrics", "min_value", nullable=False)
+    op.alter_column("metrics", "max_value", nullable=False)
+
+    op.create_table(
+        "llm_metric_ranges",
+        sa.Column("llm_id", sa.UUID(), nullable=False),
+        sa.Column("metric_id", sa.UUID(), nullable=False),
+        sa.Column("min_value", sa.Float(), nullable=False),
+        sa.Column("max_value", sa.Float(), nullable=False),
+        sa.Column(
+            "id", sa.UUID(), nullable=False, server_default=sa.text("gen_random_uuid()")
+        ),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["llm_id"], ["llms.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["metric_id"], ["metrics.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "llm_id", "metric_id", name="uq_llm_metric_ranges_llm_id_metric_id"
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("llm_metric_ranges")
+    op.drop_column("metrics", "max_value")
+    op.drop_column("metrics", "min_value")
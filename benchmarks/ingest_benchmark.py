@@ -0,0 +1,82 @@
+"""
+Measures the rows per second of SimulatorRepository.bulk_add_metrics for every ingest mode.
+
+Every measurement runs inside a transaction that is rolled back, so the benchmark can be
+pointed at a development database without leaving data behind.
+
+Usage:
+    python -m benchmarks.ingest_benchmark --sizes 1000 100000 1000000 --repeat 3
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from database import LLMRepository, MetricRepository, SimulatorRepository
+from database.repository.simulator_repository import IngestMode
+from database.seed import seed_data
+from database.session import SessionLocal
+
+
+def measure(
+    repository: SimulatorRepository, run_id, llm_id, metric_id, values, repeat: int
+):
+    """
+    Returns the best rows per second of `repeat` rolled back bulk_add_metrics calls.
+    """
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        repository.bulk_add_metrics(run_id, llm_id, metric_id, values, commit=False)
+        elapsed = time.perf_counter() - start
+        repository.rollback()
+        best = max(best, len(values) / elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--modes",
+        nargs="+",
+        choices=[mode.value for mode in IngestMode],
+        default=[mode.value for mode in IngestMode],
+    )
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        seed_data(db)
+        llm = LLMRepository(db).get_llms()[0]
+        metric = MetricRepository(db).get_metrics()[0]
+        repository = SimulatorRepository(db)
+        run = repository.create_run()
+        rng = np.random.default_rng(0)
+
+        print(f"{'rows':>10} {'mode':>12} {'rows/s':>14} {'speedup':>8}")
+        for size in args.sizes:
+            values = np.round(rng.uniform(0, 100, size), 2)
+            baseline = None
+            for mode in args.modes:
+                repository.ingest_mode = IngestMode(mode)
+                rows_per_second = measure(
+                    repository, run.id, llm.id, metric.id, values, args.repeat
+                )
+                baseline = baseline or rows_per_second
+                print(
+                    f"{size:>10} {mode:>12} {rows_per_second:>14,.0f} "
+                    f"{rows_per_second / baseline:>7.1f}x"
+                )
+        # the run is never completed, drop its partition
+        repository.fail_run(run.id)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
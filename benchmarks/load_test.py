@@ -0,0 +1,265 @@
+"""
+Measures the requests per second and latency percentiles of the rankings APIs under concurrent load.
+
+The load runs against the app in-process through an ASGI transport, with an in-memory fakeredis server instead
+of Redis, or against a running server with --url, with the Redis configured in the environment. Both read the
+configured Postgres database. Every scenario keeps --concurrency clients sending requests for --duration seconds,
+alternating between /rankings and /rankings/{metric_name} for every metric:
+
+    hot          the rankings are cached before the load starts
+    cold         the rankings are evicted before the load starts
+    invalidated  the rankings are cached, and a new generation is announced halfway through the load
+    simulator    the rankings are cached, and a simulation run completes during the load
+
+The simulator scenario runs the simulator in this process. In-process, it then shares the CPU with the app.
+
+Usage:
+    python -m benchmarks.load_test --concurrency 50 --duration 10
+    python -m benchmarks.load_test --url http://localhost:8001 --scenarios hot cold
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from benchmarks.stand_ins import use_fakeredis
+from database import LLMRepository, MetricRepository, SimulatorRepository
+from database.session import SessionLocal
+from metric_simulator.metric_service import MetricService
+from redis_client import RedisKeys, get_redis_client
+
+API_PREFIX = "/api/v1/benchmarks"
+METRICS = ["ttft", "tps", "e2e_latency", "rps"]
+SCENARIOS = ["hot", "cold", "invalidated", "simulator"]
+
+
+class RouteResult(NamedTuple):
+    """
+    The measurements of a route during a scenario.
+    """
+
+    requests: int
+    errors: int
+    rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
+
+def request_paths(metrics: List[str]) -> List[Tuple[str, str]]:
+    """
+    Returns the route and path of every request the clients alternate between.
+    """
+    return [("/rankings", f"{API_PREFIX}/rankings")] + [
+        ("/rankings/{metric_name}", f"{API_PREFIX}/rankings/{metric}")
+        for metric in metrics
+    ]
+
+
+async def generate_load(
+    client: httpx.AsyncClient,
+    paths: List[Tuple[str, str]],
+    concurrency: int,
+    duration: float,
+    until: Optional[asyncio.Future] = None,
+) -> Dict[str, RouteResult]:
+    """
+    Sends requests from `concurrency` clients for `duration` seconds, and for as long as `until` is not done.
+
+    Returns:
+        Dict[str, RouteResult]: The measurements of every route.
+    """
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    deadline = time.perf_counter() + duration
+
+    def running() -> bool:
+        return time.perf_counter() < deadline or (
+            until is not None and not until.done()
+        )
+
+    async def send_requests(offset: int):
+        index = offset
+        while running():
+            route, path = paths[index % len(paths)]
+            index += 1
+            start = time.perf_counter()
+            try:
+                response = await client.get(path)
+                failed = response.status_code != 200
+            except httpx.HTTPError:
+                failed = True
+            latencies[route].append(time.perf_counter() - start)
+            errors[route] += failed
+
+    start = time.perf_counter()
+    await asyncio.gather(*(send_requests(offset) for offset in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    results = {}
+    for route, route_latencies in latencies.items():
+        p50, p95, p99 = np.percentile(route_latencies, [50, 95, 99]) * 1000
+        results[route] = RouteResult(
+            len(route_latencies),
+            errors[route],
+            len(route_latencies) / elapsed,
+            p50,
+            p95,
+            p99,
+        )
+    return results
+
+
+async def warm(client: httpx.AsyncClient, paths: List[Tuple[str, str]]):
+    """
+    Caches the rankings of every path.
+    """
+    for _, path in paths:
+        response = await client.get(path)
+        response.raise_for_status()
+
+
+def evict():
+    """
+    Deletes the cached rankings, and announces a new generation so the API workers drop the rankings
+    they keep in memory.
+    """
+    redis = get_redis_client().redis
+    keys = [
+        RedisKeys.BENCHMARKS.value,
+        *redis.scan_iter(f"{RedisKeys.METRIC_BENCHMARKS.value}:*"),
+    ]
+    redis.delete(*keys)
+    announce()
+
+
+def announce():
+    """
+    Announces a new generation of the rankings, as the simulator does when it could not publish them.
+    The cached rankings are then stale, and recomputed while they are still served.
+    """
+    redis = get_redis_client().redis
+    generation = redis.incr(RedisKeys.BENCHMARKS_GENERATION.value)
+    redis.publish(RedisKeys.BENCHMARKS_CHANNEL.value, generation)
+
+
+def simulate() -> float:
+    """
+    Runs the simulator once, and returns how long the run took in seconds.
+    """
+    db = SessionLocal()
+    try:
+        service = MetricService(
+            LLMRepository(db), MetricRepository(db), SimulatorRepository(db)
+        )
+        start = time.perf_counter()
+        asyncio.run(service.simulate_data_points())
+        return time.perf_counter() - start
+    finally:
+        db.close()
+
+
+async def run_scenario(
+    scenario: str,
+    client: httpx.AsyncClient,
+    paths: List[Tuple[str, str]],
+    concurrency: int,
+    duration: float,
+) -> Dict[str, RouteResult]:
+    await warm(client, paths)
+    if scenario == "cold":
+        evict()
+        # give the API workers time to receive the announcement
+        await asyncio.sleep(0.1)
+
+    background: Optional[asyncio.Future] = None
+    if scenario == "invalidated":
+
+        async def announce_halfway():
+            await asyncio.sleep(duration / 2)
+            announce()
+
+        background = asyncio.ensure_future(announce_halfway())
+    elif scenario == "simulator":
+        background = asyncio.ensure_future(asyncio.to_thread(simulate))
+
+    results = await generate_load(client, paths, concurrency, duration, background)
+    if scenario == "simulator":
+        print(f"  simulation run took {background.result():.2f}s")
+    return results
+
+
+def print_results(scenario: str, results: Dict[str, RouteResult]):
+    for route, result in sorted(results.items()):
+        print(
+            f"{scenario:<12} {route:<24} {result.requests:>9} {result.errors:>7} {result.rps:>10,.0f} "
+            f"{result.p50_ms:>9.2f} {result.p95_ms:>9.2f} {result.p99_ms:>9.2f}"
+        )
+    total = sum(result.rps for result in results.values())
+    print(f"{scenario:<12} {'total':<24} {'':>9} {'':>7} {total:>10,.0f}")
+
+
+async def run(args):
+    headers = {"X-API-Key": args.api_key}
+    limits = httpx.Limits(max_connections=args.concurrency)
+    paths = request_paths(args.metrics)
+
+    async def run_all(client_factory: Callable[[], httpx.AsyncClient]):
+        print(
+            f"{'scenario':<12} {'route':<24} {'requests':>9} {'errors':>7} {'rps':>10} "
+            f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+        )
+        async with client_factory() as client:
+            for scenario in args.scenarios:
+                results = await run_scenario(
+                    scenario, client, paths, args.concurrency, args.duration
+                )
+                print_results(scenario, results)
+
+    if args.url:
+        await run_all(
+            lambda: httpx.AsyncClient(
+                base_url=args.url, headers=headers, limits=limits, timeout=30
+            )
+        )
+        return
+
+    use_fakeredis()
+    # imported once Redis is replaced, the app is then served in this process
+    from metric_benchmark.main import app
+
+    async with app.router.lifespan_context(app):
+        await run_all(
+            lambda: httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app),
+                base_url="http://load-test",
+                headers=headers,
+                timeout=30,
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--url", help="the base URL of a running server, e.g. http://localhost:8001"
+    )
+    parser.add_argument("--api-key", default=os.getenv("API_KEY", ""))
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument(
+        "--duration", type=float, default=10, help="seconds of load per scenario"
+    )
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--metrics", nargs="+", default=METRICS)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
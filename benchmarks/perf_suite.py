@@ -0,0 +1,398 @@
+"""
+Measures the throughput and latency percentiles of the simulator and repository hot paths against stored baselines.
+
+The cases run against local stand-ins: the Postgres database configured in the environment, and an in-memory
+fakeredis server instead of Redis. Writes are rolled back. The only data left behind are the seeded LLMs and
+metrics, and a simulated run when the database has none, which the read cases need.
+
+The sized cases run once per size, the number of samples of a single LLM and metric pair. The other cases do not
+depend on the number of samples: the simulator always generates 1000 samples per pair, and the rankings are
+read from the aggregates of the current run. The generation cases look the ranges up in MetricGenerator and
+generate the work items with generate_items_data_points, like a simulation run; the registry case simulates a
+registry of GENERATED_LLMS LLMs.
+
+Usage:
+    python -m benchmarks.perf_suite --sizes 1000 100000 10000000
+    python -m benchmarks.perf_suite --check    # exit with an error if a case regressed against its baseline
+    python -m benchmarks.perf_suite --save     # store the results as the new baselines
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import redis_client
+from benchmarks.stand_ins import use_fakeredis
+from database import (
+    AsyncLLMRepository,
+    AsyncMetricRepository,
+    AsyncSimulatorRepository,
+    LLMRepository,
+    MetricRepository,
+    SimulatorRepository,
+)
+from database.registry import load_registry, registry_ranges
+from database.seed import seed_data
+from database.session import AsyncSessionLocal, SessionLocal
+from metric_benchmark.apis.benchmark_service import BenchmarkService
+from metric_benchmark.apis.local_cache import get_local_cache
+from metric_simulator.lib.metric_generator import MetricGenerator
+from metric_simulator.metric_service import (
+    MetricService,
+    _work_items,
+    generate_items_data_points,
+)
+from metric_simulator.utils import generate_data_points
+from redis_client import RedisKeys
+
+BASELINE_PATH = Path(__file__).parent / "baselines" / "perf_suite.json"
+SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+LLM_NAME = "GPT-4o"
+METRIC_NAME = "tps"
+GENERATED_LLMS = 300
+
+
+class Named(NamedTuple):
+    """
+    The id and name of an LLM or metric, as the simulator reads them from the registry.
+    """
+
+    id: Any
+    name: str
+
+
+class Benchmark(NamedTuple):
+    """
+    A measured operation, with the number of items it processes per call and untimed hooks run around each call.
+    """
+
+    operation: Callable[[], Any]
+    items: int
+    before: Optional[Callable[[], Any]] = None
+    after: Optional[Callable[[], Any]] = None
+
+
+class Result(NamedTuple):
+    """
+    The measurements of a case at a size.
+    """
+
+    key: str
+    runs: int
+    throughput: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
+
+class Suite:
+    """
+    Builds the benchmarks of every case, sharing the database sessions and the fakeredis server between them.
+    """
+
+    def __init__(self, rng: np.random.Generator):
+        self.rng = rng
+        self.db = SessionLocal()
+        self.async_db = AsyncSessionLocal()
+        self.repository = SimulatorRepository(self.db)
+        self.run = None
+        self.llm = None
+        self.metric = None
+
+    async def setup(self) -> bool:
+        """
+        Seeds the database and makes sure it has a current run. Returns False if Postgres is unreachable.
+        """
+        use_fakeredis()
+        try:
+            self.db.execute(text("SELECT 1"))
+        except OperationalError as e:
+            print(f"Postgres is unreachable, skipping the database cases: {e}")
+            return False
+
+        seed_data(self.db)
+        self.llm = next(
+            llm for llm in LLMRepository(self.db).get_llms() if llm.name == LLM_NAME
+        )
+        self.metric = next(
+            metric
+            for metric in MetricRepository(self.db).get_metrics()
+            if metric.name == METRIC_NAME
+        )
+        if self.repository.get_current_run() is None:
+            print("The database has no current run, simulating one")
+            await MetricService(
+                LLMRepository(self.db), MetricRepository(self.db), self.repository
+            ).simulate_data_points()
+        self.run = self.repository.create_run()
+        return True
+
+    async def teardown(self):
+        if self.run is not None:
+            # the run is never completed, drop its partition
+            self.repository.fail_run(self.run.id)
+        self.db.close()
+        await self.async_db.close()
+
+    def generate_data_points(self, size: int) -> Benchmark:
+        return Benchmark(
+            lambda: generate_data_points(10, 150, LLM_NAME, METRIC_NAME, size), size
+        )
+
+    def generate_items_data_points(self, size: int) -> Benchmark:
+        metric_generator = MetricGenerator(registry_ranges(load_registry()))
+        return Benchmark(
+            lambda: generate_items_data_points(
+                _work_items(
+                    None,
+                    [Named(None, LLM_NAME)],
+                    [Named(None, METRIC_NAME)],
+                    metric_generator.ranges([LLM_NAME], [METRIC_NAME]),
+                )
+            ),
+            1000,
+        )
+
+    def generate_items_data_points_all(self, size: int) -> Benchmark:
+        registry = load_registry()
+        registry["llms"] = [
+            {"name": f"LLM {index}", "company_name": "benchmark"}
+            for index in range(GENERATED_LLMS)
+        ]
+        metric_generator = MetricGenerator(registry_ranges(registry))
+        llms = [Named(None, llm["name"]) for llm in registry["llms"]]
+        metrics = [Named(None, metric["name"]) for metric in registry["metrics"]]
+        return Benchmark(
+            lambda: generate_items_data_points(
+                _work_items(
+                    None,
+                    llms,
+                    metrics,
+                    metric_generator.ranges(
+                        [llm.name for llm in llms], [metric.name for metric in metrics]
+                    ),
+                )
+            ),
+            len(llms) * len(metrics) * 1000,
+        )
+
+    def bulk_add_metrics(self, size: int) -> Benchmark:
+        values = np.round(self.rng.uniform(10, 150, size), 2)
+        return Benchmark(
+            lambda: self.repository.bulk_add_metrics(
+                self.run.id, self.llm.id, self.metric.id, values, commit=False
+            ),
+            size,
+            after=self.repository.rollback,
+        )
+
+    def metric_means(self, size: int) -> Benchmark:
+        return Benchmark(
+            lambda: self.repository.get_metric_means_by_llm(METRIC_NAME),
+            1,
+            # end the transaction, so every call reads the current run again
+            after=self.repository.rollback,
+        )
+
+    def cache_hit_local(self, size: int) -> Benchmark:
+        return Benchmark(self._service().get_simulation_and_rankings, 1)
+
+    def cache_hit_redis(self, size: int) -> Benchmark:
+        return Benchmark(
+            self._service().get_simulation_and_rankings,
+            1,
+            before=get_local_cache().clear,
+        )
+
+    def cache_miss(self, size: int) -> Benchmark:
+        async def evict():
+            get_local_cache().clear()
+            await redis_client.get_async_redis_client().delete_keys(
+                RedisKeys.BENCHMARKS.value
+            )
+
+        return Benchmark(
+            self._service().get_simulation_and_rankings,
+            1,
+            before=evict,
+            after=self.async_db.rollback,
+        )
+
+    def _service(self) -> BenchmarkService:
+        return BenchmarkService(
+            AsyncLLMRepository(self.async_db),
+            AsyncMetricRepository(self.async_db),
+            AsyncSimulatorRepository(self.async_db),
+        )
+
+
+# name: (builder, sized, needs the database)
+CASES: Dict[str, tuple] = {
+    "generate_data_points": (Suite.generate_data_points, True, False),
+    "generate_items_data_points": (Suite.generate_items_data_points, False, False),
+    "generate_items_data_points.registry": (
+        Suite.generate_items_data_points_all,
+        False,
+        False,
+    ),
+    "SimulatorRepository.bulk_add_metrics": (Suite.bulk_add_metrics, True, True),
+    "SimulatorRepository.get_metric_means_by_llm": (Suite.metric_means, False, True),
+    "BenchmarkService.rankings.hit_local": (Suite.cache_hit_local, False, True),
+    "BenchmarkService.rankings.hit_redis": (Suite.cache_hit_redis, False, True),
+    "BenchmarkService.rankings.miss": (Suite.cache_miss, False, True),
+}
+
+
+async def _call(func: Optional[Callable[[], Any]]):
+    if func is None:
+        return None
+    result = func()
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+async def measure(
+    key: str, benchmark: Benchmark, budget: float, min_runs: int, max_runs: int
+) -> Result:
+    """
+    Calls a benchmark once to warm up, then at least `min_runs` times and until `budget` seconds
+    of calls were measured or `max_runs` calls were made.
+    """
+    await _call(benchmark.before)
+    await _call(benchmark.operation)
+    await _call(benchmark.after)
+
+    is_async = inspect.iscoroutinefunction(benchmark.operation)
+    latencies = []
+    while len(latencies) < max_runs and (
+        len(latencies) < min_runs or sum(latencies) < budget
+    ):
+        await _call(benchmark.before)
+        if is_async:
+            start = time.perf_counter()
+            await benchmark.operation()
+        else:
+            start = time.perf_counter()
+            benchmark.operation()
+        latencies.append(time.perf_counter() - start)
+        await _call(benchmark.after)
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    throughput = benchmark.items * len(latencies) / sum(latencies)
+    return Result(key, len(latencies), throughput, p50, p95, p99)
+
+
+def compare(result: Result, baselines: dict, tolerance: float) -> str:
+    """
+    Returns how the median latency of a result compares with its baseline.
+    """
+    baseline = baselines.get(result.key)
+    if baseline is None:
+        return "new"
+    ratio = result.p50_ms / baseline["p50_ms"]
+    status = "REGRESSION" if ratio > 1 + tolerance else "ok"
+    return f"{ratio:.2f}x {status}"
+
+
+def load_baselines(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())["results"]
+
+
+def save_baselines(path: Path, results: List[Result]):
+    baselines = load_baselines(path)
+    for result in results:
+        baselines[result.key] = {
+            "throughput": round(result.throughput, 1),
+            "p50_ms": round(result.p50_ms, 4),
+            "p95_ms": round(result.p95_ms, 4),
+            "p99_ms": round(result.p99_ms, 4),
+        }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        json.dumps(
+            {
+                "machine": f"{platform.machine()} {platform.processor()}".strip(),
+                "python": platform.python_version(),
+                "results": dict(sorted(baselines.items())),
+            },
+            indent=2,
+        )
+        + "\n"
+    )
+
+
+async def run(args) -> List[Result]:
+    suite = Suite(np.random.default_rng(0))
+    baselines = load_baselines(args.baseline)
+    results = []
+    try:
+        has_database = await suite.setup()
+        print(
+            f"{'case':<52} {'runs':>6} {'items/s':>14} {'p50 ms':>10} {'p95 ms':>10} "
+            f"{'p99 ms':>10}  vs baseline"
+        )
+        for name in args.cases:
+            build, sized, needs_database = CASES[name]
+            if needs_database and not has_database:
+                continue
+            for size in args.sizes if sized else [None]:
+                key = f"{name}[{size}]" if sized else name
+                result = await measure(
+                    key, build(suite, size), args.budget, args.min_runs, args.max_runs
+                )
+                results.append(result)
+                print(
+                    f"{key:<52} {result.runs:>6} {result.throughput:>14,.0f} "
+                    f"{result.p50_ms:>10.3f} {result.p95_ms:>10.3f} {result.p99_ms:>10.3f}  "
+                    f"{compare(result, baselines, args.tolerance)}"
+                )
+    finally:
+        await suite.teardown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument(
+        "--budget", type=float, default=1.0, help="seconds measured per case and size"
+    )
+    parser.add_argument("--min-runs", type=int, default=3)
+    parser.add_argument("--max-runs", type=int, default=10_000)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.3,
+        help="slowdown of the median latency reported as a regression",
+    )
+    parser.add_argument("--save", action="store_true")
+    parser.add_argument("--check", action="store_true")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.save:
+        save_baselines(args.baseline, results)
+        print(f"Saved the baselines to {args.baseline}")
+    if args.check:
+        baselines = load_baselines(args.baseline)
+        if any("REGRESSION" in compare(r, baselines, args.tolerance) for r in results):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
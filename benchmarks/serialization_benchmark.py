@@ -0,0 +1,101 @@
+"""
+Measures the CPU time per request of serving cached rankings, before and after they were cached rendered.
+
+Before, a cache hit parsed the JSON entry with json.loads and the response rendered the payload again
+with json.dumps. Now a hit only parses the header line of the entry and serves the rendered payload as is.
+
+Usage:
+    python -m benchmarks.serialization_benchmark --llms 10 100 --repeat 5
+"""
+
+import argparse
+import json
+import time
+import timeit
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+from rankings import (
+    decode_cache_entry,
+    encode_cache_entry,
+    render_data,
+    render_payload,
+)
+
+METRICS = ["ttft", "tps", "e2e_latency", "rps"]
+
+
+def rankings(llms: int) -> list:
+    """
+    Returns the rankings of every metric between the given number of LLMs.
+    """
+    return [
+        {
+            metric: [
+                {"llm_name": f"LLM {rank}", "mean_value": round(100 / rank, 2)}
+                for rank in range(1, llms + 1)
+            ]
+        }
+        for metric in METRICS
+    ]
+
+
+def json_entry_hit(entry: str) -> bytes:
+    value = json.loads(entry)["value"]
+    return JSONResponse({"data": value}).body
+
+
+def json_local_hit(value: list) -> bytes:
+    return JSONResponse({"data": value}).body
+
+
+def rendered_entry_hit(entry: bytes) -> bytes:
+    body = decode_cache_entry(entry)["value"]
+    return Response(render_data(body), media_type="application/json").body
+
+
+def rendered_local_hit(body: bytes) -> bytes:
+    return Response(render_data(body), media_type="application/json").body
+
+
+def measure(func, arg, repeat: int) -> float:
+    """
+    Returns the best microseconds per call of func(arg) over `repeat` rounds.
+    """
+    timer = timeit.Timer(lambda: func(arg), timer=time.process_time)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--llms", type=int, nargs="+", default=[10, 100, 1_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'llms':>6} {'hit':>6} {'json us':>10} {'rendered us':>12} {'speedup':>8}")
+    for llms in args.llms:
+        value = rankings(llms)
+        body = render_payload(value)
+        json_entry = json.dumps({"generation": 1, "fresh_until": None, "value": value})
+        rendered_entry = encode_cache_entry(body, 1)
+        assert json.loads(json_entry_hit(json_entry)) == json.loads(
+            rendered_entry_hit(rendered_entry)
+        )
+
+        cases = [
+            ("redis", json_entry_hit, json_entry, rendered_entry_hit, rendered_entry),
+            ("local", json_local_hit, value, rendered_local_hit, body),
+        ]
+        for hit, json_func, json_arg, rendered_func, rendered_arg in cases:
+            json_us = measure(json_func, json_arg, args.repeat)
+            rendered_us = measure(rendered_func, rendered_arg, args.repeat)
+            print(
+                f"{llms:>6} {hit:>6} {json_us:>10,.1f} {rendered_us:>12,.1f} "
+                f"{json_us / rendered_us:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""
+Local stand-ins for the services the benchmarks would otherwise need.
+"""
+
+import fakeredis
+import redis
+import redis.asyncio as aioredis
+from fakeredis import aioredis as fake_aioredis
+
+import redis_client
+from redis_client import AsyncRedisClient, RedisClient
+
+
+def use_fakeredis() -> fakeredis.FakeServer:
+    """
+    Points the process-wide Redis clients at a new in-memory fakeredis server, and returns it.
+    """
+    server = fakeredis.FakeServer()
+    redis_client._redis_client = RedisClient(
+        redis.ConnectionPool(connection_class=fakeredis.FakeConnection, server=server)
+    )
+    redis_client._async_redis_client = AsyncRedisClient(
+        aioredis.ConnectionPool(
+            connection_class=fake_aioredis.FakeConnection, server=server
+        )
+    )
+    return server
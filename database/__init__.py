@@ -1,19 +1,43 @@
 from database.base_class import Base
 from database.config import settings as settings_config
 from database.models.llm import LLM
+from database.models.llm_metric_range import LLMMetricRange
+from database.models.measurement import Measurement
+from database.models.measurement_aggregate import MeasurementAggregate
 from database.models.metric import Metric
 from database.models.simulation import Simulation
-from database.repository.llm_repository import LLMRepository
-from database.repository.metric_repository import MetricRepository
-from database.repository.simulator_repository import SimulatorRepository
+from database.models.simulation_aggregate import (
+    AggregateStatistic,
+    SimulationAggregate,
+)
+from database.models.simulation_run import SimulationRun, SimulationRunStatus
+from database.repository.llm_repository import AsyncLLMRepository, LLMRepository
+from database.repository.metric_repository import (
+    AsyncMetricRepository,
+    MetricRepository,
+)
+from database.repository.simulator_repository import (
+    AsyncSimulatorRepository,
+    SimulatorRepository,
+)
 
 __all__ = [
     "Base",
     "settings_config",
     "LLM",
     "Metric",
+    "LLMMetricRange",
     "Simulation",
+    "SimulationAggregate",
+    "AggregateStatistic",
+    "SimulationRun",
+    "SimulationRunStatus",
+    "Measurement",
+    "MeasurementAggregate",
     "LLMRepository",
     "MetricRepository",
     "SimulatorRepository",
+    "AsyncLLMRepository",
+    "AsyncMetricRepository",
+    "AsyncSimulatorRepository",
 ]
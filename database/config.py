@@ -19,6 +19,12 @@ class Settings:
     DATABASE_URL: str = (
         f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_SERVER}:{POSTGRES_PORT}/{POSTGRES_DB}"
     )
+    ASYNC_DATABASE_URL: str = (
+        f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_SERVER}:{POSTGRES_PORT}/{POSTGRES_DB}"
+    )
+    INGEST_MODE: str = os.getenv("INGEST_MODE", "copy_binary")
+    RAW_RETENTION_RUNS: int = int(os.getenv("RAW_RETENTION_RUNS", "1"))
+    HISTORY_RETENTION_DAYS: int = int(os.getenv("HISTORY_RETENTION_DAYS", "30"))
     SECRET_KEY: str = os.getenv("SECRET_KEY", "")
 
 
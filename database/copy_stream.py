@@ -0,0 +1,149 @@
+import io
+import struct
+from typing import Iterable, Iterator, Sequence
+from uuid import UUID
+
+import numpy as np
+
+COPY_CHUNK_SIZE = 100_000
+
+# header of the PostgreSQL binary COPY format: signature, flags and header extension length
+_BINARY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+_BINARY_TRAILER = struct.pack(">h", -1)
+# 2000-01-01 UTC, the epoch of the binary timestamps, in seconds since the Unix epoch
+_POSTGRES_EPOCH = 946_684_800
+
+
+def _binary_row_dtype(key_count: int) -> np.dtype:
+    """
+    The layout of one (key uuid..., value float8) tuple in the binary COPY format.
+    """
+    fields = [("field_count", ">i2")]
+    for index in range(key_count):
+        fields += [(f"key_{index}_length", ">i4"), (f"key_{index}", "V16")]
+    fields += [("value_length", ">i4"), ("value", ">f8")]
+    return np.dtype(fields)
+
+
+def binary_copy_chunks(
+    keys: Sequence[UUID], values: np.ndarray, chunk_size: int = COPY_CHUNK_SIZE
+) -> Iterator[bytes]:
+    """
+    Encodes simulation values as a PostgreSQL binary COPY stream of (key..., value) rows,
+    where the UUID keys are the same for every row.
+    Rows are laid out with a structured NumPy array, so no Python object is created per row.
+
+    Args:
+        keys (Sequence[UUID]): The UUID columns preceding the value, e.g. run, LLM and metric IDs.
+        values (np.ndarray): The simulation values.
+        chunk_size (int): The number of rows encoded per chunk.
+
+    Returns:
+        Iterator[bytes]: The chunks of the COPY stream, including header and trailer.
+    """
+    row_dtype = _binary_row_dtype(len(keys))
+    yield _BINARY_HEADER
+    for start in range(0, len(values), chunk_size):
+        end = start + chunk_size
+        chunk = values[start:end]
+        rows = np.empty(len(chunk), dtype=row_dtype)
+        rows["field_count"] = len(keys) + 1
+        for index, key in enumerate(keys):
+            rows[f"key_{index}_length"] = 16
+            rows[f"key_{index}"] = np.void(key.bytes)
+        rows["value_length"] = 8
+        rows["value"] = chunk
+        yield rows.tobytes()
+    yield _BINARY_TRAILER
+
+
+def binary_measurement_chunks(
+    llm_ids: np.ndarray,
+    metric_ids: np.ndarray,
+    values: np.ndarray,
+    measured_at: np.ndarray,
+    chunk_size: int = COPY_CHUNK_SIZE,
+) -> Iterator[bytes]:
+    """
+    Encodes measurements as a PostgreSQL binary COPY stream of (llm_id, metric_id, value, measured_at) rows.
+    Like binary_copy_chunks, the rows are laid out with a structured NumPy array.
+
+    Args:
+        llm_ids (np.ndarray): The LLM ID of each measurement, as 16 byte voids.
+        metric_ids (np.ndarray): The metric ID of each measurement, as 16 byte voids.
+        values (np.ndarray): The measured values.
+        measured_at (np.ndarray): When each value was measured, in seconds since the Unix epoch.
+        chunk_size (int): The number of rows encoded per chunk.
+
+    Returns:
+        Iterator[bytes]: The chunks of the COPY stream, including header and trailer.
+    """
+    row_dtype = _binary_row_dtype(2)
+    row_dtype = np.dtype(
+        row_dtype.descr + [("measured_at_length", ">i4"), ("measured_at", ">i8")]
+    )
+    # timestamps are sent as microseconds since 2000-01-01 UTC
+    microseconds = np.round(
+        (np.asarray(measured_at, dtype=float) - _POSTGRES_EPOCH) * 1e6
+    ).astype(np.int64)
+    yield _BINARY_HEADER
+    for start in range(0, len(values), chunk_size):
+        end = start + chunk_size
+        rows = np.empty(len(values[start:end]), dtype=row_dtype)
+        rows["field_count"] = 4
+        rows["key_0_length"] = rows["key_1_length"] = 16
+        rows["key_0"] = llm_ids[start:end]
+        rows["key_1"] = metric_ids[start:end]
+        rows["value_length"] = 8
+        rows["value"] = values[start:end]
+        rows["measured_at_length"] = 8
+        rows["measured_at"] = microseconds[start:end]
+        yield rows.tobytes()
+    yield _BINARY_TRAILER
+
+
+def text_copy_chunks(
+    keys: Sequence[UUID], values: np.ndarray, chunk_size: int = COPY_CHUNK_SIZE
+) -> Iterator[bytes]:
+    """
+    Encodes simulation values as a PostgreSQL text COPY stream of (key..., value) rows,
+    where the UUID keys are the same for every row.
+
+    Args:
+        keys (Sequence[UUID]): The UUID columns preceding the value, e.g. run, LLM and metric IDs.
+        values (np.ndarray): The simulation values.
+        chunk_size (int): The number of rows encoded per chunk.
+
+    Returns:
+        Iterator[bytes]: The chunks of the COPY stream.
+    """
+    prefix = "".join(f"{key}\t" for key in keys)
+    for start in range(0, len(values), chunk_size):
+        end = start + chunk_size
+        lines = np.char.add(prefix, values[start:end].astype(str))
+        yield ("\n".join(lines.tolist()) + "\n").encode()
+
+
+class ChunkStream(io.RawIOBase):
+    """
+    A read-only file object over an iterable of byte chunks, as expected by cursor.copy_expert.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
@@ -0,0 +1,38 @@
+from sqlalchemy import Column, Float, ForeignKey, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
+
+from database.base_class import Base
+
+
+class LLMMetricRange(Base):
+    """
+    The range the data points of a metric are simulated in for one LLM, overriding the range of the metric.
+    """
+
+    __tablename__ = "llm_metric_ranges"
+    llm_id = Column(
+        UUID(as_uuid=True), ForeignKey("llms.id", ondelete="CASCADE"), nullable=False
+    )
+    metric_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("metrics.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    min_value = Column(Float, nullable=False)
+    max_value = Column(Float, nullable=False)
+
+    llm = relationship("LLM")
+    metric = relationship("Metric")
+
+    __table_args__ = (
+        UniqueConstraint(
+            llm_id, metric_id, name="uq_llm_metric_ranges_llm_id_metric_id"
+        ),
+    )
+
+    def __repr__(self):
+        return (
+            f"<LLMMetricRange(id={self.id}, llm_id={self.llm_id}, metric_id={self.metric_id}, "
+            f"min_value={self.min_value}, max_value={self.max_value})>"
+        )
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
+
+from database.base_class import Base
+
+
+class Measurement(Base):
+    """
+    A measurement taken outside the simulator and ingested through the API, e.g. by a load generator
+    benchmarking a real deployment. Measurements do not belong to a simulation run, so the retention
+    of the runs never drops them.
+    """
+
+    __tablename__ = "measurements"
+    value = Column(Float, nullable=False)
+    llm_id = Column(UUID(as_uuid=True), ForeignKey("llms.id"), nullable=False)
+    metric_id = Column(UUID(as_uuid=True), ForeignKey("metrics.id"), nullable=False)
+    measured_at = Column(DateTime(timezone=True), nullable=False)
+
+    llm = relationship("LLM")
+    metric = relationship("Metric")
+
+    __table_args__ = (
+        # The history and the export of a metric read its measurements by time range
+        Index("ix_measurements_metric_id_measured_at", metric_id, measured_at),
+    )
+
+    def __repr__(self):
+        return (
+            f"<Measurement(id={self.id}, value={self.value}, llm_id={self.llm_id}, "
+            f"metric_id={self.metric_id}, measured_at={self.measured_at}>"
+        )
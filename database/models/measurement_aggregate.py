@@ -0,0 +1,53 @@
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Float,
+    ForeignKey,
+    LargeBinary,
+    UniqueConstraint,
+)
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
+
+from database.base_class import Base
+
+
+class MeasurementAggregate(Base):
+    """
+    Running aggregates of all the measurements of each (llm, metric), across simulation runs.
+    It is kept up to date by SimulatorRepository.add_measurements so the measured rankings
+    can be read without scanning the measurements table. Like the simulation aggregates,
+    the percentiles are estimated from a mergeable quantile sketch stored with them.
+    """
+
+    __tablename__ = "measurement_aggregates"
+    llm_id = Column(UUID(as_uuid=True), ForeignKey("llms.id"), nullable=False)
+    metric_id = Column(UUID(as_uuid=True), ForeignKey("metrics.id"), nullable=False)
+    sample_count = Column(BigInteger, nullable=False, default=0)
+    value_sum = Column(Float, nullable=False, default=0)
+    value_sum_squares = Column(Float, nullable=False, default=0)
+    min_value = Column(Float, nullable=False)
+    max_value = Column(Float, nullable=False)
+    sketch = Column(LargeBinary, nullable=True)
+    p50 = Column(Float, nullable=True)
+    p90 = Column(Float, nullable=True)
+    p95 = Column(Float, nullable=True)
+    p99 = Column(Float, nullable=True)
+
+    llm = relationship("LLM")
+    metric = relationship("Metric")
+
+    __table_args__ = (
+        UniqueConstraint(
+            llm_id,
+            metric_id,
+            name="uq_measurement_aggregates_llm_id_metric_id",
+        ),
+    )
+
+    def __repr__(self):
+        return (
+            f"<MeasurementAggregate(id={self.id}, llm_id={self.llm_id}, "
+            f"metric_id={self.metric_id}, "
+            f"sample_count={self.sample_count}, value_sum={self.value_sum}>"
+        )
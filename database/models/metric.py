@@ -1,11 +1,18 @@
-from sqlalchemy import Column, String
+from sqlalchemy import Column, Float, String
 
 from database.base_class import Base
 
 
 class Metric(Base):
+    """
+    A metric the LLMs are benchmarked on. Its data points are simulated between min_value and
+    max_value, unless an LLM overrides the range with an LLMMetricRange.
+    """
+
     __tablename__ = "metrics"
     name = Column(String, unique=True, nullable=False)
+    min_value = Column(Float, nullable=False)
+    max_value = Column(Float, nullable=False)
 
     def __repr__(self):
         return f"<Metric(id={self.id}, name={self.name}>"
@@ -6,22 +6,32 @@ from database.base_class import Base
 
 
 class Simulation(Base):
+    """
+    A simulated sample. The table is list partitioned by run_id, with one partition per simulation run.
+    """
+
     __tablename__ = "simulations"
     value = Column(Float, nullable=False)
     llm_id = Column(UUID(as_uuid=True), ForeignKey("llms.id"), nullable=False)
     metric_id = Column(UUID(as_uuid=True), ForeignKey("metrics.id"), nullable=False)
+    # the partition key has to be part of the primary key
+    run_id = Column(
+        UUID(as_uuid=True), ForeignKey("simulation_runs.id"), primary_key=True
+    )
 
     llm = relationship("LLM")
     metric = relationship("Metric")
+    run = relationship("SimulationRun")
 
     # Add indexes
     __table_args__ = (
         Index("ix_simulations_llm_id", llm_id),
         Index("ix_simulations_metric_id", metric_id),
+        {"postgresql_partition_by": "LIST (run_id)"},
     )
 
     def __repr__(self):
         return (
             f"<Simulation(id={self.id}, value={self.value}, llm_id={self.llm_id}, "
-            f"metric_id={self.metric_id}, llm={self.llm}, metric={self.metric}>"
+            f"metric_id={self.metric_id}, run_id={self.run_id}, llm={self.llm}, metric={self.metric}>"
         )
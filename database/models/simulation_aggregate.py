@@ -0,0 +1,87 @@
+from enum import Enum
+from typing import Optional
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Float,
+    ForeignKey,
+    Index,
+    LargeBinary,
+    UniqueConstraint,
+)
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
+
+from database.base_class import Base
+
+
+class AggregateStatistic(Enum):
+    """
+    Enum for defining the statistics the LLMs can be ranked by.
+    """
+
+    MEAN = "mean"
+    P50 = "p50"
+    P90 = "p90"
+    P95 = "p95"
+    P99 = "p99"
+
+    @property
+    def quantile(self) -> Optional[float]:
+        """
+        The quantile of a percentile statistic, None for the mean.
+        """
+        if self == AggregateStatistic.MEAN:
+            return None
+        return int(self.value[1:]) / 100
+
+
+class SimulationAggregate(Base):
+    """
+    Running aggregates of the simulation values for each (run, llm, metric).
+    It is kept up to date by SimulatorRepository.bulk_add_metrics so rankings
+    can be read without scanning the simulations table.
+    The percentiles are estimated from a mergeable quantile sketch of the values,
+    which is stored with them so later batches can be folded in. The sketch is dropped
+    once the run is only kept as history.
+    """
+
+    __tablename__ = "simulation_aggregates"
+    run_id = Column(
+        UUID(as_uuid=True), ForeignKey("simulation_runs.id"), nullable=False
+    )
+    llm_id = Column(UUID(as_uuid=True), ForeignKey("llms.id"), nullable=False)
+    metric_id = Column(UUID(as_uuid=True), ForeignKey("metrics.id"), nullable=False)
+    sample_count = Column(BigInteger, nullable=False, default=0)
+    value_sum = Column(Float, nullable=False, default=0)
+    value_sum_squares = Column(Float, nullable=False, default=0)
+    min_value = Column(Float, nullable=False)
+    max_value = Column(Float, nullable=False)
+    sketch = Column(LargeBinary, nullable=True)
+    p50 = Column(Float, nullable=True)
+    p90 = Column(Float, nullable=True)
+    p95 = Column(Float, nullable=True)
+    p99 = Column(Float, nullable=True)
+
+    run = relationship("SimulationRun")
+    llm = relationship("LLM")
+    metric = relationship("Metric")
+
+    __table_args__ = (
+        UniqueConstraint(
+            run_id,
+            llm_id,
+            metric_id,
+            name="uq_simulation_aggregates_run_id_llm_id_metric_id",
+        ),
+        # The history of a metric reads its aggregates across many runs
+        Index("ix_simulation_aggregates_metric_id_run_id", metric_id, run_id),
+    )
+
+    def __repr__(self):
+        return (
+            f"<SimulationAggregate(id={self.id}, run_id={self.run_id}, llm_id={self.llm_id}, "
+            f"metric_id={self.metric_id}, "
+            f"sample_count={self.sample_count}, value_sum={self.value_sum}>"
+        )
@@ -0,0 +1,59 @@
+from enum import Enum
+
+from sqlalchemy import Boolean, Column, DateTime, Index, String
+
+from database.base_class import Base
+
+
+class SimulationRunStatus(Enum):
+    """
+    Enum for defining the lifecycle states of a simulation run.
+    """
+
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class SimulationRun(Base):
+    """
+    A generation of simulated data. The samples of each run live in their own
+    partition of the simulations table, and readers follow the current run.
+    Completed runs are kept as history through their aggregates once their samples
+    are dropped.
+    """
+
+    __tablename__ = "simulation_runs"
+    status = Column(String, nullable=False, default=SimulationRunStatus.RUNNING.value)
+    is_current = Column(Boolean, nullable=False, default=False)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+    samples_retained = Column(Boolean, nullable=False, default=True)
+
+    __table_args__ = (
+        # At most one run can be current at a time
+        Index(
+            "uq_simulation_runs_is_current",
+            is_current,
+            unique=True,
+            postgresql_where=is_current,
+        ),
+        # Runs complete in order, so a BRIN index keeps range scans of the history small
+        Index(
+            "ix_simulation_runs_completed_at",
+            completed_at,
+            postgresql_using="brin",
+        ),
+    )
+
+    @property
+    def partition_name(self) -> str:
+        """
+        The name of the simulations partition holding the samples of the run.
+        """
+        return f"simulations_{self.id.hex}"
+
+    def __repr__(self):
+        return (
+            f"<SimulationRun(id={self.id}, status={self.status}, is_current={self.is_current}, "
+            f"completed_at={self.completed_at}, samples_retained={self.samples_retained}>"
+        )
@@ -0,0 +1,167 @@
+import math
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+DEFAULT_COMPRESSION = 200
+
+# compression, min and max precede the centroid means and weights in the serialized sketch
+_HEADER_SIZE = 3
+
+
+def _compress(
+    means: np.ndarray, weights: np.ndarray, compression: float
+) -> Sequence[np.ndarray]:
+    """
+    Merges neighbouring centroids whose quantiles fall in the same unit of the
+    t-digest k1 scale, which keeps centroids small in the tails and large around the median.
+    """
+    order = np.argsort(means, kind="stable")
+    means, weights = means[order], weights[order]
+
+    cumulative = np.cumsum(weights)
+    quantiles = (cumulative - weights / 2) / cumulative[-1]
+    scale = compression / (2 * math.pi) * np.arcsin(2 * quantiles - 1)
+    buckets = np.floor(scale)
+
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    merged_weights = np.add.reduceat(weights, starts)
+    merged_means = np.add.reduceat(means * weights, starts) / merged_weights
+    return merged_means, merged_weights
+
+
+class QuantileSketch:
+    """
+    A mergeable quantile sketch in the style of a merging t-digest.
+
+    The values are summarized by at most about `compression / 2` weighted centroids,
+    so the sketch of a run has a fixed size no matter how many samples it holds.
+    Two sketches are merged by compressing their centroids together, which lets
+    the simulator fold every batch it writes into the sketch of its (run, llm, metric).
+    """
+
+    def __init__(
+        self,
+        means: Optional[np.ndarray] = None,
+        weights: Optional[np.ndarray] = None,
+        min_value: float = math.inf,
+        max_value: float = -math.inf,
+        compression: float = DEFAULT_COMPRESSION,
+    ):
+        """
+        Initializes a sketch from its centroids. Use from_values to build one from samples.
+        """
+        self.means = np.empty(0) if means is None else np.asarray(means, dtype=float)
+        self.weights = (
+            np.empty(0) if weights is None else np.asarray(weights, dtype=float)
+        )
+        self.min_value = float(min_value)
+        self.max_value = float(max_value)
+        self.compression = float(compression)
+
+    @classmethod
+    def from_values(
+        cls,
+        values: Union[Sequence[float], np.ndarray],
+        compression: float = DEFAULT_COMPRESSION,
+    ) -> "QuantileSketch":
+        """
+        Builds the sketch of a batch of values.
+
+        Args:
+            values (Union[Sequence[float], np.ndarray]): The values to summarize.
+            compression (float): Bounds the number of centroids, higher is more accurate.
+
+        Returns:
+            QuantileSketch: The sketch of the values.
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        if values.size == 0:
+            return cls(compression=compression)
+        means, weights = _compress(values, np.ones_like(values), compression)
+        return cls(means, weights, values.min(), values.max(), compression)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "QuantileSketch":
+        """
+        Restores a sketch serialized with to_bytes.
+        """
+        array = np.frombuffer(data, dtype="<f8")
+        compression, min_value, max_value = array[:_HEADER_SIZE]
+        centroids = array[_HEADER_SIZE:].reshape(2, -1)
+        return cls(
+            centroids[0].copy(),
+            centroids[1].copy(),
+            min_value,
+            max_value,
+            compression,
+        )
+
+    def to_bytes(self) -> bytes:
+        """
+        Serializes the sketch as little-endian doubles, to be stored in a bytea column.
+        """
+        header = [self.compression, self.min_value, self.max_value]
+        return (
+            np.concatenate((header, self.means, self.weights)).astype("<f8").tobytes()
+        )
+
+    @property
+    def count(self) -> float:
+        """
+        The number of values summarized by the sketch.
+        """
+        return float(self.weights.sum())
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """
+        Returns the sketch of the values of both sketches.
+
+        Args:
+            other (QuantileSketch): The sketch to merge with.
+
+        Returns:
+            QuantileSketch: A new sketch, the merged sketches are left untouched.
+        """
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            return other
+        means, weights = _compress(
+            np.concatenate((self.means, other.means)),
+            np.concatenate((self.weights, other.weights)),
+            self.compression,
+        )
+        return QuantileSketch(
+            means,
+            weights,
+            min(self.min_value, other.min_value),
+            max(self.max_value, other.max_value),
+            self.compression,
+        )
+
+    def quantiles(self, quantiles: Sequence[float]) -> np.ndarray:
+        """
+        Estimates several quantiles by interpolating between the centroids.
+
+        Args:
+            quantiles (Sequence[float]): The quantiles to estimate, between 0 and 1.
+
+        Returns:
+            np.ndarray: The estimated values, NaN if the sketch is empty.
+        """
+        quantiles = np.asarray(quantiles, dtype=float)
+        if self.count == 0:
+            return np.full(quantiles.shape, np.nan)
+
+        total = self.count
+        centers = np.cumsum(self.weights) - self.weights / 2
+        ranks = np.concatenate(([0.0], centers, [total]))
+        values = np.concatenate(([self.min_value], self.means, [self.max_value]))
+        return np.interp(quantiles * total, ranks, values)
+
+    def quantile(self, quantile: float) -> float:
+        """
+        Estimates a single quantile, see quantiles.
+        """
+        return float(self.quantiles([quantile])[0])
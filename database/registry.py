@@ -0,0 +1,64 @@
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+REGISTRY_FILE = os.getenv(
+    "REGISTRY_FILE", str(Path(__file__).with_name("registry.json"))
+)
+
+
+def load_registry(path: str = REGISTRY_FILE) -> Dict[str, Any]:
+    """
+    Loads the registry of LLMs and metrics from a JSON file.
+
+    The file lists the metrics with the range their data points are simulated in, and the LLMs with
+    the company behind them. An LLM can override the range of a metric, e.g.
+    {"name": "GPT-4o", "company_name": "openai", "ranges": {"ttft": {"min_value": 0.1, "max_value": 1.5}}}
+
+    Args:
+        path (str): The path of the file. Defaults to REGISTRY_FILE.
+
+    Returns:
+        Dict[str, Any]: The "metrics" and "llms" of the registry.
+
+    Raises:
+        ValueError: If an LLM overrides the range of a metric the registry does not list.
+    """
+    with open(path) as file:
+        registry = json.load(file)
+    registry.setdefault("metrics", [])
+    registry.setdefault("llms", [])
+
+    metric_names = {metric["name"] for metric in registry["metrics"]}
+    for llm in registry["llms"]:
+        for metric_name in llm.get("ranges", {}):
+            if metric_name not in metric_names:
+                raise ValueError(
+                    f"LLM {llm['name']} overrides the range of unknown metric {metric_name}"
+                )
+    return registry
+
+
+def registry_ranges(registry: Dict[str, Any]) -> List[Tuple[str, str, float, float]]:
+    """
+    Returns the range of every LLM and metric pair of a registry, as rows of
+    (llm name, metric name, min value, max value) like LLMRepository.get_metric_ranges.
+    """
+    return [
+        (
+            llm["name"],
+            metric["name"],
+            *_range(llm.get("ranges", {}).get(metric["name"], metric)),
+        )
+        for llm in registry["llms"]
+        for metric in registry["metrics"]
+    ]
+
+
+def _range(values: Dict[str, Any]) -> Tuple[float, float]:
+    return float(values["min_value"]), float(values["max_value"])
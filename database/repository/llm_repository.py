@@ -1,10 +1,12 @@
-from typing import List
+from typing import List, Tuple
 
 from fastapi import Depends
+from sqlalchemy import and_, func, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from database import LLM
-from database.session import get_db
+from database import LLM, LLMMetricRange, Metric
+from database.session import get_async_db, get_db
 
 
 class LLMRepository:
@@ -27,3 +29,52 @@ class LLMRepository:
         """
         llms = self.db.query(LLM).all()
         return llms
+
+    def get_metric_ranges(self) -> List[Tuple[str, str, float, float]]:
+        """
+        Retrieves the range the data points of every LLM and metric pair are simulated in, the
+        range of the metric unless the LLM overrides it.
+        Returns:
+            List[Tuple[str, str, float, float]]: The LLM name, metric name, min value and max value of each pair.
+        """
+        rows = (
+            self.db.query(
+                LLM.name,
+                Metric.name,
+                func.coalesce(LLMMetricRange.min_value, Metric.min_value),
+                func.coalesce(LLMMetricRange.max_value, Metric.max_value),
+            )
+            .select_from(LLM)
+            .join(Metric, true())
+            .outerjoin(
+                LLMMetricRange,
+                and_(
+                    LLMMetricRange.llm_id == LLM.id,
+                    LLMMetricRange.metric_id == Metric.id,
+                ),
+            )
+            .all()
+        )
+        return [tuple(row) for row in rows]
+
+
+class AsyncLLMRepository:
+    """
+    This class handles database operations related to LLMs using an async session.
+    It provides a method to retrieve all LLMs from the database.
+    """
+
+    def __init__(self, db: AsyncSession = Depends(get_async_db)):
+        """
+        Initializes the AsyncLLMRepository with an async database session.
+        """
+        self.db = db
+
+    async def get_llms(self) -> List[LLM]:
+        """
+        Retrieves all LLMs from the database.
+        Returns:
+            List[LLM]: A list of all LLMs.
+        """
+        result = await self.db.execute(select(LLM))
+        return result.scalars().all()
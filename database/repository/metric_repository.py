@@ -1,10 +1,12 @@
 from typing import List
 
 from fastapi import Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from database import Metric
-from database.session import get_db
+from database.session import get_async_db, get_db
 
 
 class MetricRepository:
@@ -38,3 +40,38 @@ class MetricRepository:
         """
         metric = self.db.query(Metric).filter(Metric.name == metric_name).first()
         return metric
+
+
+class AsyncMetricRepository:
+    """
+    This class handles database operations related to metrics using an async session.
+    It provides a method to retrieve all metrics from the database.
+    """
+
+    def __init__(self, db: AsyncSession = Depends(get_async_db)):
+        """
+        Initializes the AsyncMetricRepository with an async database session.
+        """
+        self.db = db
+
+    async def get_metrics(self) -> List[Metric]:
+        """
+        Retrieves all metrics from the database.
+        Returns:
+            List[Metric]: A list of all metrics.
+        """
+        result = await self.db.execute(select(Metric))
+        return result.scalars().all()
+
+    async def get_metric_by_name(self, metric_name: str) -> Metric:
+        """
+        Retrieves a metric by its name from the database.
+        Args:
+            metric_name (str): The name of the metric to retrieve.
+        Returns:
+            Metric: The metric with the specified name.
+        """
+        result = await self.db.execute(
+            select(Metric).filter(Metric.name == metric_name).limit(1)
+        )
+        return result.scalars().first()
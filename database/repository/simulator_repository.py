@@ -1,18 +1,377 @@
-from typing import List, Tuple
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import (
+    AsyncIterator,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+)
 from uuid import UUID
 
+import numpy as np
 from fastapi import Depends
-from sqlalchemy import func, insert
+from sqlalchemy import (
+    Float,
+    Row,
+    and_,
+    cast,
+    func,
+    insert,
+    select,
+    text,
+    type_coerce,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from database import LLM, Metric, Simulation
-from database.session import get_db
+from database import (
+    LLM,
+    AggregateStatistic,
+    Measurement,
+    MeasurementAggregate,
+    Metric,
+    Simulation,
+    SimulationAggregate,
+    SimulationRun,
+    SimulationRunStatus,
+    settings_config,
+)
+from database.copy_stream import (
+    ChunkStream,
+    binary_copy_chunks,
+    binary_measurement_chunks,
+    text_copy_chunks,
+)
+from database.quantile_sketch import QuantileSketch
+from database.session import get_async_db, get_db
+
+COPY_READ_SIZE = 1 << 20
+SAMPLE_CHUNK_SIZE = 10_000
+PERCENTILES = [
+    statistic for statistic in AggregateStatistic if statistic.quantile is not None
+]
+
+Aggregate = Type[Union[SimulationAggregate, MeasurementAggregate]]
+
+
+class IngestMode(Enum):
+    """
+    Enum for defining how simulation values are written to the database.
+    """
+
+    INSERT = "insert"
+    COPY_TEXT = "copy_text"
+    COPY_BINARY = "copy_binary"
+
+
+def _simulation_rows(
+    run_id: UUID,
+    llm_id: UUID,
+    metric_id: UUID,
+    metrics: Union[List[float], np.ndarray],
+) -> List[dict]:
+    return [
+        {"run_id": run_id, "llm_id": llm_id, "metric_id": metric_id, "value": value}
+        for value in np.asarray(metrics, dtype=float).tolist()
+    ]
+
+
+def _aggregates_upsert(
+    aggregate: Aggregate,
+    keys: dict,
+    metrics: Union[List[float], np.ndarray],
+    sketch: QuantileSketch,
+):
+    """
+    Builds the statement folding a batch of values into the aggregates row of the given keys,
+    e.g. of a (run, llm, metric) of the simulation aggregates. The sketch must already include
+    the values of the batch, merged with the stored sketch of the row if there is one.
+    Returns None if there are no values.
+    """
+    values = np.asarray(metrics, dtype=float)
+    if values.size == 0:
+        return None
+
+    percentiles = sketch.quantiles([statistic.quantile for statistic in PERCENTILES])
+    statement = pg_insert(aggregate).values(
+        **keys,
+        sample_count=int(values.size),
+        value_sum=float(values.sum()),
+        value_sum_squares=float(np.dot(values, values)),
+        min_value=float(values.min()),
+        max_value=float(values.max()),
+        sketch=sketch.to_bytes(),
+        **{
+            statistic.value: float(value)
+            for statistic, value in zip(PERCENTILES, percentiles)
+        },
+    )
+    excluded = statement.excluded
+    return statement.on_conflict_do_update(
+        index_elements=[getattr(aggregate, key) for key in keys],
+        set_={
+            "sample_count": aggregate.sample_count + excluded.sample_count,
+            "value_sum": aggregate.value_sum + excluded.value_sum,
+            "value_sum_squares": aggregate.value_sum_squares
+            + excluded.value_sum_squares,
+            "min_value": func.least(aggregate.min_value, excluded.min_value),
+            "max_value": func.greatest(aggregate.max_value, excluded.max_value),
+            "sketch": excluded.sketch,
+            **{statistic.value: excluded[statistic.value] for statistic in PERCENTILES},
+            "updated_at": func.now(),
+        },
+    )
+
+
+def _stored_sketch_query(aggregate: Aggregate, keys: dict):
+    return select(aggregate.sketch).where(
+        *(getattr(aggregate, key) == value for key, value in keys.items())
+    )
+
+
+def _pair_lock(*keys: UUID):
+    # a transaction level advisory lock, which a transaction can take again, unlike row locks it also
+    # covers pairs without an aggregates row yet. Pairs are locked by (run, llm, metric), and by
+    # (llm, metric) for the measurements, whose aggregates span the runs
+    return select(
+        func.pg_advisory_xact_lock(
+            func.hashtextextended(":".join(str(key) for key in keys), 0)
+        )
+    )
+
+
+def _create_partition(run: SimulationRun):
+    return text(
+        f'CREATE TABLE IF NOT EXISTS "{run.partition_name}" '
+        f"PARTITION OF {Simulation.__tablename__} FOR VALUES IN ('{run.id}')"
+    )
+
+
+def _drop_partition(run: SimulationRun):
+    return text(f'DROP TABLE IF EXISTS "{run.partition_name}"')
+
+
+def _current_run_id():
+    return (
+        select(SimulationRun.id)
+        .where(SimulationRun.is_current.is_(True))
+        .scalar_subquery()
+    )
+
+
+def _mean_value(aggregate: Aggregate):
+    return (aggregate.value_sum / type_coerce(aggregate.sample_count, Float)).label(
+        "mean_value"
+    )
+
+
+def _statistic_value(statistic: AggregateStatistic, aggregate: Aggregate):
+    if statistic == AggregateStatistic.MEAN:
+        return _mean_value(aggregate)
+    return getattr(aggregate, statistic.value).label(f"{statistic.value}_value")
+
+
+def _statistic_by_llm_query(
+    aggregate: Aggregate, metric_name: str, statistic: AggregateStatistic, *conditions
+):
+    value = _statistic_value(statistic, aggregate)
+    return (
+        select(LLM.name.label("llm_name"), value)
+        .join(aggregate.llm)
+        .join(aggregate.metric)
+        .filter(Metric.name == metric_name, *conditions)
+        .order_by(value.desc())
+    )
+
+
+def _metric_statistic_by_llm_query(metric_name: str, statistic: AggregateStatistic):
+    return _statistic_by_llm_query(
+        SimulationAggregate,
+        metric_name,
+        statistic,
+        SimulationAggregate.run_id == _current_run_id(),
+    )
+
+
+def _measured_statistic_by_llm_query(metric_name: str, statistic: AggregateStatistic):
+    return _statistic_by_llm_query(MeasurementAggregate, metric_name, statistic)
+
+
+def _rankings_query(aggregate: Aggregate, *conditions):
+    mean_value = _mean_value(aggregate)
+    rank = (
+        func.row_number()
+        .over(partition_by=Metric.id, order_by=mean_value.desc())
+        .label("rank")
+    )
+    return (
+        select(
+            Metric.name.label("metric_name"),
+            LLM.name.label("llm_name"),
+            mean_value,
+            rank,
+        )
+        .select_from(Metric)
+        .outerjoin(aggregate, and_(aggregate.metric_id == Metric.id, *conditions))
+        .outerjoin(LLM, LLM.id == aggregate.llm_id)
+        .order_by(Metric.created_at, Metric.name, rank)
+    )
+
+
+def _metric_rankings_query():
+    return _rankings_query(
+        SimulationAggregate, SimulationAggregate.run_id == _current_run_id()
+    )
+
+
+def _measured_rankings_query():
+    return _rankings_query(MeasurementAggregate)
+
+
+def _current_run_query():
+    return select(SimulationRun).where(SimulationRun.is_current.is_(True))
+
+
+def _samples_query(
+    run_id: Optional[UUID], llm_name: Optional[str], metric_name: Optional[str]
+):
+    query = (
+        select(
+            Simulation.run_id,
+            LLM.name.label("llm_name"),
+            Metric.name.label("metric_name"),
+            Simulation.value,
+        )
+        .join(Simulation.llm)
+        .join(Simulation.metric)
+        .filter(
+            Simulation.run_id == (run_id if run_id is not None else _current_run_id())
+        )
+    )
+    if llm_name is not None:
+        query = query.filter(LLM.name == llm_name)
+    if metric_name is not None:
+        query = query.filter(Metric.name == metric_name)
+    return query
+
+
+def _measurements_query(
+    llm_name: Optional[str],
+    metric_name: Optional[str],
+    start: Optional[datetime],
+    end: Optional[datetime],
+):
+    query = (
+        select(
+            LLM.name.label("llm_name"),
+            Metric.name.label("metric_name"),
+            Measurement.value,
+            Measurement.measured_at,
+        )
+        .join(Measurement.llm)
+        .join(Measurement.metric)
+    )
+    if llm_name is not None:
+        query = query.filter(LLM.name == llm_name)
+    if metric_name is not None:
+        query = query.filter(Metric.name == metric_name)
+    if start is not None:
+        query = query.filter(Measurement.measured_at >= start)
+    if end is not None:
+        query = query.filter(Measurement.measured_at < end)
+    return query
+
+
+def _time_bucket(timestamp, bucket_seconds: int):
+    return func.to_timestamp(
+        func.floor(func.extract("epoch", timestamp) / bucket_seconds) * bucket_seconds
+    ).label("bucket")
+
+
+def _history_value(statistic: AggregateStatistic):
+    if statistic == AggregateStatistic.MEAN:
+        # the exact mean of all the samples of the bucket
+        return cast(
+            func.sum(SimulationAggregate.value_sum)
+            / func.sum(SimulationAggregate.sample_count),
+            Float,
+        ).label("mean_value")
+    # percentiles cannot be merged without the sketches, average those of the runs
+    return func.avg(getattr(SimulationAggregate, statistic.value)).label(
+        f"{statistic.value}_value"
+    )
+
+
+def _metric_history_query(
+    metric_name: str,
+    statistic: AggregateStatistic,
+    start: datetime,
+    end: datetime,
+    bucket_seconds: int,
+):
+    bucket = _time_bucket(SimulationRun.completed_at, bucket_seconds)
+    return (
+        select(LLM.name.label("llm_name"), bucket, _history_value(statistic))
+        .select_from(SimulationRun)
+        .join(SimulationAggregate, SimulationAggregate.run_id == SimulationRun.id)
+        .join(SimulationAggregate.llm)
+        .join(SimulationAggregate.metric)
+        .filter(Metric.name == metric_name)
+        .filter(SimulationRun.status == SimulationRunStatus.COMPLETED.value)
+        .filter(SimulationRun.completed_at >= start)
+        .filter(SimulationRun.completed_at < end)
+        .group_by(LLM.name, bucket)
+        .order_by(LLM.name, bucket)
+    )
+
+
+def _measurement_history_value(statistic: AggregateStatistic):
+    # the measurements are all kept, so every statistic is exact over the measurements of the bucket
+    if statistic == AggregateStatistic.MEAN:
+        return func.avg(Measurement.value).label("mean_value")
+    return (
+        func.percentile_cont(statistic.quantile)
+        .within_group(Measurement.value)
+        .label(f"{statistic.value}_value")
+    )
+
+
+def _measurement_history_query(
+    metric_name: str,
+    statistic: AggregateStatistic,
+    start: datetime,
+    end: datetime,
+    bucket_seconds: int,
+):
+    bucket = _time_bucket(Measurement.measured_at, bucket_seconds)
+    return (
+        select(
+            LLM.name.label("llm_name"), bucket, _measurement_history_value(statistic)
+        )
+        .select_from(Measurement)
+        .join(Measurement.llm)
+        .join(Measurement.metric)
+        .filter(Metric.name == metric_name)
+        .filter(Measurement.measured_at >= start)
+        .filter(Measurement.measured_at < end)
+        .group_by(LLM.name, bucket)
+        .order_by(LLM.name, bucket)
+    )
 
 
 class SimulatorRepository:
     """
     This class handles database operations related to simulations.
-    It provides methods to get all metrics, bulk add metrics, and remove all metrics.
+    It provides methods to manage simulation runs, get metrics, bulk add metrics, and remove all metrics.
+    The samples of each run are written to their own partition of the simulations table, and
+    readers only see the current run, which is switched atomically once a run completes.
+    Measurements ingested through the API are kept in tables of their own, outside the runs.
     """
 
     def __init__(self, db: Session = Depends(get_db)):
@@ -20,70 +379,819 @@ class SimulatorRepository:
         Initializes the SimulatorRepository with a database session.
         """
         self.db = db
+        self.ingest_mode = IngestMode(settings_config.INGEST_MODE)
 
-    def get_metrics(self) -> List[Simulation]:
+    def get_metrics(self, run_id: Optional[UUID] = None) -> List[Simulation]:
         """
-        Retrieves all simulation metrics from the database.
+        Retrieves the simulation metrics of a run from the database.
+        Args:
+            run_id (Optional[UUID]): The ID of the run. Defaults to the current run.
         Returns:
-            List[Simulation]: A list of all simulation metrics.
+            List[Simulation]: A list of the simulation metrics of the run.
         """
-        metrics = self.db.query(Simulation).all()
+        run_filter = (
+            Simulation.run_id == run_id
+            if run_id is not None
+            else Simulation.run_id == _current_run_id()
+        )
+        metrics = self.db.query(Simulation).filter(run_filter).all()
         return metrics
 
+    def get_current_run(self) -> Optional[SimulationRun]:
+        """
+        Retrieves the run that readers currently see.
+        Returns:
+            Optional[SimulationRun]: The current run, None if no run has completed yet.
+        """
+        return self.db.execute(_current_run_query()).scalar()
+
+    def get_run(self, run_id: UUID) -> Optional[SimulationRun]:
+        """
+        Retrieves a run by its ID.
+        Returns:
+            Optional[SimulationRun]: The run, None if it does not exist.
+        """
+        return self.db.get(SimulationRun, run_id)
+
+    def stream_samples(
+        self,
+        run_id: Optional[UUID] = None,
+        llm_name: Optional[str] = None,
+        metric_name: Optional[str] = None,
+        chunk_size: int = SAMPLE_CHUNK_SIZE,
+    ) -> Iterator[Sequence[Row]]:
+        """
+        Streams the samples of a run through a server-side cursor, in chunks of at most chunk_size rows,
+        so memory use does not depend on the number of samples.
+        Args:
+            run_id (Optional[UUID]): The ID of the run. Defaults to the current run.
+            llm_name (Optional[str]): Only streams the samples of this LLM.
+            metric_name (Optional[str]): Only streams the samples of this metric.
+            chunk_size (int): The number of rows fetched at a time.
+        Returns:
+            Iterator[Sequence[Row]]: Chunks of rows containing the run ID, LLM name, metric name and value.
+        """
+        # rows are read through the session's connection, skipping the ORM result processing
+        result = self.db.connection().execute(
+            _samples_query(run_id, llm_name, metric_name).execution_options(
+                yield_per=chunk_size
+            )
+        )
+        yield from result.partitions()
+
+    def create_run(self) -> SimulationRun:
+        """
+        Creates a new simulation run together with the partition holding its samples.
+        The run is not visible to readers until complete_run is called.
+        Returns:
+            SimulationRun: The new run.
+        """
+        run = SimulationRun(status=SimulationRunStatus.RUNNING.value, is_current=False)
+        self.db.add(run)
+        self.db.flush()
+        self.db.execute(_create_partition(run))
+        self.db.commit()
+        return run
+
+    def complete_run(self, run_id: UUID) -> None:
+        """
+        Marks a run as completed and makes it the current run in a single transaction,
+        so readers switch from the previous run to the new one atomically.
+        Args:
+            run_id (UUID): The ID of the run.
+        Returns:
+            None
+        """
+        self.db.execute(
+            update(SimulationRun)
+            .where(SimulationRun.is_current.is_(True))
+            .values(is_current=False)
+        )
+        self.db.execute(
+            update(SimulationRun)
+            .where(SimulationRun.id == run_id)
+            .values(
+                is_current=True,
+                status=SimulationRunStatus.COMPLETED.value,
+                completed_at=func.now(),
+            )
+        )
+        self.db.commit()
+
+    def fail_run(self, run_id: UUID) -> None:
+        """
+        Marks a run as failed and drops the samples and aggregates written for it.
+        Args:
+            run_id (UUID): The ID of the run.
+        Returns:
+            None
+        """
+        run = self.db.get(SimulationRun, run_id)
+        if run is None:
+            return
+        self.db.execute(_drop_partition(run))
+        self.db.query(SimulationAggregate).filter(
+            SimulationAggregate.run_id == run_id
+        ).delete(synchronize_session=False)
+        run.status = SimulationRunStatus.FAILED.value
+        self.db.commit()
+
+    def drop_stale_runs(self) -> int:
+        """
+        Applies the retention policy to the runs preceding the current run.
+
+        Runs that never completed are dropped, and so are completed runs older than
+        HISTORY_RETENTION_DAYS. The other completed runs are kept as history through their
+        aggregates, but only the latest RAW_RETENTION_RUNS runs, the current one included, keep
+        their samples and quantile sketches. Samples are removed by dropping their partitions,
+        which takes constant time instead of deleting rows one by one.
+        Runs created after the current run may still be in progress and are kept.
+        Returns:
+            int: The number of runs dropped.
+        """
+        current_run = self.get_current_run()
+        if current_run is None:
+            return 0
+
+        history_cutoff = datetime.now(timezone.utc) - timedelta(
+            days=settings_config.HISTORY_RETENTION_DAYS
+        )
+        stale_runs = (
+            self.db.query(SimulationRun)
+            .filter(
+                SimulationRun.created_at < current_run.created_at,
+                (SimulationRun.status != SimulationRunStatus.COMPLETED.value)
+                | (SimulationRun.completed_at < history_cutoff),
+            )
+            .all()
+        )
+        self._drop_runs(stale_runs)
+
+        sampled_runs = (
+            self.db.query(SimulationRun)
+            .filter(
+                SimulationRun.created_at < current_run.created_at,
+                SimulationRun.status == SimulationRunStatus.COMPLETED.value,
+                SimulationRun.samples_retained.is_(True),
+            )
+            .order_by(SimulationRun.completed_at.desc())
+            .offset(max(settings_config.RAW_RETENTION_RUNS - 1, 0))
+            .all()
+        )
+        self._drop_samples(sampled_runs)
+        self.db.commit()
+        return len(stale_runs)
+
+    def _drop_samples(self, runs: List[SimulationRun]) -> None:
+        run_ids = [run.id for run in runs]
+        if not run_ids:
+            return
+        for run in runs:
+            self.db.execute(_drop_partition(run))
+        self.db.query(SimulationAggregate).filter(
+            SimulationAggregate.run_id.in_(run_ids)
+        ).update({"sketch": None}, synchronize_session=False)
+        self.db.query(SimulationRun).filter(SimulationRun.id.in_(run_ids)).update(
+            {"samples_retained": False}, synchronize_session=False
+        )
+
+    def _drop_runs(self, runs: List[SimulationRun]) -> None:
+        run_ids = [run.id for run in runs]
+        if not run_ids:
+            return
+        for run in runs:
+            self.db.execute(_drop_partition(run))
+        self.db.query(SimulationAggregate).filter(
+            SimulationAggregate.run_id.in_(run_ids)
+        ).delete(synchronize_session=False)
+        self.db.query(SimulationRun).filter(SimulationRun.id.in_(run_ids)).delete(
+            synchronize_session=False
+        )
+
+    def lock_pair(self, run_id: UUID, llm_id: UUID, metric_id: UUID) -> bool:
+        """
+        Locks the (run, llm, metric) until the transaction ends, and returns whether its data points
+        are still to be written, i.e. whether it has no aggregates yet. Writers of the same pair wait
+        for each other, so a pair delivered to several writers is written once.
+        Args:
+            run_id (UUID): The ID of the simulation run.
+            llm_id (UUID): The ID of the LLM.
+            metric_id (UUID): The ID of the metric.
+        Returns:
+            bool: Whether the data points of the pair are still to be written.
+        """
+        self.db.execute(_pair_lock(run_id, llm_id, metric_id))
+        written = self.db.execute(
+            select(SimulationAggregate.run_id).where(
+                SimulationAggregate.run_id == run_id,
+                SimulationAggregate.llm_id == llm_id,
+                SimulationAggregate.metric_id == metric_id,
+            )
+        ).first()
+        return written is None
+
     def bulk_add_metrics(
-        self, llm_id: UUID, metric_id: UUID, metrics: List[Simulation]
+        self,
+        run_id: UUID,
+        llm_id: UUID,
+        metric_id: UUID,
+        metrics: Union[List[float], np.ndarray],
+        commit: bool = True,
     ) -> int:
         """
-        Bulk adds simulation metrics to the database.
+        Bulk adds simulation metrics of a run to the database and updates the aggregates
+        of the (run, llm, metric) within the same transaction.
+        The values are written with an executemany INSERT or streamed through COPY,
+        depending on the configured ingest mode.
         Args:
+            run_id (UUID): The ID of the simulation run.
             llm_id (UUID): The ID of the LLM.
             metric_id (UUID): The ID of the metric.
-            metrics (List[Simulation]): A list of simulation metrics to be added.
+            metrics (Union[List[float], np.ndarray]): The simulation values to be added.
+            commit (bool): Whether to commit the transaction. Pass False to group several
+                calls in one transaction and call commit() once.
         Returns:
             int: The number of metrics added.
         """
-        data = [
-            {"llm_id": llm_id, "metric_id": metric_id, "value": value}
-            for value in metrics
-        ]
+        if self.ingest_mode == IngestMode.INSERT:
+            data = _simulation_rows(run_id, llm_id, metric_id, metrics)
 
-        # Use SQLAlchemy's bulk insert operation
-        self.db.execute(insert(Simulation), data)
-        self.db.commit()
+            # Use SQLAlchemy's bulk insert operation
+            self.db.execute(insert(Simulation), data)
+        else:
+            self.copy_metrics(run_id, llm_id, metric_id, metrics)
+        self.update_aggregates(run_id, llm_id, metric_id, metrics)
+        if commit:
+            self.db.commit()
 
         return len(metrics)
 
-    def remove_all_metrics(self) -> None:
+    def copy_metrics(
+        self,
+        run_id: UUID,
+        llm_id: UUID,
+        metric_id: UUID,
+        metrics: Union[List[float], np.ndarray],
+    ) -> None:
+        """
+        Streams simulation values into the simulations table with PostgreSQL COPY,
+        encoding them straight from the NumPy array. It does not commit.
+        Args:
+            run_id (UUID): The ID of the simulation run.
+            llm_id (UUID): The ID of the LLM.
+            metric_id (UUID): The ID of the metric.
+            metrics (Union[List[float], np.ndarray]): The simulation values to be added.
+        Returns:
+            None
+        """
+        values = np.asarray(metrics, dtype=float)
+        keys = (run_id, llm_id, metric_id)
+        if self.ingest_mode == IngestMode.COPY_TEXT:
+            chunks = text_copy_chunks(keys, values)
+            copy_format = "text"
+        else:
+            chunks = binary_copy_chunks(keys, values)
+            copy_format = "binary"
+
+        cursor = self.db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {Simulation.__tablename__} (run_id, llm_id, metric_id, value) "
+                f"FROM STDIN WITH (FORMAT {copy_format})",
+                ChunkStream(chunks),
+                size=COPY_READ_SIZE,
+            )
+        finally:
+            cursor.close()
+
+    def add_measurements(
+        self,
+        llm_ids: np.ndarray,
+        metric_ids: np.ndarray,
+        values: np.ndarray,
+        measured_at: np.ndarray,
+    ) -> int:
+        """
+        Adds measurements of any number of LLM and metric pairs in one transaction, streaming them into
+        the measurements table with a binary COPY and folding them into the aggregates of each pair.
+        Measurements are kept apart from the simulation runs: they are never dropped by the retention of
+        the runs, and are aggregated and ranked across runs. The pairs are updated in a fixed order, so
+        concurrent writers lock them in the same order.
+        Args:
+            llm_ids (np.ndarray): The LLM ID of each measurement, as 16 byte voids.
+            metric_ids (np.ndarray): The metric ID of each measurement, as 16 byte voids.
+            values (np.ndarray): The measured values.
+            measured_at (np.ndarray): When each value was measured, in seconds since the Unix epoch.
+        Returns:
+            int: The number of measurements added.
+        """
+        values = np.asarray(values, dtype=float)
+        cursor = self.db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {Measurement.__tablename__} (llm_id, metric_id, value, measured_at) "
+                "FROM STDIN WITH (FORMAT binary)",
+                ChunkStream(
+                    binary_measurement_chunks(llm_ids, metric_ids, values, measured_at)
+                ),
+                size=COPY_READ_SIZE,
+            )
+        finally:
+            cursor.close()
+
+        pair_ids = np.frombuffer(
+            np.column_stack([llm_ids, metric_ids]).tobytes(), dtype="V32"
+        )
+        pairs, pair_index = np.unique(pair_ids, return_inverse=True)
+        order = np.argsort(pair_index, kind="stable")
+        boundaries = np.cumsum(np.bincount(pair_index, minlength=len(pairs)))[:-1]
+        for pair, pair_values in zip(pairs, np.split(values[order], boundaries)):
+            pair_bytes = pair.tobytes()
+            self._fold_into_aggregates(
+                MeasurementAggregate,
+                {
+                    "llm_id": UUID(bytes=pair_bytes[:16]),
+                    "metric_id": UUID(bytes=pair_bytes[16:]),
+                },
+                pair_values,
+            )
+        self.db.commit()
+        return len(values)
+
+    def update_aggregates(
+        self,
+        run_id: UUID,
+        llm_id: UUID,
+        metric_id: UUID,
+        metrics: Union[List[float], np.ndarray],
+    ) -> None:
+        """
+        Folds a batch of simulation values into the aggregates of a (run, llm, metric).
+        The row is created on first use and incremented afterwards, without committing.
+        The quantile sketch of the batch is merged with the stored one, and the percentiles are
+        recomputed from the merged sketch. The pair is locked with the advisory lock of lock_pair until
+        the transaction ends, before its sketch is read, so concurrent writers of a pair that has no
+        aggregates yet merge their sketches instead of overwriting each other's.
+        Args:
+            run_id (UUID): The ID of the simulation run.
+            llm_id (UUID): The ID of the LLM.
+            metric_id (UUID): The ID of the metric.
+            metrics (Union[List[float], np.ndarray]): The simulation values that were added.
+        Returns:
+            None
+        """
+        self._fold_into_aggregates(
+            SimulationAggregate,
+            {"run_id": run_id, "llm_id": llm_id, "metric_id": metric_id},
+            metrics,
+        )
+
+    def _fold_into_aggregates(
+        self,
+        aggregate: Aggregate,
+        keys: dict,
+        metrics: Union[List[float], np.ndarray],
+    ) -> None:
+        values = np.asarray(metrics, dtype=float)
+        if values.size == 0:
+            return
+
+        sketch = QuantileSketch.from_values(values)
+        self.db.execute(_pair_lock(*keys.values()))
+        stored_sketch = self.db.execute(_stored_sketch_query(aggregate, keys)).scalar()
+        if stored_sketch is not None:
+            sketch = QuantileSketch.from_bytes(stored_sketch).merge(sketch)
+
+        self.db.execute(_aggregates_upsert(aggregate, keys, values, sketch))
+
+    def remove_all_metrics(self, commit: bool = True) -> None:
         """
-        Clears the database of all existing simulation metrics.
-        This method executes a bulk deletion of all simulation metrics, ensuring a clean slate for new data.
+        Clears the database of all existing simulation runs and their metrics.
+        The partitions of the runs are dropped instead of deleting their rows.
+        Args:
+            commit (bool): Whether to commit the transaction.
         Returns:
             None
         """
-        self.db.query(Simulation).delete(synchronize_session=False)
+        self._drop_runs(self.db.query(SimulationRun).all())
+        if commit:
+            self.db.commit()
+
+    def commit(self) -> None:
+        """
+        Commits the current transaction.
+        """
         self.db.commit()
 
-    def get_metric_means_by_llm(self, metric_name: str) -> List[Tuple[str, str, float]]:
+    def rollback(self) -> None:
+        """
+        Rolls back the current transaction.
+        """
+        self.db.rollback()
+
+    def close(self) -> None:
+        """
+        Closes the session of the repository.
+        """
+        self.db.close()
+
+    def get_metric_means_by_llm(self, metric_name: str) -> List[Tuple[str, float]]:
+        """
+        Retrieves the mean simulation metric values of the current run for given metric.
+        The means are read from the aggregates table, so the cost does not depend on the number of samples.
+
+        Args:
+            metric_name (str): The name of the metric to filter by.
+
+        Returns:
+            List[Tuple[str, float]]: A list of tuples containing the LLM name and the mean metric value.
+        """
+        return self.get_metric_statistic_by_llm(metric_name, AggregateStatistic.MEAN)
+
+    def get_metric_statistic_by_llm(
+        self, metric_name: str, statistic: AggregateStatistic
+    ) -> List[Tuple[str, float]]:
+        """
+        Retrieves a statistic of the simulation metric values of the current run for given metric,
+        ordered from the highest value. Percentiles are read from the aggregates table like the means,
+        so they cost the same.
+
+        Args:
+            metric_name (str): The name of the metric to filter by.
+            statistic (AggregateStatistic): The statistic to retrieve.
+
+        Returns:
+            List[Tuple[str, float]]: A list of tuples containing the LLM name and the statistic value.
+        """
+        return self.db.execute(
+            _metric_statistic_by_llm_query(metric_name, statistic)
+        ).all()
+
+    def get_metric_rankings(
+        self,
+    ) -> List[Tuple[str, Optional[str], Optional[float], int]]:
+        """
+        Retrieves the ranked mean simulation values of every metric of the current run in a single query.
+        The LLMs are ranked within each metric with a window function, and metrics
+        without any simulations are returned with an empty LLM name.
+
+        Returns:
+            List[Tuple[str, Optional[str], Optional[float], int]]: A list of tuples containing the
+            metric name, LLM name, mean metric value and rank, ordered by metric and rank.
+        """
+        return self.db.execute(_metric_rankings_query()).all()
+
+    def get_metric_history(
+        self,
+        metric_name: str,
+        statistic: AggregateStatistic,
+        start: datetime,
+        end: datetime,
+        bucket_seconds: int,
+    ) -> List[Tuple[str, datetime, float]]:
+        """
+        Retrieves a statistic of the completed runs of a metric per LLM, in time buckets of the
+        completion time of the runs. Means are exact over all the samples of a bucket, and
+        percentiles are averaged over its runs.
+
+        Args:
+            metric_name (str): The name of the metric to filter by.
+            statistic (AggregateStatistic): The statistic to retrieve.
+            start (datetime): The start of the time range, inclusive.
+            end (datetime): The end of the time range, exclusive.
+            bucket_seconds (int): The width of the time buckets in seconds.
+
+        Returns:
+            List[Tuple[str, datetime, float]]: A list of tuples containing the LLM name, the start
+            of the bucket and the statistic value, ordered by LLM name and bucket.
+        """
+        return self.db.execute(
+            _metric_history_query(metric_name, statistic, start, end, bucket_seconds)
+        ).all()
+
+    def get_measured_rankings(
+        self,
+    ) -> List[Tuple[str, Optional[str], Optional[float], int]]:
+        """
+        Retrieves the ranked mean measured values of every metric in a single query, like
+        get_metric_rankings, from the aggregates of all the measurements ingested for each pair.
+
+        Returns:
+            List[Tuple[str, Optional[str], Optional[float], int]]: A list of tuples containing the
+            metric name, LLM name, mean measured value and rank, ordered by metric and rank.
+        """
+        return self.db.execute(_measured_rankings_query()).all()
+
+    def get_measured_statistic_by_llm(
+        self, metric_name: str, statistic: AggregateStatistic
+    ) -> List[Tuple[str, float]]:
+        """
+        Retrieves a statistic of all the measurements of a metric per LLM, ordered from the highest value.
+
+        Args:
+            metric_name (str): The name of the metric to filter by.
+            statistic (AggregateStatistic): The statistic to retrieve.
+
+        Returns:
+            List[Tuple[str, float]]: A list of tuples containing the LLM name and the statistic value.
+        """
+        return self.db.execute(
+            _measured_statistic_by_llm_query(metric_name, statistic)
+        ).all()
+
+    def get_measurement_history(
+        self,
+        metric_name: str,
+        statistic: AggregateStatistic,
+        start: datetime,
+        end: datetime,
+        bucket_seconds: int,
+    ) -> List[Tuple[str, datetime, float]]:
+        """
+        Retrieves a statistic of the measurements of a metric per LLM, in time buckets of when they were
+        measured. The statistics are computed from the measurements, so they are exact.
+
+        Args:
+            metric_name (str): The name of the metric to filter by.
+            statistic (AggregateStatistic): The statistic to retrieve.
+            start (datetime): The start of the time range, inclusive.
+            end (datetime): The end of the time range, exclusive.
+            bucket_seconds (int): The width of the time buckets in seconds.
+
+        Returns:
+            List[Tuple[str, datetime, float]]: A list of tuples containing the LLM name, the start
+            of the bucket and the statistic value, ordered by LLM name and bucket.
+        """
+        return self.db.execute(
+            _measurement_history_query(
+                metric_name, statistic, start, end, bucket_seconds
+            )
+        ).all()
+
+    def stream_measurements(
+        self,
+        llm_name: Optional[str] = None,
+        metric_name: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        chunk_size: int = SAMPLE_CHUNK_SIZE,
+    ) -> Iterator[Sequence[Row]]:
+        """
+        Streams the measurements through a server-side cursor, in chunks of at most chunk_size rows,
+        like stream_samples.
+        Args:
+            llm_name (Optional[str]): Only streams the measurements of this LLM.
+            metric_name (Optional[str]): Only streams the measurements of this metric.
+            start (Optional[datetime]): Only streams the measurements taken since then.
+            end (Optional[datetime]): Only streams the measurements taken before then.
+            chunk_size (int): The number of rows fetched at a time.
+        Returns:
+            Iterator[Sequence[Row]]: Chunks of rows containing the LLM name, metric name, value and
+            measurement time.
+        """
+        result = self.db.connection().execute(
+            _measurements_query(llm_name, metric_name, start, end).execution_options(
+                yield_per=chunk_size
+            )
+        )
+        yield from result.partitions()
+
+
+class AsyncSimulatorRepository:
+    """
+    This class handles database operations related to simulations using an async session.
+    It mirrors the read methods of SimulatorRepository for callers running on an event loop.
+    """
+
+    def __init__(self, db: AsyncSession = Depends(get_async_db)):
+        """
+        Initializes the AsyncSimulatorRepository with an async database session.
         """
-        Retrieves the mean simulation metric values for given metric.
+        self.db = db
 
+    async def get_metrics(self, run_id: Optional[UUID] = None) -> List[Simulation]:
+        """
+        Retrieves the simulation metrics of a run from the database.
         Args:
-            metric_name (str): The name of the metric to filter by. If not provided, all metrics are considered.
+            run_id (Optional[UUID]): The ID of the run. Defaults to the current run.
+        Returns:
+            List[Simulation]: A list of the simulation metrics of the run.
+        """
+        run_filter = (
+            Simulation.run_id == run_id
+            if run_id is not None
+            else Simulation.run_id == _current_run_id()
+        )
+        result = await self.db.execute(select(Simulation).filter(run_filter))
+        return result.scalars().all()
 
+    async def get_current_run(self) -> Optional[SimulationRun]:
+        """
+        Retrieves the run that readers currently see.
         Returns:
-            List[Tuple[str, str, float]]: A list of tuples containing the LLM name, metric name,
-            and the mean metric value.
+            Optional[SimulationRun]: The current run, None if no run has completed yet.
         """
-        query = (
-            self.db.query(
-                LLM.name.label("llm_name"),
-                func.avg(Simulation.value).label("mean_value"),
+        result = await self.db.execute(_current_run_query())
+        return result.scalar()
+
+    async def get_run(self, run_id: UUID) -> Optional[SimulationRun]:
+        """
+        Retrieves a run by its ID.
+        Returns:
+            Optional[SimulationRun]: The run, None if it does not exist.
+        """
+        return await self.db.get(SimulationRun, run_id)
+
+    async def stream_samples(
+        self,
+        run_id: Optional[UUID] = None,
+        llm_name: Optional[str] = None,
+        metric_name: Optional[str] = None,
+        chunk_size: int = SAMPLE_CHUNK_SIZE,
+    ) -> AsyncIterator[Sequence[Row]]:
+        """
+        Streams the samples of a run through a server-side cursor, in chunks of at most chunk_size rows,
+        so memory use does not depend on the number of samples.
+        Args:
+            run_id (Optional[UUID]): The ID of the run. Defaults to the current run.
+            llm_name (Optional[str]): Only streams the samples of this LLM.
+            metric_name (Optional[str]): Only streams the samples of this metric.
+            chunk_size (int): The number of rows fetched at a time.
+        Returns:
+            AsyncIterator[Sequence[Row]]: Chunks of rows containing the run ID, LLM name, metric name and value.
+        """
+        # rows are read through the session's connection, skipping the ORM result processing
+        connection = await self.db.connection()
+        result = await connection.stream(
+            _samples_query(run_id, llm_name, metric_name).execution_options(
+                yield_per=chunk_size
             )
-            .join(Simulation.llm)
-            .join(Simulation.metric)
-            .filter(Metric.name == metric_name)
-            .group_by(LLM.name, Metric.name)
-            .order_by(func.avg(Simulation.value).desc())
+        )
+        async for chunk in result.partitions():
+            yield chunk
+
+    async def get_metric_means_by_llm(
+        self, metric_name: str
+    ) -> List[Tuple[str, float]]:
+        """
+        Retrieves the mean simulation metric values of the current run for given metric.
+
+        Args:
+            metric_name (str): The name of the metric to filter by.
+
+        Returns:
+            List[Tuple[str, float]]: A list of tuples containing the LLM name and the mean metric value.
+        """
+        return await self.get_metric_statistic_by_llm(
+            metric_name, AggregateStatistic.MEAN
         )
 
-        return query.all()
+    async def get_metric_statistic_by_llm(
+        self, metric_name: str, statistic: AggregateStatistic
+    ) -> List[Tuple[str, float]]:
+        """
+        Retrieves a statistic of the simulation metric values of the current run for given metric,
+        ordered from the highest value.
+
+        Args:
+            metric_name (str): The name of the metric to filter by.
+            statistic (AggregateStatistic): The statistic to retrieve.
+
+        Returns:
+            List[Tuple[str, float]]: A list of tuples containing the LLM name and the statistic value.
+        """
+        result = await self.db.execute(
+            _metric_statistic_by_llm_query(metric_name, statistic)
+        )
+        return result.all()
+
+    async def get_metric_rankings(
+        self,
+    ) -> List[Tuple[str, Optional[str], Optional[float], int]]:
+        """
+        Retrieves the ranked mean simulation values of every metric of the current run in a single query.
+
+        Returns:
+            List[Tuple[str, Optional[str], Optional[float], int]]: A list of tuples containing the
+            metric name, LLM name, mean metric value and rank, ordered by metric and rank.
+        """
+        result = await self.db.execute(_metric_rankings_query())
+        return result.all()
+
+    async def get_metric_history(
+        self,
+        metric_name: str,
+        statistic: AggregateStatistic,
+        start: datetime,
+        end: datetime,
+        bucket_seconds: int,
+    ) -> List[Tuple[str, datetime, float]]:
+        """
+        Retrieves a statistic of the completed runs of a metric per LLM, in time buckets of the
+        completion time of the runs.
+
+        Args:
+            metric_name (str): The name of the metric to filter by.
+            statistic (AggregateStatistic): The statistic to retrieve.
+            start (datetime): The start of the time range, inclusive.
+            end (datetime): The end of the time range, exclusive.
+            bucket_seconds (int): The width of the time buckets in seconds.
+
+        Returns:
+            List[Tuple[str, datetime, float]]: A list of tuples containing the LLM name, the start
+            of the bucket and the statistic value, ordered by LLM name and bucket.
+        """
+        result = await self.db.execute(
+            _metric_history_query(metric_name, statistic, start, end, bucket_seconds)
+        )
+        return result.all()
+
+    async def get_measured_rankings(
+        self,
+    ) -> List[Tuple[str, Optional[str], Optional[float], int]]:
+        """
+        Retrieves the ranked mean measured values of every metric in a single query.
+
+        Returns:
+            List[Tuple[str, Optional[str], Optional[float], int]]: A list of tuples containing the
+            metric name, LLM name, mean measured value and rank, ordered by metric and rank.
+        """
+        result = await self.db.execute(_measured_rankings_query())
+        return result.all()
+
+    async def get_measured_statistic_by_llm(
+        self, metric_name: str, statistic: AggregateStatistic
+    ) -> List[Tuple[str, float]]:
+        """
+        Retrieves a statistic of all the measurements of a metric per LLM, ordered from the highest value.
+
+        Args:
+            metric_name (str): The name of the metric to filter by.
+            statistic (AggregateStatistic): The statistic to retrieve.
+
+        Returns:
+            List[Tuple[str, float]]: A list of tuples containing the LLM name and the statistic value.
+        """
+        result = await self.db.execute(
+            _measured_statistic_by_llm_query(metric_name, statistic)
+        )
+        return result.all()
+
+    async def get_measurement_history(
+        self,
+        metric_name: str,
+        statistic: AggregateStatistic,
+        start: datetime,
+        end: datetime,
+        bucket_seconds: int,
+    ) -> List[Tuple[str, datetime, float]]:
+        """
+        Retrieves a statistic of the measurements of a metric per LLM, in time buckets of when they were
+        measured.
+
+        Args:
+            metric_name (str): The name of the metric to filter by.
+            statistic (AggregateStatistic): The statistic to retrieve.
+            start (datetime): The start of the time range, inclusive.
+            end (datetime): The end of the time range, exclusive.
+            bucket_seconds (int): The width of the time buckets in seconds.
+
+        Returns:
+            List[Tuple[str, datetime, float]]: A list of tuples containing the LLM name, the start
+            of the bucket and the statistic value, ordered by LLM name and bucket.
+        """
+        result = await self.db.execute(
+            _measurement_history_query(
+                metric_name, statistic, start, end, bucket_seconds
+            )
+        )
+        return result.all()
+
+    async def stream_measurements(
+        self,
+        llm_name: Optional[str] = None,
+        metric_name: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        chunk_size: int = SAMPLE_CHUNK_SIZE,
+    ) -> AsyncIterator[Sequence[Row]]:
+        """
+        Streams the measurements through a server-side cursor, in chunks of at most chunk_size rows.
+        Args:
+            llm_name (Optional[str]): Only streams the measurements of this LLM.
+            metric_name (Optional[str]): Only streams the measurements of this metric.
+            start (Optional[datetime]): Only streams the measurements taken since then.
+            end (Optional[datetime]): Only streams the measurements taken before then.
+            chunk_size (int): The number of rows fetched at a time.
+        Returns:
+            AsyncIterator[Sequence[Row]]: Chunks of rows containing the LLM name, metric name, value and
+            measurement time.
+        """
+        connection = await self.db.connection()
+        result = await connection.stream(
+            _measurements_query(llm_name, metric_name, start, end).execution_options(
+                yield_per=chunk_size
+            )
+        )
+        async for chunk in result.partitions():
+            yield chunk
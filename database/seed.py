@@ -1,48 +1,123 @@
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
-from database import LLM, Metric
+from database import LLM, LLMMetricRange, Metric
+from database.registry import load_registry
 from logger import logging
 
 
-def seed_metrics(db: Session):
-    if db.query(Metric).count() > 0:
-        logging.info("Metrics table is not empty. Seeding skipped.")
+def seed_metrics(db: Session, metrics: List[Dict[str, Any]]):
+    """
+    Adds the metrics of the registry that are missing, and updates the range of the others.
+    """
+    if not metrics:
         return
 
-    metric_names = [
-        "ttft",  # Time to First Token
-        "tps",  # Tokens Per Second
-        "e2e_latency",  # End-to-End Latency
-        "rps",  # Requests Per Second
-    ]
-
-    for name in metric_names:
-        metric = Metric(name=name)
-        db.add(metric)
-
+    statement = pg_insert(Metric).values(
+        [
+            {
+                "name": metric["name"],
+                "min_value": metric["min_value"],
+                "max_value": metric["max_value"],
+            }
+            for metric in metrics
+        ]
+    )
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[Metric.name],
+            set_={
+                "min_value": statement.excluded.min_value,
+                "max_value": statement.excluded.max_value,
+                "updated_at": func.now(),
+            },
+            where=or_(
+                Metric.min_value != statement.excluded.min_value,
+                Metric.max_value != statement.excluded.max_value,
+            ),
+        )
+    )
     db.commit()
-    logging.info("Metrics seeded successfully.")
+    logging.info(f"Metrics seeded successfully, {len(metrics)} in the registry.")
 
 
-def seed_llms(db: Session):
-    if db.query(LLM).count() > 0:
-        logging.info("LLM table is not empty. Seeding skipped.")
+def seed_llms(db: Session, llms: List[Dict[str, Any]]):
+    """
+    Adds the LLMs of the registry that are missing, and updates the company of the others.
+    """
+    if not llms:
         return
 
-    llm_names = [
-        {"name": "GPT-4o", "company_name": "openai"},
-        {"name": "Llama 3.1 70B", "company_name": "meta"},
-        {"name": "Claude 3.5 Sonnet", "company_name": "anthropic"},
-    ]
+    statement = pg_insert(LLM).values(
+        [{"name": llm["name"], "company_name": llm["company_name"]} for llm in llms]
+    )
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[LLM.name],
+            set_={
+                "company_name": statement.excluded.company_name,
+                "updated_at": func.now(),
+            },
+            where=LLM.company_name != statement.excluded.company_name,
+        )
+    )
+    db.commit()
+    logging.info(f"LLMs seeded successfully, {len(llms)} in the registry.")
+
 
-    for llm in llm_names:
-        llm = LLM(name=llm["name"], company_name=llm["company_name"])
-        db.add(llm)
+def seed_metric_ranges(db: Session, llms: List[Dict[str, Any]]):
+    """
+    Adds or updates the ranges the LLMs of the registry override for some metrics.
+    """
+    overrides = [
+        (llm["name"], metric_name, values)
+        for llm in llms
+        for metric_name, values in llm.get("ranges", {}).items()
+    ]
+    if not overrides:
+        return
 
+    llm_ids = dict(db.query(LLM.name, LLM.id).all())
+    metric_ids = dict(db.query(Metric.name, Metric.id).all())
+    statement = pg_insert(LLMMetricRange).values(
+        [
+            {
+                "llm_id": llm_ids[llm_name],
+                "metric_id": metric_ids[metric_name],
+                "min_value": values["min_value"],
+                "max_value": values["max_value"],
+            }
+            for llm_name, metric_name, values in overrides
+        ]
+    )
+    db.execute(
+        statement.on_conflict_do_update(
+            constraint="uq_llm_metric_ranges_llm_id_metric_id",
+            set_={
+                "min_value": statement.excluded.min_value,
+                "max_value": statement.excluded.max_value,
+                "updated_at": func.now(),
+            },
+            where=or_(
+                LLMMetricRange.min_value != statement.excluded.min_value,
+                LLMMetricRange.max_value != statement.excluded.max_value,
+            ),
+        )
+    )
     db.commit()
-    logging.info("LLMs seeded successfully.")
+    logging.info(f"LLM metric ranges seeded successfully, {len(overrides)} overrides.")
 
 
-def seed_data(db: Session):
-    seed_llms(db)
-    seed_metrics(db)
+def seed_data(db: Session, registry: Optional[Dict[str, Any]] = None):
+    """
+    Brings the LLMs and metrics of the database in line with the registry, REGISTRY_FILE by default.
+    The registry can be applied to a database that is already seeded: the entries it lists are added or
+    updated, and the ones it does not list are left as they are. Concurrent seeding replicas do not conflict.
+    """
+    registry = registry or load_registry()
+    seed_llms(db, registry["llms"])
+    seed_metrics(db, registry["metrics"])
+    seed_metric_ranges(db, registry["llms"])
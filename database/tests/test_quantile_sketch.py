@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from database.quantile_sketch import QuantileSketch
+
+QUANTILES = [0.5, 0.9, 0.95, 0.99]
+
+
+@pytest.fixture
+def values():
+    return np.random.default_rng(3).lognormal(0, 1, 100_000)
+
+
+def test_quantiles_are_close_to_exact(values):
+    sketch = QuantileSketch.from_values(values)
+
+    assert sketch.count == values.size
+    assert len(sketch.means) <= sketch.compression / 2 + 1
+    np.testing.assert_allclose(
+        sketch.quantiles(QUANTILES), np.quantile(values, QUANTILES), rtol=0.01
+    )
+    assert sketch.quantile(0) == values.min()
+    assert sketch.quantile(1) == values.max()
+
+
+def test_merged_sketches_match_single_sketch(values):
+    merged = QuantileSketch()
+    for batch in np.array_split(values, 10):
+        merged = merged.merge(QuantileSketch.from_values(batch))
+
+    assert merged.count == values.size
+    np.testing.assert_allclose(
+        merged.quantiles(QUANTILES), np.quantile(values, QUANTILES), rtol=0.01
+    )
+
+
+def test_bytes_round_trip(values):
+    sketch = QuantileSketch.from_values(values)
+
+    restored = QuantileSketch.from_bytes(sketch.to_bytes())
+
+    np.testing.assert_array_equal(restored.means, sketch.means)
+    np.testing.assert_array_equal(restored.weights, sketch.weights)
+    assert restored.min_value == sketch.min_value
+    assert restored.max_value == sketch.max_value
+
+
+def test_empty_sketch():
+    sketch = QuantileSketch.from_values([])
+
+    assert sketch.count == 0
+    assert np.isnan(sketch.quantile(0.5))
+    assert QuantileSketch.from_values([1.0]).merge(sketch).quantile(0.5) == 1.0
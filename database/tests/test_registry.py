@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from database.registry import load_registry, registry_ranges
+
+
+def write_registry(tmp_path, registry):
+    path = tmp_path / "registry.json"
+    path.write_text(json.dumps(registry))
+    return str(path)
+
+
+def test_registry_ranges_apply_the_overrides_of_each_llm(tmp_path):
+    registry = load_registry(
+        write_registry(
+            tmp_path,
+            {
+                "metrics": [
+                    {"name": "ttft", "min_value": 0.05, "max_value": 2.0},
+                    {"name": "tps", "min_value": 10, "max_value": 150},
+                ],
+                "llms": [
+                    {"name": "GPT-4o", "company_name": "openai"},
+                    {
+                        "name": "Fast LLM",
+                        "company_name": "acme",
+                        "ranges": {"ttft": {"min_value": 0.01, "max_value": 0.5}},
+                    },
+                ],
+            },
+        )
+    )
+
+    assert registry_ranges(registry) == [
+        ("GPT-4o", "ttft", 0.05, 2.0),
+        ("GPT-4o", "tps", 10.0, 150.0),
+        ("Fast LLM", "ttft", 0.01, 0.5),
+        ("Fast LLM", "tps", 10.0, 150.0),
+    ]
+
+
+def test_override_of_an_unknown_metric_is_rejected(tmp_path):
+    path = write_registry(
+        tmp_path,
+        {
+            "metrics": [{"name": "ttft", "min_value": 0.05, "max_value": 2.0}],
+            "llms": [
+                {
+                    "name": "GPT-4o",
+                    "company_name": "openai",
+                    "ranges": {"latency": {"min_value": 0, "max_value": 1}},
+                }
+            ],
+        },
+    )
+
+    with pytest.raises(ValueError, match="unknown metric latency"):
+        load_registry(path)
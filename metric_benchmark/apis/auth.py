@@ -1,15 +1,42 @@
 import os
+from typing import Optional
 
 from dotenv import load_dotenv
-from fastapi import Header, HTTPException, status
+from fastapi import Header, HTTPException, Query, status
 
 load_dotenv()
 
 API_KEY = os.getenv("API_KEY", "")
+# keys allowed to request privileged operations, such as profiling their requests
+ADMIN_API_KEYS = frozenset(
+    key.strip() for key in os.getenv("ADMIN_API_KEYS", "").split(",") if key.strip()
+)
+# keys allowed to push measurements, besides the admin keys
+INGEST_API_KEYS = frozenset(
+    key.strip() for key in os.getenv("INGEST_API_KEYS", "").split(",") if key.strip()
+)
 
 
-def verify_api_key(x_api_key: str = Header(...)):
-    if x_api_key != API_KEY:
+async def verify_api_key(x_api_key: str = Header(...)):
+    if x_api_key != API_KEY and not is_admin_api_key(x_api_key):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="Invalid API key"
         )
+
+
+async def verify_stream_api_key(
+    x_api_key: Optional[str] = Header(None), api_key: Optional[str] = Query(None)
+):
+    # EventSource cannot send headers, so browsers pass the key in the query string instead
+    await verify_api_key(x_api_key if x_api_key is not None else api_key)
+
+
+async def verify_ingest_api_key(x_api_key: str = Header(...)):
+    if x_api_key not in INGEST_API_KEYS and not is_admin_api_key(x_api_key):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Invalid API key"
+        )
+
+
+def is_admin_api_key(api_key: Optional[str]) -> bool:
+    return api_key is not None and api_key in ADMIN_API_KEYS
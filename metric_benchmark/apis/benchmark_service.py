@@ -1,9 +1,45 @@
-import json
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Optional, Tuple
+from uuid import UUID
 
-from fastapi import Depends, HTTPException
+from dotenv import load_dotenv
+from fastapi import Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import LLMRepository, MetricRepository, SimulatorRepository
-from redis_client import RedisClient, RedisKeys
+from database import (
+    AggregateStatistic,
+    AsyncLLMRepository,
+    AsyncMetricRepository,
+    AsyncSimulatorRepository,
+    SimulationRun,
+)
+from database.session import AsyncSessionLocal, get_async_db
+from metric_benchmark.apis.ranking_cache import CachedValue, RankingCache
+from metric_benchmark.apis.sample_export import (
+    ExportFormat,
+    encode_measurements,
+    encode_samples,
+)
+from rankings import (
+    metric_history_payload,
+    metric_rankings_payload,
+    rankings_payload,
+    render_data,
+)
+from redis_client import (
+    RedisKeys,
+    get_async_redis_client,
+    measured_metric_benchmarks_key,
+    metric_benchmarks_key,
+)
+
+load_dotenv()
+
+HISTORY_MAX_BUCKETS = int(os.getenv("HISTORY_MAX_BUCKETS", "2000"))
+HISTORY_DEFAULT_RANGE = timedelta(days=1)
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "10000"))
 
 
 class BenchmarkService:
@@ -14,66 +50,250 @@ class BenchmarkService:
 
     def __init__(
         self,
-        llm_repository: LLMRepository = Depends(LLMRepository),
-        metric_repository: MetricRepository = Depends(MetricRepository),
-        simulator_repository: SimulatorRepository = Depends(SimulatorRepository),
+        llm_repository: AsyncLLMRepository,
+        metric_repository: AsyncMetricRepository,
+        simulator_repository: AsyncSimulatorRepository,
     ):
         self.llm_repository = llm_repository
         self.metric_repository = metric_repository
         self.simulator_repository = simulator_repository
 
-    def get_simulation_and_rankings(self):
+    async def get_simulation_and_rankings(self) -> CachedValue:
         """
         Retrieves all metrics and their corresponding simulations, then ranks the llms based on their means.
+        The rankings of every metric are loaded with a single query and cached per metric as well.
+        The rendered response is returned with the generation of the rankings it was computed from.
+        """
+        cache = RankingCache(get_async_redis_client())
+        cached = await cache.get_or_compute(
+            RedisKeys.BENCHMARKS.value,
+            self._compute_rankings,
+            fan_out=lambda results: {
+                metric_benchmarks_key(metric_name): result
+                for result in results
+                for metric_name in result
+            },
+        )
+        return cached._replace(value=render_data(cached.value))
+
+    async def get_simulation_and_rankings_by_metric_name(
+        self, metric_name, statistic: AggregateStatistic = AggregateStatistic.MEAN
+    ) -> CachedValue:
+        """
+        Retrieves a metric and its corresponding simulations, then ranks the llms based on the given statistic.
+        The mean and the percentiles are all precomputed per run, so every statistic costs the same.
+        The rendered response is returned with the generation of the rankings it was computed from.
+        """
+        cache = RankingCache(get_async_redis_client())
+        cached = await cache.get_or_compute(
+            metric_benchmarks_key(metric_name, statistic.value),
+            lambda: self._compute_metric_rankings(metric_name, statistic),
+        )
+        return cached._replace(value=render_data(cached.value))
+
+    async def get_metric_history(
+        self,
+        metric_name: str,
+        statistic: AggregateStatistic = AggregateStatistic.MEAN,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        bucket_seconds: int = 3600,
+    ):
+        """
+        Retrieves the history of a metric by the given statistic, as one time series per llm
+        bucketed by the completion time of the runs. The range defaults to the last day,
+        and timestamps without a time zone are taken as UTC.
+        """
+        start, end = _history_range(start, end, bucket_seconds)
+        metric = await self._get_metric(metric_name)
+        history = await self.simulator_repository.get_metric_history(
+            metric.name, statistic, start, end, bucket_seconds
+        )
+        return {"data": metric_history_payload(metric.name, history, statistic)}
+
+    async def get_measured_rankings(self) -> CachedValue:
+        """
+        Retrieves the rankings of every metric by the mean of all the measurements ingested for each llm,
+        across simulation runs. They are cached like the simulated rankings, under keys of their own.
+        """
+        cache = RankingCache(get_async_redis_client())
+        cached = await cache.get_or_compute(
+            RedisKeys.MEASURED_BENCHMARKS.value,
+            self._compute_measured_rankings,
+            fan_out=lambda results: {
+                measured_metric_benchmarks_key(metric_name): result
+                for result in results
+                for metric_name in result
+            },
+        )
+        return cached._replace(value=render_data(cached.value))
+
+    async def get_measured_rankings_by_metric_name(
+        self, metric_name, statistic: AggregateStatistic = AggregateStatistic.MEAN
+    ) -> CachedValue:
+        """
+        Retrieves the rankings of a metric by the given statistic of all the measurements of each llm.
+        """
+        cache = RankingCache(get_async_redis_client())
+        cached = await cache.get_or_compute(
+            measured_metric_benchmarks_key(metric_name, statistic.value),
+            lambda: self._compute_measured_metric_rankings(metric_name, statistic),
+        )
+        return cached._replace(value=render_data(cached.value))
+
+    async def get_measurement_history(
+        self,
+        metric_name: str,
+        statistic: AggregateStatistic = AggregateStatistic.MEAN,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        bucket_seconds: int = 3600,
+    ):
+        """
+        Retrieves the history of the measurements of a metric by the given statistic, as one time series
+        per llm bucketed by when the values were measured. The range is validated like get_metric_history.
+        """
+        start, end = _history_range(start, end, bucket_seconds)
+        metric = await self._get_metric(metric_name)
+        history = await self.simulator_repository.get_measurement_history(
+            metric.name, statistic, start, end, bucket_seconds
+        )
+        return {"data": metric_history_payload(metric.name, history, statistic)}
+
+    async def get_sample_run(self, run_id: Optional[UUID] = None) -> SimulationRun:
+        """
+        Retrieves the run whose samples are exported, the current run by default.
+        Only the latest runs keep their samples, the others are answered with a 404.
+        """
+        if run_id is None:
+            run = await self.simulator_repository.get_current_run()
+        else:
+            run = await self.simulator_repository.get_run(run_id)
+        if not run or not run.samples_retained:
+            raise HTTPException(status_code=404, detail="Run samples not found")
+        return run
+
+    def export_samples(
+        self,
+        export_format: ExportFormat,
+        run_id: UUID,
+        llm_name: Optional[str] = None,
+        metric_name: Optional[str] = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        Streams the samples of a run in the given format, optionally those of a single LLM or metric.
+        The samples are read through a server-side cursor and encoded EXPORT_CHUNK_SIZE rows at a time.
+        """
+        chunks = self.simulator_repository.stream_samples(
+            run_id, llm_name, metric_name, EXPORT_CHUNK_SIZE
+        )
+        return encode_samples(chunks, export_format)
+
+    def export_measurements(
+        self,
+        export_format: ExportFormat,
+        llm_name: Optional[str] = None,
+        metric_name: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        Streams the measurements in the given format with the time they were measured, optionally those
+        of a single LLM or metric, or of a time range. Timestamps without a time zone are taken as UTC.
         """
-        redis_client = RedisClient()
-        if redis_client.redis.exists(RedisKeys.BENCHMARKS.value):
-            redis_results = json.loads(
-                redis_client.redis.get(RedisKeys.BENCHMARKS.value)
-            )
-            return {"data": redis_results}
-
-        metrics = self.metric_repository.get_metrics()
-        results = []
-        for metric in metrics:
-            simulations = self.simulator_repository.get_metric_means_by_llm(metric.name)
-            rounded_simulations = [
-                {"llm_name": sim[0], "mean_value": round(sim[1], 2)}
-                for sim in simulations
-            ]
-            results.append({metric.name: rounded_simulations})
-
-        redis_client.redis.set(RedisKeys.BENCHMARKS.value, json.dumps(results))
-
-        return {"data": results}
-
-    def get_simulation_and_rankings_by_metric_name(self, metric_name):
-        """
-        Retrieves a metric and its corresponding simulations, then ranks the llms based on the mean values.
-        """
-        redis_client = RedisClient()
-        if redis_client.redis.exists(
-            f"{RedisKeys.METRIC_BENCHMARKS.value}:{metric_name}"
-        ):
-            redis_results = json.loads(
-                redis_client.redis.get(
-                    f"{RedisKeys.METRIC_BENCHMARKS.value}:{metric_name}"
-                )
-            )
-            return {"data": redis_results}
-
-        metric = self.metric_repository.get_metric_by_name(metric_name)
+        chunks = self.simulator_repository.stream_measurements(
+            llm_name,
+            metric_name,
+            _as_utc(start) if start else None,
+            _as_utc(end) if end else None,
+            EXPORT_CHUNK_SIZE,
+        )
+        return encode_measurements(chunks, export_format)
+
+    async def _compute_rankings(self):
+        rankings = await self.simulator_repository.get_metric_rankings()
+        return rankings_payload(rankings)
+
+    async def _compute_metric_rankings(
+        self, metric_name, statistic: AggregateStatistic
+    ):
+        metric = await self._get_metric(metric_name)
+        simulations = await self.simulator_repository.get_metric_statistic_by_llm(
+            metric.name, statistic
+        )
+        return metric_rankings_payload(metric.name, simulations, statistic)
+
+    async def _compute_measured_rankings(self):
+        rankings = await self.simulator_repository.get_measured_rankings()
+        return rankings_payload(rankings)
+
+    async def _compute_measured_metric_rankings(
+        self, metric_name, statistic: AggregateStatistic
+    ):
+        metric = await self._get_metric(metric_name)
+        measurements = await self.simulator_repository.get_measured_statistic_by_llm(
+            metric.name, statistic
+        )
+        return metric_rankings_payload(metric.name, measurements, statistic)
+
+    async def _get_metric(self, metric_name: str):
+        metric = await self.metric_repository.get_metric_by_name(metric_name)
         if not metric:
             raise HTTPException(status_code=404, detail="Metric not found")
+        return metric
+
+
+async def get_benchmark_service(
+    db: AsyncSession = Depends(get_async_db),
+) -> BenchmarkService:
+    """
+    Returns a BenchmarkService with the database session of the request. Like the session, it is
+    resolved on the event loop, without going through the threadpool of the sync dependencies.
+    """
+    return BenchmarkService(
+        AsyncLLMRepository(db),
+        AsyncMetricRepository(db),
+        AsyncSimulatorRepository(db),
+    )
 
-        simulations = self.simulator_repository.get_metric_means_by_llm(metric.name)
-        rounded_simulations = [
-            {"llm_name": sim[0], "mean_value": round(sim[1], 2)} for sim in simulations
-        ]
-        result = {metric.name: rounded_simulations}
 
-        redis_client.redis.set(
-            f"{RedisKeys.METRIC_BENCHMARKS.value}:{metric_name}", json.dumps(result)
+@asynccontextmanager
+async def benchmark_service_session() -> AsyncIterator[BenchmarkService]:
+    """
+    Yields a BenchmarkService with a database session of its own, closed on exit,
+    for work outliving the request that started it, such as the ranking streams.
+    """
+    async with AsyncSessionLocal() as db:
+        yield BenchmarkService(
+            AsyncLLMRepository(db),
+            AsyncMetricRepository(db),
+            AsyncSimulatorRepository(db),
         )
 
-        return {"data": result}
+
+def _history_range(
+    start: Optional[datetime], end: Optional[datetime], bucket_seconds: int
+) -> Tuple[datetime, datetime]:
+    """
+    Resolves the range of a history, the last day by default, rejecting it with a 400 if it is empty
+    or spans more than HISTORY_MAX_BUCKETS buckets.
+    """
+    end = _as_utc(end) if end else datetime.now(timezone.utc)
+    start = _as_utc(start) if start else end - HISTORY_DEFAULT_RANGE
+    if start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must be before end",
+        )
+    if (end - start).total_seconds() / bucket_seconds > HISTORY_MAX_BUCKETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"The range spans more than {HISTORY_MAX_BUCKETS} buckets",
+        )
+    return start, end
+
+
+def _as_utc(timestamp: datetime) -> datetime:
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
@@ -0,0 +1,58 @@
+import os
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import Response, status
+
+from metric_benchmark.apis.ranking_cache import CachedValue
+
+load_dotenv()
+
+RANKINGS_MAX_AGE = int(os.getenv("RANKINGS_MAX_AGE", "30"))
+
+
+def rankings_etag(generation: int) -> str:
+    """
+    Returns the ETag of the rankings computed from a generation.
+    The ETag is weak, as the same rankings are served both compressed and uncompressed.
+    """
+    return f'W/"rankings-{generation}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Returns whether an If-None-Match header matches an ETag, using the weak comparison of RFC 9110.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque_tag = etag.removeprefix("W/")
+    return any(
+        tag.strip().removeprefix("W/") == opaque_tag for tag in if_none_match.split(",")
+    )
+
+
+def cached_json_response(
+    cached: CachedValue, if_none_match: Optional[str] = None
+) -> Response:
+    """
+    Builds the response of cached rankings, tagged with the generation they were computed from.
+
+    Args:
+        cached (CachedValue): The rendered rankings and their generation.
+        if_none_match (Optional[str]): The If-None-Match header of the request.
+
+    Returns:
+        Response: 304 Not Modified without a body if the client already has these rankings,
+            otherwise the rendered rankings as they are.
+    """
+    etag = rankings_etag(cached.generation)
+    headers = {
+        "ETag": etag,
+        # the APIs require an API key, so shared caches must not store the rankings
+        "Cache-Control": f"private, max-age={RANKINGS_MAX_AGE}",
+    }
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(cached.value, media_type="application/json", headers=headers)
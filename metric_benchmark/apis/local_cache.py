@@ -0,0 +1,88 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOCAL_CACHE_MAX_ENTRIES = int(os.getenv("LOCAL_CACHE_MAX_ENTRIES", "128"))
+LOCAL_CACHE_TTL = float(os.getenv("LOCAL_CACHE_TTL", "60"))
+
+_MISSING = object()
+
+
+class LocalCache:
+    """
+    A bounded in-process cache evicting the least recently used entries and entries older than its TTL.
+
+    It is cleared whenever the rankings change. Every clear starts a new epoch, and values computed
+    during an older epoch are not stored, so a request that was computing while the rankings changed
+    cannot put the previous rankings back.
+    """
+
+    def __init__(
+        self, max_entries: int = LOCAL_CACHE_MAX_ENTRIES, ttl: float = LOCAL_CACHE_TTL
+    ):
+        """
+        Initializes an empty cache holding up to max_entries values for ttl seconds each.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.epoch = 0
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        Returns the value of a key, or default if it is missing or expired.
+        """
+        entry = self._entries.get(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, epoch: Optional[int] = None) -> None:
+        """
+        Stores the value of a key, evicting the least recently used entry if the cache is full.
+
+        Args:
+            key (str): The key of the value.
+            value (Any): The value to store.
+            epoch (Optional[int]): The epoch the value was read or computed in. The value is dropped
+                if the cache was cleared since.
+
+        Returns:
+            None
+        """
+        if self.max_entries <= 0 or (epoch is not None and epoch != self.epoch):
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Drops every entry and starts a new epoch.
+        """
+        self._entries.clear()
+        self.epoch += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_local_cache = LocalCache()
+
+
+def get_local_cache() -> LocalCache:
+    """
+    Returns the process-wide LocalCache.
+    """
+    return _local_cache
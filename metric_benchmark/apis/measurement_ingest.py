@@ -0,0 +1,498 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import orjson
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request, status
+
+from database import AsyncLLMRepository, AsyncMetricRepository, SimulatorRepository
+from database.session import AsyncSessionLocal, SessionLocal
+from logger import logging
+from redis_client import RedisKeys, get_async_redis_client
+from telemetry import (
+    MEASUREMENT_FLUSH_SIZE,
+    MEASUREMENTS_INGESTED,
+    MEASUREMENTS_PENDING,
+)
+
+load_dotenv()
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "50000"))
+INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", "0.2"))
+INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "500000"))
+INGEST_QUEUE_TIMEOUT = float(os.getenv("INGEST_QUEUE_TIMEOUT", "5"))
+INGEST_ANNOUNCE_INTERVAL = float(os.getenv("INGEST_ANNOUNCE_INTERVAL", "5"))
+INGEST_MAX_REQUEST_BYTES = int(os.getenv("INGEST_MAX_REQUEST_BYTES", str(8 << 20)))
+INGEST_DRAIN_TIMEOUT = float(os.getenv("INGEST_DRAIN_TIMEOUT", "10"))
+
+# seconds a rejected client is asked to wait before sending its batch again
+RETRY_AFTER_SECONDS = 1
+# minimum seconds between two reloads of the LLM and metric names, so unknown names cannot flood the database
+NAME_RELOAD_INTERVAL = 1.0
+# the timestamps PostgreSQL and datetime can both represent, from year 1 to 9999, in seconds since the Unix epoch
+MIN_TIMESTAMP = -62_135_596_800
+MAX_TIMESTAMP = 253_402_300_799
+
+
+class ParsedMeasurements(NamedTuple):
+    """
+    The measurements of a request, with the LLMs and metrics still referred to by name.
+    """
+
+    llm_names: List[str]
+    metric_names: List[str]
+    values: np.ndarray
+    measured_at: np.ndarray
+
+
+class MeasurementBatch(NamedTuple):
+    """
+    Measurements ready to be written, the LLM and metric IDs as 16 byte voids and the timestamps
+    in seconds since the Unix epoch.
+    """
+
+    llm_ids: np.ndarray
+    metric_ids: np.ndarray
+    values: np.ndarray
+    measured_at: np.ndarray
+
+    @property
+    def size(self) -> int:
+        return len(self.values)
+
+    @classmethod
+    def concatenate(cls, batches: List["MeasurementBatch"]) -> "MeasurementBatch":
+        """
+        Joins several batches into one, in order.
+        """
+        if len(batches) == 1:
+            return batches[0]
+        return cls(*(np.concatenate(column) for column in zip(*batches)))
+
+
+class IngestUnavailable(Exception):
+    """
+    Raised when measurements cannot be accepted for now: the queue stayed full, or writing them failed.
+    The client should send them again later.
+    """
+
+
+def parse_measurements(body: bytes, received_at: float) -> ParsedMeasurements:
+    """
+    Parses an NDJSON body of measurements, one object per line with the `llm` and `metric` names,
+    the measured `value` and an optional `timestamp`, either an ISO 8601 string, UTC if it has no offset,
+    or seconds since the Unix epoch. Measurements without a timestamp are stamped with the time they
+    were received. Blank lines are skipped.
+
+    Args:
+        body (bytes): The request body.
+        received_at (float): When the request was received, in seconds since the Unix epoch.
+
+    Raises:
+        ValueError: If a line is not a valid measurement, naming the line.
+
+    Returns:
+        ParsedMeasurements: The measurements in the order they were sent.
+    """
+    numbered = [
+        (number, line)
+        for number, line in enumerate(body.splitlines(), 1)
+        if line.strip()
+    ]
+    # the whole body is decoded in one call, and line by line only to report an error. Values out of
+    # the range of a double are rejected by the decoder, so every value is finite
+    try:
+        records = orjson.loads(b"[" + b",".join(line for _, line in numbered) + b"]")
+    except orjson.JSONDecodeError:
+        records = None
+    if records is None or len(records) != len(numbered):
+        records = [_load_line(number, line) for number, line in numbered]
+
+    llm_names = []
+    metric_names = []
+    values = np.empty(len(records))
+    measured_at = np.empty(len(records))
+    for index, ((number, _), record) in enumerate(zip(numbered, records)):
+        if not isinstance(record, dict):
+            raise ValueError(f"line {number}: expected a JSON object")
+        llm = record.get("llm")
+        metric = record.get("metric")
+        value = record.get("value")
+        if not isinstance(llm, str) or not isinstance(metric, str):
+            raise ValueError(f"line {number}: llm and metric must be strings")
+        if type(value) not in (int, float):
+            raise ValueError(f"line {number}: value must be a number")
+        llm_names.append(llm)
+        metric_names.append(metric)
+        values[index] = value
+        measured_at[index] = _timestamp(number, record.get("timestamp"), received_at)
+
+    invalid = (measured_at < MIN_TIMESTAMP) | (measured_at > MAX_TIMESTAMP)
+    if invalid.any():
+        number = numbered[int(np.argmax(invalid))][0]
+        raise ValueError(f"line {number}: timestamp is out of range")
+    return ParsedMeasurements(llm_names, metric_names, values, measured_at)
+
+
+def _load_line(number: int, line: bytes):
+    try:
+        return orjson.loads(line)
+    except orjson.JSONDecodeError as e:
+        raise ValueError(f"line {number}: {e}") from None
+
+
+def _timestamp(number: int, timestamp, received_at: float) -> float:
+    if timestamp is None:
+        return received_at
+    if type(timestamp) in (int, float):
+        return float(timestamp)
+    if isinstance(timestamp, str):
+        if timestamp.endswith(("Z", "z")):
+            timestamp = timestamp[:-1] + "+00:00"
+        try:
+            parsed = datetime.fromisoformat(timestamp)
+        except ValueError:
+            raise ValueError(
+                f"line {number}: invalid timestamp {timestamp!r}"
+            ) from None
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    raise ValueError(
+        f"line {number}: timestamp must be an ISO 8601 string or seconds since the epoch"
+    )
+
+
+NameMaps = Tuple[Dict[str, bytes], Dict[str, bytes]]
+
+
+async def load_names() -> NameMaps:
+    """
+    Reads the IDs of the LLMs and metrics by name.
+    """
+    async with AsyncSessionLocal() as db:
+        llms = await AsyncLLMRepository(db).get_llms()
+        metrics = await AsyncMetricRepository(db).get_metrics()
+    return (
+        {llm.name: llm.id.bytes for llm in llms},
+        {metric.name: metric.id.bytes for metric in metrics},
+    )
+
+
+class NameIndex:
+    """
+    Resolves the LLM and metric names of the measurements to their IDs. The names are cached, and
+    reloaded when a request refers to one the cache does not know, e.g. an LLM added to the registry
+    since the cache was loaded.
+    """
+
+    def __init__(self, load: Callable = load_names):
+        """
+        Initializes an empty index, loaded on first use with `load`.
+        """
+        self._load = load
+        self._llms: Dict[str, bytes] = {}
+        self._metrics: Dict[str, bytes] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    async def resolve(
+        self, llm_names: List[str], metric_names: List[str]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the IDs of the LLMs and metrics, as 16 byte voids in the order of the names.
+
+        Raises:
+            ValueError: If an LLM or a metric is unknown.
+        """
+        if self._unknown(llm_names, metric_names):
+            async with self._lock:
+                if self._unknown(llm_names, metric_names) and (
+                    self._loaded_at is None
+                    or time.monotonic() - self._loaded_at >= NAME_RELOAD_INTERVAL
+                ):
+                    self._llms, self._metrics = await self._load()
+                    self._loaded_at = time.monotonic()
+        return (
+            _ids(self._llms, llm_names, "LLM"),
+            _ids(self._metrics, metric_names, "metric"),
+        )
+
+    def _unknown(self, llm_names: List[str], metric_names: List[str]) -> bool:
+        return not (
+            self._llms.keys() >= set(llm_names)
+            and self._metrics.keys() >= set(metric_names)
+        )
+
+
+def _ids(ids: Dict[str, bytes], names: List[str], kind: str) -> np.ndarray:
+    try:
+        return np.frombuffer(b"".join([ids[name] for name in names]), dtype="V16")
+    except KeyError as e:
+        raise ValueError(f"Unknown {kind}: {e.args[0]}") from None
+
+
+class MeasurementWriter:
+    """
+    Coalesces the measurements of concurrent requests into bulk COPYs into the measurements table.
+
+    Requests queue their batches and wait until they are written. The writer flushes the queue once it
+    holds `batch_size` measurements, or `flush_interval` seconds after its oldest batch was queued,
+    whichever comes first, one flush at a time. A request waits for room while `max_pending`
+    measurements are queued or being written, and is rejected after `queue_timeout` seconds, so a
+    database that cannot keep up slows down the clients instead of growing the queue.
+
+    New rankings are announced after the flushes, at most every `announce_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        write: Optional[Callable[[MeasurementBatch], int]] = None,
+        batch_size: int = INGEST_BATCH_SIZE,
+        flush_interval: float = INGEST_FLUSH_INTERVAL,
+        max_pending: int = INGEST_MAX_PENDING,
+        queue_timeout: float = INGEST_QUEUE_TIMEOUT,
+        announce_interval: float = INGEST_ANNOUNCE_INTERVAL,
+    ):
+        """
+        Initializes an idle writer. `write` writes a batch from a worker thread and returns the number
+        of measurements written. It defaults to write_measurements with a repository of the writer's own.
+        """
+        self._write = write or self.write_measurements
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self.announce_interval = announce_interval
+        self._condition = asyncio.Condition()
+        self._queue: Deque[Tuple[MeasurementBatch, asyncio.Future, float]] = deque()
+        # measurements in the queue, and in the queue or being written
+        self._queued = 0
+        self._pending = 0
+        self._closing = False
+        self._repository: Optional[SimulatorRepository] = None
+        self._announced_at = -math.inf
+        self._announcement: Optional[asyncio.Task] = None
+
+    async def submit(self, batch: MeasurementBatch) -> None:
+        """
+        Queues a batch and waits until it is written. A batch larger than `max_pending` is only
+        queued once the writer is idle.
+
+        Raises:
+            IngestUnavailable: If the queue stayed full for `queue_timeout` seconds, or the batch
+                could not be written.
+        """
+        async with self._condition:
+            try:
+                await asyncio.wait_for(
+                    self._condition.wait_for(
+                        lambda: self._closing
+                        or self._pending == 0
+                        or self._pending + batch.size <= self.max_pending
+                    ),
+                    self.queue_timeout,
+                )
+            except asyncio.TimeoutError:
+                MEASUREMENTS_INGESTED.labels("overloaded").inc(batch.size)
+                raise IngestUnavailable("Too many measurements are pending") from None
+            if self._closing:
+                raise IngestUnavailable("The server is shutting down")
+            future = asyncio.get_running_loop().create_future()
+            self._queue.append((batch, future, time.monotonic()))
+            self._queued += batch.size
+            self._pending += batch.size
+            MEASUREMENTS_PENDING.set(self._pending)
+            self._condition.notify_all()
+        await future
+
+    async def run(self) -> None:
+        """
+        Flushes the queue until the writer is closed and every queued batch is written.
+        """
+        try:
+            while True:
+                taken = await self._take()
+                if not taken:
+                    return
+                size = sum(batch.size for batch, _ in taken)
+                try:
+                    await self._flush(taken, size)
+                finally:
+                    async with self._condition:
+                        self._pending -= size
+                        MEASUREMENTS_PENDING.set(self._pending)
+                        self._condition.notify_all()
+        finally:
+            if self._announcement is not None and not self._announcement.done():
+                # announce the last flushes before exiting, without waiting for the interval
+                self._announcement.cancel()
+                await self._announce(0)
+
+    async def close(self) -> None:
+        """
+        Stops accepting batches. run() returns once the queued ones are written.
+        """
+        async with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+
+    async def _take(self) -> List[Tuple[MeasurementBatch, asyncio.Future]]:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._queue or self._closing)
+            if not self._queue:
+                return []
+            deadline = self._queue[0][2] + self.flush_interval
+            while self._queued < self.batch_size and not self._closing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._condition.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            # batches are never split, a flush exceeds batch_size only with its first batch
+            taken = []
+            size = 0
+            while self._queue and (
+                not taken or size + self._queue[0][0].size <= self.batch_size
+            ):
+                batch, future, _ = self._queue.popleft()
+                taken.append((batch, future))
+                size += batch.size
+            self._queued -= size
+            return taken
+
+    async def _flush(
+        self, taken: List[Tuple[MeasurementBatch, asyncio.Future]], size: int
+    ) -> None:
+        error = None
+        try:
+            await asyncio.to_thread(
+                self._write, MeasurementBatch.concatenate([batch for batch, _ in taken])
+            )
+        except Exception as e:
+            logging.error(f"Error writing measurements: {e}")
+            error = IngestUnavailable("The measurements could not be written")
+
+        MEASUREMENTS_INGESTED.labels("failed" if error else "written").inc(size)
+        if error is None:
+            MEASUREMENT_FLUSH_SIZE.observe(size)
+            self._schedule_announcement()
+        for _, future in taken:
+            # the request may have been cancelled while waiting
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+    def write_measurements(self, batch: MeasurementBatch) -> int:
+        """
+        Writes a batch with a SimulatorRepository kept for the next flushes.
+        """
+        if self._repository is None:
+            self._repository = SimulatorRepository(SessionLocal())
+        try:
+            return self._repository.add_measurements(*batch)
+        except Exception:
+            self._repository.db.rollback()
+            raise
+
+    def _schedule_announcement(self) -> None:
+        # an announcement waiting for the interval also covers the flushes made meanwhile
+        if self._announcement is not None and not self._announcement.done():
+            return
+        delay = max(0.0, self._announced_at + self.announce_interval - time.monotonic())
+        self._announcement = asyncio.create_task(self._announce(delay))
+
+    async def _announce(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._announced_at = time.monotonic()
+        try:
+            redis = get_async_redis_client().redis
+            generation = await redis.incr(RedisKeys.BENCHMARKS_GENERATION.value)
+            await redis.publish(RedisKeys.BENCHMARKS_CHANNEL.value, generation)
+        except Exception as e:
+            logging.error(f"Error announcing ingested measurements: {e}")
+
+
+_measurement_writer: Optional[MeasurementWriter] = None
+_name_index: Optional[NameIndex] = None
+
+
+def get_measurement_writer() -> MeasurementWriter:
+    """
+    Returns the process-wide MeasurementWriter, run by the lifespan of the app.
+    """
+    global _measurement_writer
+    if _measurement_writer is None:
+        _measurement_writer = MeasurementWriter()
+    return _measurement_writer
+
+
+def get_name_index() -> NameIndex:
+    """
+    Returns the process-wide NameIndex.
+    """
+    global _name_index
+    if _name_index is None:
+        _name_index = NameIndex()
+    return _name_index
+
+
+async def read_body(request: Request, limit: int = INGEST_MAX_REQUEST_BYTES) -> bytes:
+    """
+    Reads a request body, answering 413 as soon as it exceeds `limit` bytes.
+    """
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"The body exceeds {limit} bytes, split it into smaller batches",
+            )
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def ingest(body: bytes, names: NameIndex, writer: MeasurementWriter) -> int:
+    """
+    Parses an NDJSON body of measurements and writes them.
+
+    Raises:
+        HTTPException: 422 if a measurement is invalid or refers to an unknown LLM or metric, in which
+            case none is written, or 503 with a Retry-After header if they cannot be accepted for now.
+
+    Returns:
+        int: The number of measurements written.
+    """
+    try:
+        parsed = await asyncio.to_thread(parse_measurements, body, time.time())
+        llm_ids, metric_ids = await names.resolve(parsed.llm_names, parsed.metric_names)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e)
+        )
+    batch = MeasurementBatch(llm_ids, metric_ids, parsed.values, parsed.measured_at)
+    if not batch.size:
+        return 0
+    try:
+        await writer.submit(batch)
+    except IngestUnavailable as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+        )
+    return batch.size
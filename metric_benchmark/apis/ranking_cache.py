@@ -0,0 +1,285 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+from dotenv import load_dotenv
+from redis.exceptions import LockError
+
+from logger import logging
+from metric_benchmark.apis.local_cache import LocalCache, get_local_cache
+from rankings import decode_cache_entry, encode_cache_entry, render_payload
+from redis_client import AsyncRedisClient, RedisKeys
+from telemetry import record_cache_lookup
+
+load_dotenv()
+
+CACHE_TTL = int(os.getenv("CACHE_TTL", "300"))
+CACHE_STALE_TTL = int(os.getenv("CACHE_STALE_TTL", "3600"))
+CACHE_LOCK_TTL = float(os.getenv("CACHE_LOCK_TTL", "10"))
+CACHE_LOCK_WAIT = float(os.getenv("CACHE_LOCK_WAIT", "5"))
+CACHE_POLL_INTERVAL = float(os.getenv("CACHE_POLL_INTERVAL", "0.05"))
+INVALIDATION_RECONNECT_DELAY = float(os.getenv("INVALIDATION_RECONNECT_DELAY", "1"))
+
+_MISSING = object()
+
+# recomputations in flight in this process, shared by every RankingCache
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+class CachedValue(NamedTuple):
+    """
+    A cached value, rendered to JSON bytes, with the generation of the rankings it was computed from.
+    """
+
+    value: bytes
+    generation: int
+
+
+class RankingCache:
+    """
+    A Redis cache for the rankings that recomputes each key once, however many requests miss it.
+
+    Every entry records the generation of the rankings it was computed from and until when it is fresh.
+    The simulator publishes the rankings of every new run under the next generation, which turns the
+    entries it did not publish stale rather than missing. A stale entry is served while a single request
+    recomputes it: within a process the other requests share the in-flight recomputation, and across
+    processes the recomputation is guarded by a Redis lock per key. Only requests for a key that was
+    never cached wait for the recomputation. Entries expire from Redis `ttl + stale_ttl` seconds after
+    they are written.
+
+    Fresh values are also kept in a LocalCache in front of Redis, which listen_for_invalidations
+    clears as soon as the simulator announces new rankings.
+
+    Values are cached rendered to JSON, and are returned as rendered, so serving a cached value
+    neither parses nor serializes it again.
+    """
+
+    def __init__(
+        self,
+        redis_client: AsyncRedisClient,
+        ttl: int = CACHE_TTL,
+        stale_ttl: int = CACHE_STALE_TTL,
+        lock_ttl: float = CACHE_LOCK_TTL,
+        lock_wait: float = CACHE_LOCK_WAIT,
+        local_cache: Optional[LocalCache] = None,
+    ):
+        """
+        Initializes the cache with the client it stores the entries with and its TTLs in seconds.
+        The in-process cache defaults to the one shared by the whole process.
+        """
+        self.redis_client = redis_client
+        self.local_cache = local_cache if local_cache is not None else get_local_cache()
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.lock_ttl = lock_ttl
+        self.lock_wait = lock_wait
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        fan_out: Optional[Callable[[Any], Dict[str, Any]]] = None,
+    ) -> CachedValue:
+        """
+        Returns the cached value of a key, recomputing it if it is missing or stale.
+
+        Args:
+            key (str): The key of the value.
+            compute (Callable[[], Awaitable[Any]]): Computes the value, it must be JSON serializable.
+            fan_out (Optional[Callable[[Any], Dict[str, Any]]]): Derives other entries from a computed
+                value, which are cached together with it.
+
+        Returns:
+            CachedValue: The fresh value, or the stale value while another request recomputes it,
+                rendered to JSON with the generation it was computed from.
+        """
+        cached = self.local_cache.get(key, _MISSING)
+        if cached is not _MISSING:
+            record_cache_lookup(key, "local_hit")
+            return cached
+
+        epoch = self.local_cache.epoch
+        entry, generation = await self._read(key)
+        if entry is not None and self._is_fresh(entry, generation):
+            record_cache_lookup(key, "redis_hit")
+            cached = _cached_value(entry)
+            self.local_cache.set(key, cached, epoch)
+            return cached
+
+        inflight = _inflight.get(key)
+        if inflight is not None:
+            if entry is not None:
+                record_cache_lookup(key, "stale")
+                return _cached_value(entry)
+            record_cache_lookup(key, "miss")
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        # mark the error as retrieved when no other request waits for the recomputation
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        _inflight[key] = future
+        try:
+            cached = await self._recompute(
+                key, entry, generation, epoch, compute, fan_out
+            )
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(cached)
+            return cached
+        finally:
+            del _inflight[key]
+
+    async def _recompute(
+        self,
+        key: str,
+        entry: Optional[dict],
+        generation: int,
+        epoch: int,
+        compute: Callable[[], Awaitable[Any]],
+        fan_out: Optional[Callable[[Any], Dict[str, Any]]],
+    ) -> CachedValue:
+        lock = self.redis_client.redis.lock(
+            f"{key}:lock", timeout=self.lock_ttl, blocking=False
+        )
+        if await lock.acquire():
+            record_cache_lookup(key, "miss")
+            try:
+                return await self._compute_and_store(
+                    key, generation, epoch, compute, fan_out
+                )
+            finally:
+                try:
+                    await lock.release()
+                except LockError:
+                    logging.info(f"Cache lock of {key} expired before it was released")
+
+        # another process is recomputing the key
+        if entry is not None:
+            record_cache_lookup(key, "stale")
+            return _cached_value(entry)
+        record_cache_lookup(key, "miss")
+        entry = await self._wait_for(key)
+        if entry is not None:
+            return _cached_value(entry)
+
+        logging.info(f"Timed out waiting for {key} to be cached, computing it")
+        return await self._compute_and_store(key, generation, epoch, compute, fan_out)
+
+    async def _compute_and_store(
+        self,
+        key: str,
+        generation: int,
+        epoch: int,
+        compute: Callable[[], Awaitable[Any]],
+        fan_out: Optional[Callable[[Any], Dict[str, Any]]],
+    ) -> CachedValue:
+        value = await compute()
+        values = {key: value}
+        if fan_out is not None:
+            values.update(fan_out(value))
+        bodies = {
+            cache_key: render_payload(cache_value)
+            for cache_key, cache_value in values.items()
+        }
+
+        # entries are stamped with the generation read before computing, and are only written if it
+        # is still current, so they never replace the rankings the simulator published meanwhile
+        fresh_until = time.time() + self.ttl
+        stored = await self.redis_client.set_many_if_version(
+            {
+                cache_key: encode_cache_entry(body, generation, fresh_until)
+                for cache_key, body in bodies.items()
+            },
+            RedisKeys.BENCHMARKS_GENERATION.value,
+            generation,
+            ex=self.ttl + self.stale_ttl,
+        )
+        if not stored:
+            logging.info(f"Rankings changed while computing {key}, not caching it")
+            return CachedValue(bodies[key], generation)
+        for cache_key, body in bodies.items():
+            self.local_cache.set(cache_key, CachedValue(body, generation), epoch)
+        return CachedValue(bodies[key], generation)
+
+    async def _read(self, key: str) -> Tuple[Optional[dict], int]:
+        cached_entry, generation = await self.redis_client.get_many(
+            [key, RedisKeys.BENCHMARKS_GENERATION.value]
+        )
+        return decode_cache_entry(cached_entry), int(generation or 0)
+
+    async def _wait_for(self, key: str) -> Optional[dict]:
+        deadline = time.monotonic() + self.lock_wait
+        while time.monotonic() < deadline:
+            await asyncio.sleep(CACHE_POLL_INTERVAL)
+            entry = decode_cache_entry(await self.redis_client.redis.get(key))
+            if entry is not None:
+                return entry
+        return None
+
+    @staticmethod
+    def _is_fresh(entry: dict, generation: int) -> bool:
+        if entry["generation"] != generation:
+            return False
+        return entry["fresh_until"] is None or time.time() < entry["fresh_until"]
+
+
+def _cached_value(entry: dict) -> CachedValue:
+    return CachedValue(entry["value"], entry["generation"])
+
+
+async def listen_for_invalidations(
+    redis_client: AsyncRedisClient,
+    local_cache: Optional[LocalCache] = None,
+    on_invalidation: Optional[Callable[[Optional[int]], None]] = None,
+) -> None:
+    """
+    Clears the in-process cache whenever the simulator announces new rankings on the benchmarks
+    channel. It runs until cancelled, and reconnects after errors. The cache is also cleared on every
+    (re)subscription, since announcements sent while disconnected are lost.
+
+    Args:
+        redis_client (AsyncRedisClient): The client to subscribe with.
+        local_cache (Optional[LocalCache]): The cache to clear. Defaults to the process-wide cache.
+        on_invalidation (Optional[Callable[[Optional[int]], None]]): Called after every clear with
+            the generation announced, or None when announcements may have been lost.
+
+    Returns:
+        None
+    """
+    local_cache = local_cache if local_cache is not None else get_local_cache()
+
+    def invalidate(generation: Optional[int] = None) -> None:
+        local_cache.clear()
+        if on_invalidation is not None:
+            on_invalidation(generation)
+
+    while True:
+        try:
+            async with redis_client.redis.pubsub() as pubsub:
+                await pubsub.subscribe(RedisKeys.BENCHMARKS_CHANNEL.value)
+                invalidate()
+                while True:
+                    message = await pubsub.get_message(
+                        ignore_subscribe_messages=True, timeout=1.0
+                    )
+                    if message is not None:
+                        invalidate(_announced_generation(message))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Error listening for ranking invalidations: {e}")
+            invalidate()
+            await asyncio.sleep(INVALIDATION_RECONNECT_DELAY)
+
+
+def _announced_generation(message: dict) -> Optional[int]:
+    try:
+        return int(message["data"])
+    except (TypeError, ValueError):
+        return None
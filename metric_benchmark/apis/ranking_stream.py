@@ -0,0 +1,149 @@
+import asyncio
+import os
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from metric_benchmark.apis.ranking_cache import CachedValue
+
+load_dotenv()
+
+STREAM_KEEPALIVE_INTERVAL = float(os.getenv("STREAM_KEEPALIVE_INTERVAL", "15"))
+
+
+class RankingBroadcaster:
+    """
+    Wakes up the ranking streams of the process whenever new rankings are announced.
+
+    Every stream waits on the same event, which is replaced by each announcement, so an idle
+    stream costs a suspended coroutine and no Redis connection of its own. The streams woken
+    up by an announcement share a single fetch of each ranking.
+    """
+
+    def __init__(self):
+        """
+        Initializes a broadcaster without any announcement.
+        """
+        self.generation: Optional[int] = None
+        self._announced = asyncio.Event()
+        self._snapshots: Dict[str, Tuple[Optional[int], asyncio.Future]] = {}
+
+    def announce(self, generation: Optional[int] = None) -> None:
+        """
+        Wakes up every stream waiting for new rankings.
+
+        Args:
+            generation (Optional[int]): The generation announced, None if it is unknown, e.g. when
+                announcements may have been missed while reconnecting.
+
+        Returns:
+            None
+        """
+        self.generation = generation
+        announced, self._announced = self._announced, asyncio.Event()
+        announced.set()
+
+    def next_announcement(self) -> asyncio.Event:
+        """
+        Returns the event set by the next announcement. Take it before reading the rankings,
+        so an announcement made while reading them is not missed.
+        """
+        return self._announced
+
+    async def snapshot(
+        self, key: str, fetch: Callable[[], Awaitable[CachedValue]]
+    ) -> CachedValue:
+        """
+        Returns the rankings of a key after the latest announcement, fetching them once
+        however many streams ask for them. Announcements of an unknown generation are fetched
+        by every stream.
+
+        Args:
+            key (str): The cache key of the rankings.
+            fetch (Callable[[], Awaitable[CachedValue]]): Fetches the rankings.
+
+        Returns:
+            CachedValue: The rendered rankings and their generation.
+        """
+        snapshot = self._snapshots.get(key)
+        # without a known generation, the snapshot taken after an earlier announcement may be stale
+        if (
+            snapshot is None
+            or self.generation is None
+            or snapshot[0] != self.generation
+            or _failed(snapshot[1])
+        ):
+            snapshot = (self.generation, asyncio.ensure_future(fetch()))
+            # mark the error as retrieved when every stream waiting for it was closed
+            snapshot[1].add_done_callback(
+                lambda done: done.cancelled() or done.exception()
+            )
+            self._snapshots[key] = snapshot
+        return await asyncio.shield(snapshot[1])
+
+
+def _failed(future: asyncio.Future) -> bool:
+    return future.done() and (future.cancelled() or future.exception() is not None)
+
+
+_broadcaster = RankingBroadcaster()
+
+
+def get_broadcaster() -> RankingBroadcaster:
+    """
+    Returns the process-wide RankingBroadcaster.
+    """
+    return _broadcaster
+
+
+def ranking_event(cached: CachedValue) -> bytes:
+    """
+    Encodes rendered rankings as a server-sent event named rankings, identified by their generation.
+    """
+    return (
+        b"id: %d\nevent: rankings\ndata: " % cached.generation + cached.value + b"\n\n"
+    )
+
+
+async def ranking_events(
+    key: str,
+    fetch: Callable[[], Awaitable[CachedValue]],
+    initial: CachedValue,
+    announced: asyncio.Event,
+    last_event_id: Optional[str] = None,
+    broadcaster: Optional[RankingBroadcaster] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Streams the rankings of a key as server-sent events, starting with the current rankings,
+    then the new rankings of every generation as soon as it is announced. A comment is sent
+    every STREAM_KEEPALIVE_INTERVAL seconds without announcements to keep the connection open.
+
+    Args:
+        key (str): The cache key of the rankings.
+        fetch (Callable[[], Awaitable[CachedValue]]): Fetches the rankings.
+        initial (CachedValue): The current rankings.
+        announced (asyncio.Event): The announcement taken before the current rankings were fetched.
+        last_event_id (Optional[str]): The Last-Event-ID of a reconnecting client. The current
+            rankings are not sent again if the client already received them.
+        broadcaster (Optional[RankingBroadcaster]): Defaults to the process-wide broadcaster.
+
+    Returns:
+        AsyncIterator[bytes]: The events.
+    """
+    broadcaster = broadcaster if broadcaster is not None else get_broadcaster()
+    generation = initial.generation
+    if last_event_id != str(generation):
+        yield ranking_event(initial)
+
+    while True:
+        try:
+            await asyncio.wait_for(announced.wait(), STREAM_KEEPALIVE_INTERVAL)
+        except asyncio.TimeoutError:
+            yield b": keepalive\n\n"
+            continue
+
+        announced = broadcaster.next_announcement()
+        cached = await broadcaster.snapshot(key, fetch)
+        if cached.generation != generation:
+            generation = cached.generation
+            yield ranking_event(cached)
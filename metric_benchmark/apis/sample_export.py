@@ -0,0 +1,172 @@
+import csv
+import io
+from enum import Enum
+from typing import AsyncIterator, Sequence
+
+import orjson
+import pyarrow as pa
+from sqlalchemy import Row
+
+SAMPLE_COLUMNS = ("run_id", "llm_name", "metric_name", "value")
+MEASUREMENT_COLUMNS = ("llm_name", "metric_name", "value", "measured_at")
+
+SAMPLE_SCHEMA = pa.schema(
+    [
+        ("run_id", pa.string()),
+        ("llm_name", pa.string()),
+        ("metric_name", pa.string()),
+        ("value", pa.float64()),
+    ]
+)
+MEASUREMENT_SCHEMA = pa.schema(
+    [
+        ("llm_name", pa.string()),
+        ("metric_name", pa.string()),
+        ("value", pa.float64()),
+        ("measured_at", pa.timestamp("us", tz="UTC")),
+    ]
+)
+# the columns read as UUIDs, exported as strings
+_UUID_COLUMNS = {"run_id"}
+
+
+class ExportFormat(str, Enum):
+    """
+    Enum for defining the formats the samples can be exported in.
+    """
+
+    NDJSON = "ndjson"
+    CSV = "csv"
+    ARROW = "arrow"
+
+    @property
+    def media_type(self) -> str:
+        """
+        The media type of the exported samples.
+        """
+        return {
+            ExportFormat.NDJSON: "application/x-ndjson",
+            ExportFormat.CSV: "text/csv",
+            ExportFormat.ARROW: "application/vnd.apache.arrow.stream",
+        }[self]
+
+
+async def ndjson_chunks(
+    chunks: AsyncIterator[Sequence[Row]], schema: pa.Schema = SAMPLE_SCHEMA
+) -> AsyncIterator[bytes]:
+    """
+    Encodes chunks of rows as JSON objects, one per line. UUIDs and timestamps are encoded as strings.
+    """
+    columns = schema.names
+    async for chunk in chunks:
+        yield b"".join(
+            orjson.dumps(dict(zip(columns, row)), option=orjson.OPT_APPEND_NEWLINE)
+            for row in chunk
+        )
+
+
+async def csv_chunks(
+    chunks: AsyncIterator[Sequence[Row]], schema: pa.Schema = SAMPLE_SCHEMA
+) -> AsyncIterator[bytes]:
+    """
+    Encodes chunks of rows as CSV rows, after a header row.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(schema.names)
+    yield _drain_text(buffer)
+    async for chunk in chunks:
+        writer.writerows(chunk)
+        yield _drain_text(buffer)
+
+
+async def arrow_chunks(
+    chunks: AsyncIterator[Sequence[Row]], schema: pa.Schema = SAMPLE_SCHEMA
+) -> AsyncIterator[bytes]:
+    """
+    Encodes chunks of rows as an Arrow IPC stream, with one record batch per chunk.
+    """
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        yield _drain_bytes(sink)
+        async for chunk in chunks:
+            writer.write_batch(
+                pa.record_batch(
+                    [
+                        _arrow_array(column, field)
+                        for column, field in zip(zip(*chunk), schema)
+                    ],
+                    schema=schema,
+                )
+            )
+            yield _drain_bytes(sink)
+    # the end of stream marker
+    yield _drain_bytes(sink)
+
+
+def _arrow_array(column: Sequence, field: pa.Field) -> pa.Array:
+    if field.name in _UUID_COLUMNS:
+        column = [str(value) for value in column]
+    return pa.array(column, field.type)
+
+
+def encode_samples(
+    chunks: AsyncIterator[Sequence[Row]], export_format: ExportFormat
+) -> AsyncIterator[bytes]:
+    """
+    Encodes chunks of samples in the given format, one chunk at a time,
+    so memory use does not depend on the number of samples.
+
+    Args:
+        chunks (AsyncIterator[Sequence[Row]]): Chunks of rows containing the run ID, LLM name,
+            metric name and value of the samples.
+        export_format (ExportFormat): The format to encode the samples in.
+
+    Returns:
+        AsyncIterator[bytes]: The encoded samples.
+    """
+    return _encode(chunks, export_format, SAMPLE_SCHEMA)
+
+
+def encode_measurements(
+    chunks: AsyncIterator[Sequence[Row]], export_format: ExportFormat
+) -> AsyncIterator[bytes]:
+    """
+    Encodes chunks of measurements in the given format, one chunk at a time, like encode_samples.
+
+    Args:
+        chunks (AsyncIterator[Sequence[Row]]): Chunks of rows containing the LLM name, metric name,
+            value and measurement time of the measurements.
+        export_format (ExportFormat): The format to encode the measurements in.
+
+    Returns:
+        AsyncIterator[bytes]: The encoded measurements.
+    """
+    return _encode(chunks, export_format, MEASUREMENT_SCHEMA)
+
+
+def _encode(
+    chunks: AsyncIterator[Sequence[Row]],
+    export_format: ExportFormat,
+    schema: pa.Schema,
+) -> AsyncIterator[bytes]:
+    encoders = {
+        ExportFormat.NDJSON: ndjson_chunks,
+        ExportFormat.CSV: csv_chunks,
+        ExportFormat.ARROW: arrow_chunks,
+    }
+    return encoders[export_format](chunks, schema)
+
+
+def _drain_text(buffer: io.StringIO) -> bytes:
+    text = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return text.encode()
+
+
+def _drain_bytes(buffer: io.BytesIO) -> bytes:
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
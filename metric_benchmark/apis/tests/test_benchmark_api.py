@@ -1,12 +1,23 @@
-from unittest.mock import Mock
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from unittest.mock import Mock, patch
+from uuid import uuid4
 
+import orjson
 import pytest
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.testclient import TestClient
 
-from metric_benchmark.apis.auth import verify_api_key
-from metric_benchmark.apis.benchmark_service import BenchmarkService
+from database import AggregateStatistic
+from metric_benchmark.apis.auth import verify_api_key, verify_stream_api_key
+from metric_benchmark.apis.benchmark_service import (
+    BenchmarkService,
+    get_benchmark_service,
+)
+from metric_benchmark.apis.ranking_cache import CachedValue
+from metric_benchmark.apis.sample_export import ExportFormat
+from metric_benchmark.apis.v1 import route_benchmark
 from metric_benchmark.apis.v1.route_benchmark import router
 
 load_dotenv()
@@ -24,12 +35,38 @@ def mock_benchmark_service():
     return Mock(spec=BenchmarkService)
 
 
+@pytest.fixture
+def mock_stream(mock_benchmark_service):
+    @asynccontextmanager
+    async def benchmark_service_session():
+        yield mock_benchmark_service
+
+    ranking_events = route_benchmark.ranking_events
+
+    def first_events(key, fetch, initial, announced, last_event_id=None):
+        async def events():
+            # the stream runs until the client disconnects, only its first event is tested
+            async for event in ranking_events(
+                key, fetch, initial, announced, last_event_id
+            ):
+                yield event
+                return
+            yield b": keepalive\n\n"
+
+        return events()
+
+    with patch.object(
+        route_benchmark, "benchmark_service_session", benchmark_service_session
+    ), patch.object(route_benchmark, "ranking_events", wraps=first_events) as events:
+        yield events
+
+
 @pytest.fixture(autouse=True)
 def mock_dependencies(mock_benchmark_service):
     def override_benchmark_service():
         return mock_benchmark_service
 
-    app.dependency_overrides[BenchmarkService] = override_benchmark_service
+    app.dependency_overrides[get_benchmark_service] = override_benchmark_service
 
     yield
 
@@ -41,15 +78,51 @@ def test_get_simulation_and_rankings(mock_benchmark_service):
     cached_data = [{"metric1": [{"llm_name": "LLM1", "mean_value": 0.85}]}]
 
     mock_response = {"data": cached_data}
-    mock_benchmark_service.get_simulation_and_rankings.return_value = mock_response
+    mock_benchmark_service.get_simulation_and_rankings.return_value = CachedValue(
+        orjson.dumps(mock_response), 3
+    )
 
     response = client.get("/rankings", headers={"X-API-Key": TEST_API_KEY})
 
     assert response.status_code == 200
     assert response.json() == mock_response
+    assert response.headers["ETag"] == 'W/"rankings-3"'
+    assert response.headers["Cache-Control"] == "private, max-age=30"
     mock_benchmark_service.get_simulation_and_rankings.assert_called_once()
 
 
+def test_get_simulation_and_rankings_not_modified(mock_benchmark_service):
+    app.dependency_overrides[verify_api_key] = lambda: TEST_API_KEY
+    mock_benchmark_service.get_simulation_and_rankings.return_value = CachedValue(
+        orjson.dumps({"data": []}), 3
+    )
+
+    response = client.get(
+        "/rankings",
+        headers={"X-API-Key": TEST_API_KEY, "If-None-Match": '"other", "rankings-3"'},
+    )
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == 'W/"rankings-3"'
+
+
+def test_get_simulation_and_rankings_modified(mock_benchmark_service):
+    app.dependency_overrides[verify_api_key] = lambda: TEST_API_KEY
+    mock_benchmark_service.get_simulation_and_rankings.return_value = CachedValue(
+        orjson.dumps({"data": []}), 4
+    )
+
+    response = client.get(
+        "/rankings",
+        headers={"X-API-Key": TEST_API_KEY, "If-None-Match": 'W/"rankings-3"'},
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {"data": []}
+    assert response.headers["ETag"] == 'W/"rankings-4"'
+
+
 def test_get_simulation_and_rankings_unauthorized():
     response = client.get("/rankings", headers={"X-API-Key": "wrong_key"})
 
@@ -62,7 +135,7 @@ def test_get_simulation_and_rankings_by_metric_name(mock_benchmark_service):
     metric_name = "metric1"
     mock_response = {"data": {"metric1": [{"llm_name": "LLM1", "mean_value": 0.85}]}}
     mock_benchmark_service.get_simulation_and_rankings_by_metric_name.return_value = (
-        mock_response
+        CachedValue(orjson.dumps(mock_response), 0)
     )
 
     response = client.get(
@@ -71,13 +144,291 @@ def test_get_simulation_and_rankings_by_metric_name(mock_benchmark_service):
 
     assert response.status_code == 200
     assert response.json() == mock_response
+    assert response.headers["ETag"] == 'W/"rankings-0"'
     mock_benchmark_service.get_simulation_and_rankings_by_metric_name.assert_called_once_with(
-        metric_name
+        metric_name, AggregateStatistic.MEAN
+    )
+
+
+def test_get_simulation_and_rankings_by_metric_name_not_modified(
+    mock_benchmark_service,
+):
+    app.dependency_overrides[verify_api_key] = lambda: TEST_API_KEY
+    mock_benchmark_service.get_simulation_and_rankings_by_metric_name.return_value = (
+        CachedValue(orjson.dumps({"data": {"metric1": []}}), 2)
     )
 
+    response = client.get(
+        "/rankings/metric1",
+        headers={"X-API-Key": TEST_API_KEY, "If-None-Match": 'W/"rankings-2"'},
+    )
+
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_get_simulation_and_rankings_by_metric_name_percentile(mock_benchmark_service):
+    app.dependency_overrides[verify_api_key] = lambda: TEST_API_KEY
+    mock_response = {"data": {"ttft": [{"llm_name": "LLM1", "p99_value": 1.98}]}}
+    mock_benchmark_service.get_simulation_and_rankings_by_metric_name.return_value = (
+        CachedValue(orjson.dumps(mock_response), 0)
+    )
+
+    response = client.get(
+        "/rankings/ttft",
+        params={"statistic": "p99"},
+        headers={"X-API-Key": TEST_API_KEY},
+    )
+
+    assert response.status_code == 200
+    assert response.json() == mock_response
+    mock_benchmark_service.get_simulation_and_rankings_by_metric_name.assert_called_once_with(
+        "ttft", AggregateStatistic.P99
+    )
+
+
+def test_get_simulation_and_rankings_by_metric_name_invalid_statistic(
+    mock_benchmark_service,
+):
+    app.dependency_overrides[verify_api_key] = lambda: TEST_API_KEY
+
+    response = client.get(
+        "/rankings/ttft",
+        params={"statistic": "p42"},
+        headers={"X-API-Key": TEST_API_KEY},
+    )
+
+    assert response.status_code == 422
+    mock_benchmark_service.get_simulation_and_rankings_by_metric_name.assert_not_called()
+
 
 def test_get_simulation_and_rankings_by_metric_name_unauthorized():
     response = client.get("/rankings/metric1", headers={"X-API-Key": "wrong_key"})
 
     assert response.status_code == 403
     assert response.json() == {"detail": "Invalid API key"}
+
+
+def test_get_metric_history(mock_benchmark_service):
+    app.dependency_overrides[verify_api_key] = lambda: TEST_API_KEY
+    mock_response = {"data": {"tps": [{"llm_name": "LLM1", "series": []}]}}
+    mock_benchmark_service.get_metric_history.return_value = mock_response
+
+    response = client.get(
+        "/history/tps",
+        params={
+            "statistic": "p50",
+            "start": "2026-01-01T00:00:00Z",
+            "bucket_seconds": 600,
+        },
+        headers={"X-API-Key": TEST_API_KEY},
+    )
+
+    assert response.status_code == 200
+    assert response.json() == mock_response
+    mock_benchmark_service.get_metric_history.assert_called_once_with(
+        "tps",
+        AggregateStatistic.P50,
+        datetime(2026, 1, 1, tzinfo=timezone.utc),
+        None,
+        600,
+    )
+
+
+def test_get_metric_history_invalid_bucket(mock_benchmark_service):
+    app.dependency_overrides[verify_api_key] = lambda: TEST_API_KEY
+
+    response = client.get(
+        "/history/tps",
+        params={"bucket_seconds": 1},
+        headers={"X-API-Key": TEST_API_KEY},
+    )
+
+    assert response.status_code == 422
+    mock_benchmark_service.get_metric_history.assert_not_called()
+
+
+def test_stream_rankings(mock_benchmark_service, mock_stream):
+    app.dependency_overrides[verify_stream_api_key] = lambda: TEST_API_KEY
+    mock_benchmark_service.get_simulation_and_rankings.return_value = CachedValue(
+        b'{"data":[]}', 5
+    )
+
+    response = client.get("/stream", headers={"X-API-Key": TEST_API_KEY})
+
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/event-stream")
+    assert response.headers["Cache-Control"] == "no-cache"
+    assert response.content == b'id: 5\nevent: rankings\ndata: {"data":[]}\n\n'
+    assert mock_stream.call_args.args[0] == "benchmarks"
+
+
+def test_stream_rankings_accepts_the_api_key_as_a_query_parameter(
+    mock_benchmark_service, mock_stream
+):
+    mock_benchmark_service.get_simulation_and_rankings.return_value = CachedValue(
+        b'{"data":[]}', 5
+    )
+
+    with patch("metric_benchmark.apis.auth.API_KEY", TEST_API_KEY):
+        response = client.get("/stream", params={"api_key": TEST_API_KEY})
+        rejected = client.get("/stream", params={"api_key": "wrong"})
+
+    assert response.status_code == 200
+    assert response.content == b'id: 5\nevent: rankings\ndata: {"data":[]}\n\n'
+    assert rejected.status_code == 403
+
+
+def test_stream_rankings_by_metric_name(mock_benchmark_service, mock_stream):
+    app.dependency_overrides[verify_stream_api_key] = lambda: TEST_API_KEY
+    mock_benchmark_service.get_simulation_and_rankings_by_metric_name.return_value = (
+        CachedValue(b'{"data":{}}', 5)
+    )
+
+    with patch("metric_benchmark.apis.ranking_stream.STREAM_KEEPALIVE_INTERVAL", 0.01):
+        response = client.get(
+            "/stream",
+            params={"metric_name": "ttft", "statistic": "p99"},
+            headers={"X-API-Key": TEST_API_KEY, "Last-Event-ID": "5"},
+        )
+
+    assert response.status_code == 200
+    assert response.content == b": keepalive\n\n"
+    mock_benchmark_service.get_simulation_and_rankings_by_metric_name.assert_called_once_with(
+        "ttft", AggregateStatistic.P99
+    )
+    assert mock_stream.call_args.args[0] == "benchmarks_metric:ttft:p99"
+
+
+def test_stream_rankings_unknown_metric(mock_benchmark_service, mock_stream):
+    app.dependency_overrides[verify_stream_api_key] = lambda: TEST_API_KEY
+    mock_benchmark_service.get_simulation_and_rankings_by_metric_name.side_effect = (
+        HTTPException(status_code=404, detail="Metric not found")
+    )
+
+    response = client.get(
+        "/stream",
+        params={"metric_name": "unknown"},
+        headers={"X-API-Key": TEST_API_KEY},
+    )
+
+    assert response.status_code == 404
+    mock_stream.assert_not_called()
+
+
+def test_export_samples(mock_benchmark_service, mock_stream):
+    app.dependency_overrides[verify_api_key] = lambda: TEST_API_KEY
+    run = Mock(id=uuid4())
+    mock_benchmark_service.get_sample_run.return_value = run
+
+    async def export_samples(*args):
+        yield b"run_id,llm_name,metric_name,value\r\n"
+
+    mock_benchmark_service.export_samples = Mock(side_effect=export_samples)
+
+    response = client.get(
+        "/samples",
+        params={"format": "csv", "run_id": str(run.id), "llm_name": "LLM1"},
+        headers={"X-API-Key": TEST_API_KEY},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/csv")
+    assert response.headers["Content-Disposition"] == (
+        f'attachment; filename="samples-{run.id}.csv"'
+    )
+    assert response.content == b"run_id,llm_name,metric_name,value\r\n"
+    mock_benchmark_service.get_sample_run.assert_called_once_with(run.id)
+    mock_benchmark_service.export_samples.assert_called_once_with(
+        ExportFormat.CSV, run.id, "LLM1", None
+    )
+
+
+def test_export_samples_not_found(mock_benchmark_service):
+    app.dependency_overrides[verify_api_key] = lambda: TEST_API_KEY
+    mock_benchmark_service.get_sample_run.side_effect = HTTPException(
+        status_code=404, detail="Run samples not found"
+    )
+
+    response = client.get("/samples", headers={"X-API-Key": TEST_API_KEY})
+
+    assert response.status_code == 404
+    mock_benchmark_service.export_samples.assert_not_called()
+
+
+def test_export_samples_invalid_format(mock_benchmark_service):
+    app.dependency_overrides[verify_api_key] = lambda: TEST_API_KEY
+
+    response = client.get(
+        "/samples", params={"format": "xml"}, headers={"X-API-Key": TEST_API_KEY}
+    )
+
+    assert response.status_code == 422
+    mock_benchmark_service.get_sample_run.assert_not_called()
+
+
+def test_get_measured_rankings_by_metric_name(mock_benchmark_service):
+    app.dependency_overrides[verify_api_key] = lambda: TEST_API_KEY
+    mock_response = {"data": {"tps": [{"llm_name": "LLM1", "p90_value": 85.2}]}}
+    mock_benchmark_service.get_measured_rankings_by_metric_name.return_value = (
+        CachedValue(orjson.dumps(mock_response), 4)
+    )
+
+    response = client.get(
+        "/measurements/rankings/tps",
+        params={"statistic": "p90"},
+        headers={"X-API-Key": TEST_API_KEY},
+    )
+
+    assert response.status_code == 200
+    assert response.json() == mock_response
+    mock_benchmark_service.get_measured_rankings_by_metric_name.assert_called_once_with(
+        "tps", AggregateStatistic.P90
+    )
+    mock_benchmark_service.get_simulation_and_rankings_by_metric_name.assert_not_called()
+
+
+def test_get_measurement_history(mock_benchmark_service):
+    app.dependency_overrides[verify_api_key] = lambda: TEST_API_KEY
+    mock_response = {"data": {"tps": [{"llm_name": "LLM1", "series": []}]}}
+    mock_benchmark_service.get_measurement_history.return_value = mock_response
+
+    response = client.get(
+        "/measurements/history/tps",
+        params={"end": "2026-01-01T00:00:00Z", "bucket_seconds": 60},
+        headers={"X-API-Key": TEST_API_KEY},
+    )
+
+    assert response.status_code == 200
+    assert response.json() == mock_response
+    mock_benchmark_service.get_measurement_history.assert_called_once_with(
+        "tps",
+        AggregateStatistic.MEAN,
+        None,
+        datetime(2026, 1, 1, tzinfo=timezone.utc),
+        60,
+    )
+
+
+def test_export_measurements(mock_benchmark_service, mock_stream):
+    app.dependency_overrides[verify_api_key] = lambda: TEST_API_KEY
+
+    async def export_measurements(*args):
+        yield b"llm_name,metric_name,value,measured_at\r\n"
+
+    mock_benchmark_service.export_measurements = Mock(side_effect=export_measurements)
+
+    response = client.get(
+        "/measurements",
+        params={"format": "csv", "metric_name": "tps"},
+        headers={"X-API-Key": TEST_API_KEY},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["Content-Disposition"] == (
+        'attachment; filename="measurements.csv"'
+    )
+    assert response.content == b"llm_name,metric_name,value,measured_at\r\n"
+    mock_benchmark_service.export_measurements.assert_called_once_with(
+        ExportFormat.CSV, None, "tps", None, None
+    )
@@ -1,25 +1,32 @@
 import json
-from unittest.mock import Mock, patch
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, Mock, patch
+from uuid import uuid4
 
 import pytest
 from fastapi import HTTPException
 
-from metric_benchmark.apis.benchmark_service import BenchmarkService
+from database import AggregateStatistic
+from metric_benchmark.apis.benchmark_service import EXPORT_CHUNK_SIZE, BenchmarkService
+from metric_benchmark.apis.local_cache import get_local_cache
+from metric_benchmark.apis.sample_export import ExportFormat
+from rankings import decode_cache_entry, encode_cache_entry, render_payload
 
 
 @pytest.fixture
 def mock_llm_repository():
-    return Mock()
+    return AsyncMock()
 
 
 @pytest.fixture
 def mock_metric_repository():
-    return Mock()
+    return AsyncMock()
 
 
 @pytest.fixture
 def mock_simulator_repository():
-    return Mock()
+    return AsyncMock()
 
 
 @pytest.fixture
@@ -33,90 +40,467 @@ def benchmark_service(
     )
 
 
+@pytest.fixture(autouse=True)
+def local_cache():
+    local_cache = get_local_cache()
+    local_cache.clear()
+    yield local_cache
+    local_cache.clear()
+
+
 @pytest.fixture
 def mock_redis_client():
-    with patch("metric_benchmark.apis.benchmark_service.RedisClient") as mock:
+    with patch(
+        "metric_benchmark.apis.benchmark_service.get_async_redis_client"
+    ) as mock:
+        mock.return_value = AsyncMock()
+        mock.return_value.redis.lock = Mock(return_value=AsyncMock())
+        mock.return_value.redis.lock.return_value.acquire.return_value = True
         yield mock.return_value
 
 
-def test_get_simulation_and_rankings_from_cache(benchmark_service, mock_redis_client):
+def cache_entry(value, generation=0, fresh_until=None):
+    if fresh_until is None:
+        fresh_until = time.time() + 60
+    return encode_cache_entry(render_payload(value), generation, fresh_until)
+
+
+def cached_values(mock_redis_client):
+    mapping = mock_redis_client.set_many_if_version.await_args.args[0]
+    return {
+        key: json.loads(decode_cache_entry(entry)["value"])
+        for key, entry in mapping.items()
+    }
+
+
+@pytest.mark.asyncio
+async def test_get_simulation_and_rankings_from_cache(
+    benchmark_service, mock_redis_client
+):
     cached_data = [{"metric1": [{"llm_name": "LLM1", "mean_value": 0.85}]}]
-    mock_redis_client.redis.exists.return_value = True
-    mock_redis_client.redis.get.return_value = json.dumps(cached_data)
-    result = benchmark_service.get_simulation_and_rankings()
+    mock_redis_client.get_many.return_value = [cache_entry(cached_data), None]
+    result = await benchmark_service.get_simulation_and_rankings()
 
-    assert result == {"data": cached_data}
-    mock_redis_client.redis.exists.assert_called_once()
-    mock_redis_client.redis.get.assert_called_once()
+    assert json.loads(result.value) == {"data": cached_data}
+    assert result.generation == 0
+    mock_redis_client.redis.exists.assert_not_awaited()
+    mock_redis_client.get_many.assert_awaited_once_with(
+        ["benchmarks", "benchmarks_generation"]
+    )
+    mock_redis_client.set_many_if_version.assert_not_awaited()
 
 
-def test_get_simulation_and_rankings_from_repositories(
+@pytest.mark.asyncio
+async def test_get_simulation_and_rankings_from_repositories(
     benchmark_service,
     mock_redis_client,
     mock_metric_repository,
     mock_simulator_repository,
 ):
-    mock_redis_client.redis.exists.return_value = False
-    mock_metric = Mock()
-    mock_metric.name = "metric1"
-    mock_metric_repository.get_metrics.return_value = [mock_metric]
-    mock_simulator_repository.get_metric_means_by_llm.return_value = [
-        ("LLM1", 0.854321)
+    mock_redis_client.get_many.return_value = [None, b"3"]
+    mock_simulator_repository.get_metric_rankings.return_value = [
+        ("metric1", "LLM1", 0.854321, 1),
+        ("metric1", "LLM2", 0.512345, 2),
+        ("metric2", None, None, 1),
     ]
 
-    result = benchmark_service.get_simulation_and_rankings()
+    result = await benchmark_service.get_simulation_and_rankings()
 
-    expected_data = [{"metric1": [{"llm_name": "LLM1", "mean_value": 0.85}]}]
-    assert result == {"data": expected_data}
-    mock_redis_client.redis.set.assert_called_once()
+    expected_data = [
+        {
+            "metric1": [
+                {"llm_name": "LLM1", "mean_value": 0.85},
+                {"llm_name": "LLM2", "mean_value": 0.51},
+            ]
+        },
+        {"metric2": []},
+    ]
+    assert json.loads(result.value) == {"data": expected_data}
+    assert result.generation == 3
+    mock_simulator_repository.get_metric_rankings.assert_awaited_once()
+    mock_metric_repository.get_metrics.assert_not_awaited()
+    mock_simulator_repository.get_metric_means_by_llm.assert_not_awaited()
+    assert cached_values(mock_redis_client) == {
+        "benchmarks": expected_data,
+        "benchmarks_metric:metric1": expected_data[0],
+        "benchmarks_metric:metric2": expected_data[1],
+    }
+    for entry in mock_redis_client.set_many_if_version.await_args.args[0].values():
+        assert decode_cache_entry(entry)["generation"] == 3
+    mock_redis_client.redis.lock.return_value.release.assert_awaited_once()
 
 
-def test_get_simulation_and_rankings_by_metric_name_from_cache(
+@pytest.mark.asyncio
+async def test_get_simulation_and_rankings_by_metric_name_from_cache(
     benchmark_service, mock_redis_client
 ):
     metric_name = "metric1"
     cached_data = {"metric1": [{"llm_name": "LLM1", "mean_value": 0.85}]}
-    mock_redis_client.redis.exists.return_value = True
-    mock_redis_client.redis.get.return_value = json.dumps(cached_data)
+    mock_redis_client.get_many.return_value = [cache_entry(cached_data), None]
 
-    result = benchmark_service.get_simulation_and_rankings_by_metric_name(metric_name)
+    result = await benchmark_service.get_simulation_and_rankings_by_metric_name(
+        metric_name
+    )
 
-    assert result == {"data": cached_data}
-    mock_redis_client.redis.exists.assert_called_once()
-    mock_redis_client.redis.get.assert_called_once()
+    assert json.loads(result.value) == {"data": cached_data}
+    assert result.generation == 0
+    mock_redis_client.redis.exists.assert_not_awaited()
+    mock_redis_client.get_many.assert_awaited_once_with(
+        ["benchmarks_metric:metric1", "benchmarks_generation"]
+    )
 
 
-def test_get_simulation_and_rankings_by_metric_name_from_repositories(
+@pytest.mark.asyncio
+async def test_get_simulation_and_rankings_by_metric_name_from_repositories(
     benchmark_service,
     mock_redis_client,
     mock_metric_repository,
     mock_simulator_repository,
 ):
     metric_name = "metric1"
-    mock_redis_client.redis.exists.return_value = False
+    mock_redis_client.get_many.return_value = [None, None]
     mock_metric = Mock()
     mock_metric.name = metric_name
     mock_metric_repository.get_metric_by_name.return_value = mock_metric
-    mock_simulator_repository.get_metric_means_by_llm.return_value = [
+    mock_simulator_repository.get_metric_statistic_by_llm.return_value = [
         ("LLM1", 0.854321)
     ]
 
-    result = benchmark_service.get_simulation_and_rankings_by_metric_name(metric_name)
+    result = await benchmark_service.get_simulation_and_rankings_by_metric_name(
+        metric_name
+    )
 
     expected_data = {"metric1": [{"llm_name": "LLM1", "mean_value": 0.85}]}
-    assert result == {"data": expected_data}
-    mock_redis_client.redis.set.assert_called_once()
+    assert json.loads(result.value) == {"data": expected_data}
+    assert result.generation == 0
+    mock_simulator_repository.get_metric_statistic_by_llm.assert_awaited_once_with(
+        metric_name, AggregateStatistic.MEAN
+    )
+    assert cached_values(mock_redis_client) == {
+        "benchmarks_metric:metric1": expected_data
+    }
+
+
+@pytest.mark.asyncio
+async def test_get_simulation_and_rankings_by_metric_name_percentile(
+    benchmark_service,
+    mock_redis_client,
+    mock_metric_repository,
+    mock_simulator_repository,
+):
+    mock_redis_client.get_many.return_value = [None, None]
+    mock_metric = Mock()
+    mock_metric.name = "ttft"
+    mock_metric_repository.get_metric_by_name.return_value = mock_metric
+    mock_simulator_repository.get_metric_statistic_by_llm.return_value = [
+        ("LLM1", 1.98444),
+        ("LLM2", 1.96722),
+    ]
+
+    result = await benchmark_service.get_simulation_and_rankings_by_metric_name(
+        "ttft", AggregateStatistic.P99
+    )
+
+    expected_data = {
+        "ttft": [
+            {"llm_name": "LLM1", "p99_value": 1.98},
+            {"llm_name": "LLM2", "p99_value": 1.97},
+        ]
+    }
+    assert json.loads(result.value) == {"data": expected_data}
+    assert result.generation == 0
+    mock_redis_client.get_many.assert_awaited_once_with(
+        ["benchmarks_metric:ttft:p99", "benchmarks_generation"]
+    )
+    mock_simulator_repository.get_metric_statistic_by_llm.assert_awaited_once_with(
+        "ttft", AggregateStatistic.P99
+    )
+    assert cached_values(mock_redis_client) == {
+        "benchmarks_metric:ttft:p99": expected_data
+    }
 
 
-def test_get_simulation_and_rankings_by_metric_name_not_found(
+@pytest.mark.asyncio
+async def test_get_simulation_and_rankings_by_metric_name_not_found(
     mock_redis_client, benchmark_service, mock_metric_repository
 ):
-    mock_redis_client.redis.exists.return_value = False
+    mock_redis_client.get_many.return_value = [None, None]
     metric_name = "non_existent_metric"
     mock_metric_repository.get_metric_by_name.return_value = None
 
     with pytest.raises(HTTPException) as exc_info:
-        benchmark_service.get_simulation_and_rankings_by_metric_name(metric_name)
+        await benchmark_service.get_simulation_and_rankings_by_metric_name(metric_name)
 
     assert exc_info.value.status_code == 404
     assert exc_info.value.detail == "Metric not found"
+    mock_redis_client.set_many_if_version.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_get_simulation_and_rankings_from_local_cache(
+    benchmark_service, mock_redis_client, local_cache
+):
+    cached_data = [{"metric1": [{"llm_name": "LLM1", "mean_value": 0.85}]}]
+    mock_redis_client.get_many.return_value = [cache_entry(cached_data), None]
+    await benchmark_service.get_simulation_and_rankings()
+    mock_redis_client.get_many.reset_mock()
+
+    result = await benchmark_service.get_simulation_and_rankings()
+
+    assert json.loads(result.value) == {"data": cached_data}
+    assert result.generation == 0
+    mock_redis_client.get_many.assert_not_awaited()
+
+    local_cache.clear()
+    await benchmark_service.get_simulation_and_rankings()
+    mock_redis_client.get_many.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_get_metric_history(
+    benchmark_service, mock_metric_repository, mock_simulator_repository
+):
+    mock_metric = Mock()
+    mock_metric.name = "tps"
+    mock_metric_repository.get_metric_by_name.return_value = mock_metric
+    first, second = (datetime(2026, 1, 1, hour, tzinfo=timezone.utc) for hour in (0, 1))
+    mock_simulator_repository.get_metric_history.return_value = [
+        ("LLM1", first, 80.1234),
+        ("LLM1", second, 79.8765),
+        ("LLM2", first, 81.5),
+    ]
+    end = datetime(2026, 1, 2)
+
+    result = await benchmark_service.get_metric_history(
+        "tps", AggregateStatistic.P99, end=end, bucket_seconds=3600
+    )
+
+    assert result == {
+        "data": {
+            "tps": [
+                {
+                    "llm_name": "LLM1",
+                    "series": [
+                        {"time": "2026-01-01T00:00:00+00:00", "p99_value": 80.12},
+                        {"time": "2026-01-01T01:00:00+00:00", "p99_value": 79.88},
+                    ],
+                },
+                {
+                    "llm_name": "LLM2",
+                    "series": [
+                        {"time": "2026-01-01T00:00:00+00:00", "p99_value": 81.5}
+                    ],
+                },
+            ]
+        }
+    }
+    utc_end = end.replace(tzinfo=timezone.utc)
+    mock_simulator_repository.get_metric_history.assert_awaited_once_with(
+        "tps", AggregateStatistic.P99, utc_end - timedelta(days=1), utc_end, 3600
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_metric_history_rejects_too_many_buckets(
+    benchmark_service, mock_simulator_repository
+):
+    with pytest.raises(HTTPException) as exc_info:
+        await benchmark_service.get_metric_history(
+            "tps",
+            start=datetime(2020, 1, 1),
+            end=datetime(2026, 1, 1),
+            bucket_seconds=60,
+        )
+
+    assert exc_info.value.status_code == 400
+    mock_simulator_repository.get_metric_history.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_get_metric_history_not_found(
+    benchmark_service, mock_metric_repository, mock_simulator_repository
+):
+    mock_metric_repository.get_metric_by_name.return_value = None
+
+    with pytest.raises(HTTPException) as exc_info:
+        await benchmark_service.get_metric_history("non_existent_metric")
+
+    assert exc_info.value.status_code == 404
+    mock_simulator_repository.get_metric_history.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_get_sample_run_defaults_to_current_run(
+    benchmark_service, mock_simulator_repository
+):
+    run = Mock(samples_retained=True)
+    mock_simulator_repository.get_current_run.return_value = run
+
+    assert await benchmark_service.get_sample_run() is run
+    mock_simulator_repository.get_run.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_get_sample_run_without_samples(
+    benchmark_service, mock_simulator_repository
+):
+    run_id = uuid4()
+    mock_simulator_repository.get_run.return_value = Mock(samples_retained=False)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await benchmark_service.get_sample_run(run_id)
+
+    assert exc_info.value.status_code == 404
+    mock_simulator_repository.get_run.assert_awaited_once_with(run_id)
+
+
+@pytest.mark.asyncio
+async def test_export_samples(benchmark_service, mock_simulator_repository):
+    run_id = uuid4()
+
+    async def stream_samples(*args):
+        yield [(run_id, "LLM1", "tps", 80.5)]
+
+    mock_simulator_repository.stream_samples = Mock(side_effect=stream_samples)
+
+    chunks = [
+        chunk
+        async for chunk in benchmark_service.export_samples(
+            ExportFormat.CSV, run_id, metric_name="tps"
+        )
+    ]
+
+    assert b"".join(chunks) == (
+        f"run_id,llm_name,metric_name,value\r\n{run_id},LLM1,tps,80.5\r\n".encode()
+    )
+    mock_simulator_repository.stream_samples.assert_called_once_with(
+        run_id, None, "tps", EXPORT_CHUNK_SIZE
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_measured_rankings_are_cached_apart_from_the_simulated_ones(
+    benchmark_service, mock_redis_client, mock_simulator_repository
+):
+    mock_redis_client.get_many.return_value = [None, b"3"]
+    mock_simulator_repository.get_measured_rankings.return_value = [
+        ("metric1", "LLM2", 0.612345, 1),
+        ("metric2", None, None, 1),
+    ]
+
+    result = await benchmark_service.get_measured_rankings()
+
+    expected_data = [
+        {"metric1": [{"llm_name": "LLM2", "mean_value": 0.61}]},
+        {"metric2": []},
+    ]
+    assert json.loads(result.value) == {"data": expected_data}
+    mock_simulator_repository.get_metric_rankings.assert_not_awaited()
+    assert cached_values(mock_redis_client) == {
+        "measured_benchmarks": expected_data,
+        "measured_benchmarks_metric:metric1:mean": expected_data[0],
+        "measured_benchmarks_metric:metric2:mean": expected_data[1],
+    }
+
+
+@pytest.mark.asyncio
+async def test_get_measured_rankings_by_metric_name_percentile(
+    benchmark_service,
+    mock_redis_client,
+    mock_metric_repository,
+    mock_simulator_repository,
+):
+    mock_redis_client.get_many.return_value = [None, b"3"]
+    mock_metric = Mock()
+    mock_metric.name = "tps"
+    mock_metric_repository.get_metric_by_name.return_value = mock_metric
+    mock_simulator_repository.get_measured_statistic_by_llm.return_value = [
+        ("LLM1", 92.456)
+    ]
+
+    result = await benchmark_service.get_measured_rankings_by_metric_name(
+        "tps", AggregateStatistic.P95
+    )
+
+    assert json.loads(result.value) == {
+        "data": {"tps": [{"llm_name": "LLM1", "p95_value": 92.46}]}
+    }
+    mock_simulator_repository.get_measured_statistic_by_llm.assert_awaited_once_with(
+        "tps", AggregateStatistic.P95
+    )
+    mock_simulator_repository.get_metric_statistic_by_llm.assert_not_awaited()
+    assert list(cached_values(mock_redis_client)) == [
+        "measured_benchmarks_metric:tps:p95"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_get_measurement_history(
+    benchmark_service, mock_metric_repository, mock_simulator_repository
+):
+    mock_metric = Mock()
+    mock_metric.name = "tps"
+    mock_metric_repository.get_metric_by_name.return_value = mock_metric
+    bucket = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    mock_simulator_repository.get_measurement_history.return_value = [
+        ("LLM1", bucket, 80.1234)
+    ]
+    start, end = datetime(2026, 1, 1), datetime(2026, 1, 1, 2)
+
+    result = await benchmark_service.get_measurement_history(
+        "tps", start=start, end=end, bucket_seconds=600
+    )
+
+    assert result == {
+        "data": {
+            "tps": [
+                {
+                    "llm_name": "LLM1",
+                    "series": [
+                        {"time": "2026-01-01T00:00:00+00:00", "mean_value": 80.12}
+                    ],
+                }
+            ]
+        }
+    }
+    mock_simulator_repository.get_measurement_history.assert_awaited_once_with(
+        "tps",
+        AggregateStatistic.MEAN,
+        start.replace(tzinfo=timezone.utc),
+        end.replace(tzinfo=timezone.utc),
+        600,
+    )
+    mock_simulator_repository.get_metric_history.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_export_measurements(benchmark_service, mock_simulator_repository):
+    measured_at = datetime(2026, 1, 1, 12, 30, tzinfo=timezone.utc)
+
+    async def stream_measurements(*args):
+        yield [("LLM1", "tps", 80.5, measured_at)]
+
+    mock_simulator_repository.stream_measurements = Mock(
+        side_effect=stream_measurements
+    )
+
+    chunks = [
+        chunk
+        async for chunk in benchmark_service.export_measurements(
+            ExportFormat.NDJSON, llm_name="LLM1", start=datetime(2026, 1, 1)
+        )
+    ]
+
+    assert json.loads(b"".join(chunks)) == {
+        "llm_name": "LLM1",
+        "metric_name": "tps",
+        "value": 80.5,
+        "measured_at": "2026-01-01T12:30:00+00:00",
+    }
+    mock_simulator_repository.stream_measurements.assert_called_once_with(
+        "LLM1",
+        None,
+        datetime(2026, 1, 1, tzinfo=timezone.utc),
+        None,
+        EXPORT_CHUNK_SIZE,
+    )
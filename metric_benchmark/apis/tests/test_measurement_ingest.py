@@ -0,0 +1,287 @@
+import asyncio
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import numpy as np
+import orjson
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from metric_benchmark.apis import auth
+from metric_benchmark.apis.measurement_ingest import (
+    NAME_RELOAD_INTERVAL,
+    IngestUnavailable,
+    MeasurementBatch,
+    MeasurementWriter,
+    NameIndex,
+    parse_measurements,
+)
+from metric_benchmark.apis.v1 import route_benchmark
+from metric_benchmark.apis.v1.route_benchmark import router
+
+RECEIVED_AT = 1_700_000_000.0
+LLM_ID = uuid4()
+METRIC_ID = uuid4()
+
+
+def ndjson(*records):
+    return b"\n".join(orjson.dumps(record) for record in records)
+
+
+def batch(size):
+    return MeasurementBatch(
+        np.full(size, np.void(LLM_ID.bytes)),
+        np.full(size, np.void(METRIC_ID.bytes)),
+        np.arange(size, dtype=float),
+        np.full(size, RECEIVED_AT),
+    )
+
+
+def test_measurements_are_parsed_with_their_timestamps():
+    parsed = parse_measurements(
+        ndjson(
+            {"llm": "GPT-4o", "metric": "TTFT", "value": 0.5},
+            {"llm": "GPT-4o", "metric": "TPS", "value": 120, "timestamp": 1.5e9},
+        )
+        + b"\n\n"
+        + ndjson(
+            {
+                "llm": "Claude",
+                "metric": "TTFT",
+                "value": 0.25,
+                "timestamp": "2024-01-02T03:04:05Z",
+            },
+            {
+                "llm": "Claude",
+                "metric": "TTFT",
+                "value": 0.25,
+                "timestamp": "2024-01-02T03:04:05",
+            },
+        ),
+        RECEIVED_AT,
+    )
+
+    assert parsed.llm_names == ["GPT-4o", "GPT-4o", "Claude", "Claude"]
+    assert parsed.metric_names == ["TTFT", "TPS", "TTFT", "TTFT"]
+    assert parsed.values.tolist() == [0.5, 120.0, 0.25, 0.25]
+    timestamp = datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc).timestamp()
+    assert parsed.measured_at.tolist() == [RECEIVED_AT, 1.5e9, timestamp, timestamp]
+
+
+@pytest.mark.parametrize(
+    "line, error",
+    [
+        (b'{"llm": "a", "metric": "b", "value": 1', "line 2: "),
+        (b'{"llm": "a", "metric": "b", "value": 1}, {}', "line 2: "),
+        (b'["a", "b", 1]', "line 2: expected a JSON object"),
+        (b'{"llm": "a", "metric": 1, "value": 1}', "line 2: llm and metric"),
+        (b'{"llm": "a", "metric": "b", "value": true}', "line 2: value must be"),
+        (b'{"llm": "a", "metric": "b", "value": 1e400}', "line 2: number is infinity"),
+        (
+            b'{"llm": "a", "metric": "b", "value": 1, "timestamp": "yesterday"}',
+            "line 2: invalid timestamp",
+        ),
+        (
+            b'{"llm": "a", "metric": "b", "value": 1, "timestamp": 1e20}',
+            "line 2: timestamp is out of range",
+        ),
+    ],
+)
+def test_invalid_lines_are_reported(line, error):
+    body = ndjson({"llm": "a", "metric": "b", "value": 1}) + b"\n" + line
+
+    with pytest.raises(ValueError, match=error):
+        parse_measurements(body, RECEIVED_AT)
+
+
+@pytest.mark.asyncio
+async def test_names_are_reloaded_for_unknown_names():
+    loads = []
+
+    async def load():
+        loads.append(len(loads))
+        metrics = {"TTFT": METRIC_ID.bytes}
+        if len(loads) == 1:
+            return {}, metrics
+        return {"GPT-4o": LLM_ID.bytes}, metrics
+
+    names = NameIndex(load)
+
+    for _ in range(2):
+        with pytest.raises(ValueError, match="Unknown LLM: GPT-4o"):
+            await names.resolve(["GPT-4o"], ["TTFT"])
+    # the names are reloaded at most every NAME_RELOAD_INTERVAL
+    assert loads == [0]
+    names._loaded_at -= NAME_RELOAD_INTERVAL
+    llm_ids, metric_ids = await names.resolve(["GPT-4o"], ["TTFT"])
+
+    assert loads == [0, 1]
+    assert llm_ids.tobytes() == LLM_ID.bytes
+    assert metric_ids.tobytes() == METRIC_ID.bytes
+    with pytest.raises(ValueError, match="Unknown metric: TPS"):
+        await names.resolve(["GPT-4o"], ["TPS"])
+
+
+@pytest.mark.asyncio
+async def test_concurrent_batches_are_coalesced_into_one_write():
+    writes = []
+
+    def write(measurements):
+        writes.append(measurements)
+        return measurements.size
+
+    writer = MeasurementWriter(write, batch_size=100, flush_interval=0.05)
+    running = asyncio.create_task(writer.run())
+
+    await asyncio.gather(*(writer.submit(batch(10)) for _ in range(3)))
+    await writer.close()
+    await running
+
+    assert [measurements.size for measurements in writes] == [30]
+
+
+@pytest.mark.asyncio
+async def test_a_full_batch_is_written_without_waiting_for_the_interval():
+    writes = []
+    writer = MeasurementWriter(
+        lambda measurements: writes.append(measurements.size) or measurements.size,
+        batch_size=20,
+        flush_interval=60,
+    )
+    running = asyncio.create_task(writer.run())
+
+    await asyncio.wait_for(
+        asyncio.gather(*(writer.submit(batch(10)) for _ in range(4))), 1
+    )
+    await writer.close()
+    await running
+
+    assert writes == [20, 20]
+
+
+@pytest.mark.asyncio
+async def test_batches_wait_for_room_and_are_rejected_after_the_timeout():
+    writer = MeasurementWriter(
+        lambda measurements: measurements.size, max_pending=15, queue_timeout=0.05
+    )
+    # nothing is written without run(), so the first batch keeps the queue full
+    first = asyncio.create_task(writer.submit(batch(10)))
+    await asyncio.sleep(0)
+
+    with pytest.raises(IngestUnavailable, match="Too many"):
+        await writer.submit(batch(10))
+
+    first.cancel()
+
+
+@pytest.mark.asyncio
+async def test_write_failures_are_unavailable():
+    outcomes = iter([RuntimeError("database is down"), 1])
+
+    def write(measurements):
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    writer = MeasurementWriter(write, flush_interval=0)
+    running = asyncio.create_task(writer.run())
+
+    with pytest.raises(IngestUnavailable, match="could not be written"):
+        await writer.submit(batch(1))
+    # the writer keeps flushing after a failure
+    await writer.submit(batch(1))
+
+    await writer.close()
+    await running
+
+
+class FakeWriter:
+    def __init__(self, error=None):
+        self.batches = []
+        self.error = error
+
+    async def submit(self, measurements):
+        if self.error:
+            raise self.error
+        self.batches.append(measurements)
+
+
+@pytest.fixture
+def names():
+    async def load():
+        return {"GPT-4o": LLM_ID.bytes}, {"TTFT": METRIC_ID.bytes}
+
+    return NameIndex(load)
+
+
+@pytest.fixture
+def client(names, monkeypatch):
+    monkeypatch.setattr(auth, "INGEST_API_KEYS", frozenset(["ingest"]))
+    app = FastAPI()
+    app.include_router(router)
+    monkeypatch.setattr(route_benchmark, "get_name_index", lambda: names)
+    return app, TestClient(app)
+
+
+def test_ingest_requires_an_ingest_key(client):
+    app, test_client = client
+
+    response = test_client.post(
+        "/measurements", content=b"", headers={"x-api-key": "wrong"}
+    )
+
+    assert response.status_code == 403
+
+
+def test_ingest_writes_the_measurements(client, monkeypatch):
+    app, test_client = client
+    writer = FakeWriter()
+    monkeypatch.setattr(route_benchmark, "get_measurement_writer", lambda: writer)
+
+    response = test_client.post(
+        "/measurements",
+        content=ndjson(
+            {"llm": "GPT-4o", "metric": "TTFT", "value": 0.5},
+            {"llm": "GPT-4o", "metric": "TTFT", "value": 0.75},
+        ),
+        headers={"x-api-key": "ingest"},
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {"accepted": 2}
+    (written,) = writer.batches
+    assert written.values.tolist() == [0.5, 0.75]
+    assert written.llm_ids.tobytes() == LLM_ID.bytes * 2
+
+
+def test_ingest_rejects_unknown_names(client, monkeypatch):
+    app, test_client = client
+    writer = FakeWriter()
+    monkeypatch.setattr(route_benchmark, "get_measurement_writer", lambda: writer)
+
+    response = test_client.post(
+        "/measurements",
+        content=ndjson({"llm": "Unknown", "metric": "TTFT", "value": 0.5}),
+        headers={"x-api-key": "ingest"},
+    )
+
+    assert response.status_code == 422
+    assert response.json()["detail"] == "Unknown LLM: Unknown"
+    assert writer.batches == []
+
+
+def test_ingest_asks_to_retry_when_overloaded(client, monkeypatch):
+    app, test_client = client
+    writer = FakeWriter(IngestUnavailable("Too many measurements are pending"))
+    monkeypatch.setattr(route_benchmark, "get_measurement_writer", lambda: writer)
+
+    response = test_client.post(
+        "/measurements",
+        content=ndjson({"llm": "GPT-4o", "metric": "TTFT", "value": 0.5}),
+        headers={"x-api-key": "ingest"},
+    )
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
@@ -0,0 +1,102 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from metric_benchmark.apis.auth import verify_api_key
+from metric_benchmark.main import ProfilingMiddleware
+from sampling_profiler import profiled, should_profile, wait_for_profiles
+
+app = FastAPI()
+app.add_middleware(
+    ProfilingMiddleware, path_prefix="/api/", excluded_paths=["/api/stream"]
+)
+
+
+@app.get("/api/rankings")
+async def get_rankings():
+    await asyncio.sleep(0.01)
+    return {"rankings": []}
+
+
+@app.get("/api/stream")
+@app.get("/healthz")
+def other_path():
+    return {}
+
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def profile_dir(tmp_path):
+    with patch("sampling_profiler.PROFILE_DIR", str(tmp_path)), patch(
+        "metric_benchmark.apis.auth.ADMIN_API_KEYS", frozenset(["admin"])
+    ):
+        yield tmp_path
+
+
+def test_should_profile():
+    assert should_profile(requested=True)
+    with patch("sampling_profiler.PROFILE_SAMPLE_RATE", 0):
+        assert not should_profile()
+    with patch("sampling_profiler.PROFILE_SAMPLE_RATE", 1):
+        assert should_profile()
+
+
+def test_profiled_writes_a_speedscope_profile(tmp_path):
+    with profiled("GET /api/rankings", requested=True, directory=str(tmp_path)):
+        sum(range(100_000))
+    wait_for_profiles()
+
+    (path,) = tmp_path.iterdir()
+    assert path.name.startswith("GET_api_rankings-")
+    assert path.name.endswith(".speedscope.json")
+    assert "speedscope" in json.loads(path.read_text())["$schema"]
+
+
+def test_profiled_is_a_no_op_when_not_sampled(tmp_path):
+    with patch("sampling_profiler.PROFILE_SAMPLE_RATE", 0):
+        with profiled("run", directory=str(tmp_path)) as profiler:
+            assert profiler is None
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_admin_request_with_profile_header_is_profiled(profile_dir):
+    response = client.get(
+        "/api/rankings", headers={"X-API-Key": "admin", "X-Profile": "1"}
+    )
+
+    assert response.status_code == 200
+    wait_for_profiles()
+    assert [path.name.split("-")[0] for path in profile_dir.iterdir()] == [
+        "GET_api_rankings"
+    ]
+
+
+def test_profile_header_requires_an_admin_key(profile_dir):
+    client.get("/api/rankings", headers={"X-API-Key": "1234", "X-Profile": "1"})
+    client.get("/api/rankings", headers={"X-Profile": "1"})
+    wait_for_profiles()
+
+    assert list(profile_dir.iterdir()) == []
+
+
+def test_excluded_paths_are_not_profiled(profile_dir):
+    client.get("/api/stream", headers={"X-API-Key": "admin", "X-Profile": "1"})
+    client.get("/healthz", headers={"X-API-Key": "admin", "X-Profile": "1"})
+    wait_for_profiles()
+
+    assert list(profile_dir.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_admin_keys_are_valid_api_keys():
+    with patch("metric_benchmark.apis.auth.ADMIN_API_KEYS", frozenset(["admin"])):
+        await verify_api_key("admin")
+        with pytest.raises(HTTPException):
+            await verify_api_key("other")
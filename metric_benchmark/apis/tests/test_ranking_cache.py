@@ -0,0 +1,289 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from prometheus_client import REGISTRY
+
+from metric_benchmark.apis.local_cache import LocalCache
+from metric_benchmark.apis.ranking_cache import (
+    CachedValue,
+    RankingCache,
+    listen_for_invalidations,
+)
+from rankings import decode_cache_entry, encode_cache_entry, render_payload
+
+
+def cache_entry(value, generation=0, fresh_until=None):
+    if fresh_until is None:
+        fresh_until = time.time() + 60
+    return encode_cache_entry(render_payload(value), generation, fresh_until)
+
+
+@pytest.fixture
+def mock_redis_client():
+    redis_client = AsyncMock()
+    redis_client.redis.lock = Mock(return_value=AsyncMock())
+    redis_client.redis.lock.return_value.acquire.return_value = True
+    return redis_client
+
+
+@pytest.fixture
+def ranking_cache(mock_redis_client):
+    return RankingCache(
+        mock_redis_client,
+        ttl=60,
+        stale_ttl=600,
+        lock_wait=0.5,
+        local_cache=LocalCache(),
+    )
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_is_recomputed_by_lock_holder(
+    ranking_cache, mock_redis_client
+):
+    mock_redis_client.get_many.return_value = [cache_entry("old", generation=1), b"2"]
+    compute = AsyncMock(return_value="new")
+
+    result = await ranking_cache.get_or_compute("key", compute)
+
+    assert result == CachedValue(b'"new"', 2)
+    compute.assert_awaited_once()
+    mock_redis_client.redis.lock.assert_called_once_with(
+        "key:lock", timeout=ranking_cache.lock_ttl, blocking=False
+    )
+    entry = decode_cache_entry(
+        mock_redis_client.set_many_if_version.await_args.args[0]["key"]
+    )
+    assert entry["value"] == b'"new"'
+    assert entry["generation"] == 2
+    assert mock_redis_client.set_many_if_version.await_args.args[1:] == (
+        "benchmarks_generation",
+        2,
+    )
+    assert mock_redis_client.set_many_if_version.await_args.kwargs == {"ex": 660}
+    mock_redis_client.redis.lock.return_value.release.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_expired_entry_is_recomputed(ranking_cache, mock_redis_client):
+    mock_redis_client.get_many.return_value = [
+        cache_entry("old", fresh_until=time.time() - 1),
+        None,
+    ]
+    compute = AsyncMock(return_value="new")
+
+    assert await ranking_cache.get_or_compute("key", compute) == CachedValue(
+        b'"new"', 0
+    )
+    compute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_json_entry_is_recomputed(ranking_cache, mock_redis_client):
+    mock_redis_client.get_many.return_value = [
+        b'{"generation": 0, "fresh_until": null, "value": "old"}',
+        None,
+    ]
+    compute = AsyncMock(return_value="new")
+
+    assert await ranking_cache.get_or_compute("key", compute) == CachedValue(
+        b'"new"', 0
+    )
+    compute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_is_served_while_another_process_recomputes(
+    ranking_cache, mock_redis_client
+):
+    mock_redis_client.get_many.return_value = [cache_entry("old", generation=1), b"2"]
+    mock_redis_client.redis.lock.return_value.acquire.return_value = False
+    compute = AsyncMock(return_value="new")
+
+    result = await ranking_cache.get_or_compute("key", compute)
+
+    assert result == CachedValue(b'"old"', 1)
+    compute.assert_not_awaited()
+    mock_redis_client.set_many_if_version.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_missing_entry_waits_for_another_process(
+    ranking_cache, mock_redis_client
+):
+    mock_redis_client.get_many.return_value = [None, None]
+    mock_redis_client.redis.lock.return_value.acquire.return_value = False
+    mock_redis_client.redis.get.side_effect = [None, cache_entry("new")]
+    compute = AsyncMock(return_value="computed")
+
+    with patch("metric_benchmark.apis.ranking_cache.CACHE_POLL_INTERVAL", 0):
+        result = await ranking_cache.get_or_compute("key", compute)
+
+    assert result == CachedValue(b'"new"', 0)
+    compute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_lookups_are_counted_by_key_family(ranking_cache, mock_redis_client):
+    def lookups():
+        return {
+            result: REGISTRY.get_sample_value(
+                "ranking_cache_lookups_total",
+                {"family": "benchmarks_metric", "result": result},
+            )
+            or 0
+            for result in ("local_hit", "redis_hit", "stale", "miss")
+        }
+
+    before = lookups()
+    compute = AsyncMock(return_value="new")
+
+    mock_redis_client.get_many.return_value = [None, None]
+    await ranking_cache.get_or_compute("benchmarks_metric:ttft", compute)
+    await ranking_cache.get_or_compute("benchmarks_metric:ttft", compute)
+    mock_redis_client.get_many.return_value = [cache_entry("cached"), None]
+    await ranking_cache.get_or_compute("benchmarks_metric:ttft:p99", compute)
+    mock_redis_client.get_many.return_value = [cache_entry("old", generation=1), b"2"]
+    mock_redis_client.redis.lock.return_value.acquire.return_value = False
+    await ranking_cache.get_or_compute("benchmarks_metric:tps", compute)
+
+    after = lookups()
+    assert {result: after[result] - before[result] for result in after} == {
+        "local_hit": 1,
+        "redis_hit": 1,
+        "stale": 1,
+        "miss": 1,
+    }
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_compute_once(ranking_cache, mock_redis_client):
+    mock_redis_client.get_many.return_value = [None, None]
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        return "new"
+
+    compute_mock = AsyncMock(side_effect=compute)
+
+    results = await asyncio.gather(
+        *(ranking_cache.get_or_compute("key", compute_mock) for _ in range(10))
+    )
+
+    assert results == [CachedValue(b'"new"', 0)] * 10
+    compute_mock.assert_awaited_once()
+    mock_redis_client.set_many_if_version.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_errors(ranking_cache, mock_redis_client):
+    mock_redis_client.get_many.return_value = [None, None]
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise ValueError("db down")
+
+    results = await asyncio.gather(
+        *(ranking_cache.get_or_compute("key", compute) for _ in range(3)),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(result, ValueError) for result in results)
+    mock_redis_client.set_many_if_version.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_values_of_a_previous_generation_are_not_cached(
+    ranking_cache, mock_redis_client
+):
+    mock_redis_client.get_many.return_value = [None, b"1"]
+    mock_redis_client.set_many_if_version.return_value = False
+    compute = AsyncMock(return_value="old")
+
+    assert await ranking_cache.get_or_compute("key", compute) == CachedValue(
+        b'"old"', 1
+    )
+    assert len(ranking_cache.local_cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_computed_values_are_cached_locally(ranking_cache, mock_redis_client):
+    mock_redis_client.get_many.return_value = [None, None]
+    compute = AsyncMock(return_value="new")
+
+    await ranking_cache.get_or_compute(
+        "key", compute, fan_out=lambda value: {"other": value}
+    )
+    mock_redis_client.get_many.reset_mock()
+
+    assert await ranking_cache.get_or_compute("key", compute) == CachedValue(
+        b'"new"', 0
+    )
+    assert await ranking_cache.get_or_compute("other", compute) == CachedValue(
+        b'"new"', 0
+    )
+    compute.assert_awaited_once()
+    mock_redis_client.get_many.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_stale_values_are_not_cached_locally(ranking_cache, mock_redis_client):
+    mock_redis_client.get_many.return_value = [cache_entry("old", generation=1), b"2"]
+    mock_redis_client.redis.lock.return_value.acquire.return_value = False
+
+    await ranking_cache.get_or_compute("key", AsyncMock())
+
+    assert len(ranking_cache.local_cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_values_computed_before_an_invalidation_are_not_cached_locally(
+    ranking_cache, mock_redis_client
+):
+    mock_redis_client.get_many.return_value = [None, None]
+
+    async def compute():
+        ranking_cache.local_cache.clear()
+        return "old"
+
+    assert await ranking_cache.get_or_compute("key", compute) == CachedValue(
+        b'"old"', 0
+    )
+    assert len(ranking_cache.local_cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_listen_for_invalidations_clears_local_cache(mock_redis_client):
+    local_cache = LocalCache()
+    local_cache.set("key", "value")
+    pubsub = mock_redis_client.redis.pubsub.return_value.__aenter__.return_value
+    mock_redis_client.redis.pubsub = Mock(
+        return_value=mock_redis_client.redis.pubsub.return_value
+    )
+    messages = [{"type": "message", "data": b"2"}]
+    cleared = asyncio.Event()
+    announced = []
+
+    async def get_message(**kwargs):
+        if messages:
+            local_cache.set("key", "value")
+            return messages.pop()
+        cleared.set()
+        await asyncio.sleep(1)
+
+    pubsub.get_message.side_effect = get_message
+
+    listener = asyncio.create_task(
+        listen_for_invalidations(
+            mock_redis_client, local_cache, on_invalidation=announced.append
+        )
+    )
+    await asyncio.wait_for(cleared.wait(), timeout=1)
+    listener.cancel()
+
+    pubsub.subscribe.assert_awaited_once_with("benchmarks_updates")
+    assert local_cache.get("key") is None
+    assert local_cache.epoch == 2
+    assert announced == [None, 2]
@@ -0,0 +1,129 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from metric_benchmark.apis.ranking_cache import CachedValue
+from metric_benchmark.apis.ranking_stream import (
+    RankingBroadcaster,
+    ranking_event,
+    ranking_events,
+)
+
+
+def test_ranking_event():
+    assert ranking_event(CachedValue(b'{"data":[]}', 7)) == (
+        b'id: 7\nevent: rankings\ndata: {"data":[]}\n\n'
+    )
+
+
+@pytest.mark.asyncio
+async def test_announce_wakes_up_every_waiting_stream():
+    broadcaster = RankingBroadcaster()
+    announced = broadcaster.next_announcement()
+    waiting = [asyncio.create_task(announced.wait()) for _ in range(100)]
+
+    broadcaster.announce(3)
+    await asyncio.wait_for(asyncio.gather(*waiting), timeout=1)
+
+    assert broadcaster.generation == 3
+    assert not broadcaster.next_announcement().is_set()
+
+
+@pytest.mark.asyncio
+async def test_snapshot_is_fetched_once_per_announcement():
+    broadcaster = RankingBroadcaster()
+    fetch = AsyncMock(return_value=CachedValue(b"[]", 1))
+
+    broadcaster.announce(1)
+    results = await asyncio.gather(
+        *(broadcaster.snapshot("key", fetch) for _ in range(100))
+    )
+    assert results == [CachedValue(b"[]", 1)] * 100
+    fetch.assert_awaited_once()
+
+    broadcaster.announce(2)
+    await broadcaster.snapshot("key", fetch)
+    assert fetch.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_snapshot_of_an_unknown_generation_is_not_reused():
+    broadcaster = RankingBroadcaster()
+    fetch = AsyncMock(side_effect=[CachedValue(b"[]", 1), CachedValue(b"[1]", 2)])
+
+    assert await broadcaster.snapshot("key", fetch) == CachedValue(b"[]", 1)
+    broadcaster.announce(None)
+
+    assert await broadcaster.snapshot("key", fetch) == CachedValue(b"[1]", 2)
+
+
+@pytest.mark.asyncio
+async def test_failed_snapshot_is_fetched_again():
+    broadcaster = RankingBroadcaster()
+    fetch = AsyncMock(side_effect=[RuntimeError("down"), CachedValue(b"[]", 1)])
+
+    with pytest.raises(RuntimeError):
+        await broadcaster.snapshot("key", fetch)
+
+    assert await broadcaster.snapshot("key", fetch) == CachedValue(b"[]", 1)
+
+
+@pytest.mark.asyncio
+async def test_ranking_events_streams_new_generations():
+    broadcaster = RankingBroadcaster()
+    announced = broadcaster.next_announcement()
+    fetch = AsyncMock(return_value=CachedValue(b"[2]", 2))
+    events = ranking_events(
+        "key", fetch, CachedValue(b"[1]", 1), announced, broadcaster=broadcaster
+    )
+
+    assert await events.__anext__() == ranking_event(CachedValue(b"[1]", 1))
+    # announced before the stream waits for it, as if the rankings changed while it was fetching
+    broadcaster.announce(2)
+    assert await events.__anext__() == ranking_event(CachedValue(b"[2]", 2))
+    await events.aclose()
+
+
+@pytest.mark.asyncio
+async def test_ranking_events_skips_rankings_already_received():
+    broadcaster = RankingBroadcaster()
+    announced = broadcaster.next_announcement()
+    fetch = AsyncMock(side_effect=[CachedValue(b"[1]", 1), CachedValue(b"[2]", 2)])
+    events = ranking_events(
+        "key",
+        fetch,
+        CachedValue(b"[1]", 1),
+        announced,
+        last_event_id="1",
+        broadcaster=broadcaster,
+    )
+
+    next_event = asyncio.ensure_future(events.__anext__())
+    # a reconnection of the listener announces an unknown generation, with the same rankings
+    broadcaster.announce(None)
+    while not fetch.await_count:
+        await asyncio.sleep(0)
+    broadcaster.announce(2)
+
+    assert await asyncio.wait_for(next_event, timeout=1) == ranking_event(
+        CachedValue(b"[2]", 2)
+    )
+    await events.aclose()
+
+
+@pytest.mark.asyncio
+async def test_ranking_events_keeps_idle_streams_alive():
+    broadcaster = RankingBroadcaster()
+    events = ranking_events(
+        "key",
+        AsyncMock(),
+        CachedValue(b"[1]", 1),
+        broadcaster.next_announcement(),
+        last_event_id="1",
+        broadcaster=broadcaster,
+    )
+
+    with patch("metric_benchmark.apis.ranking_stream.STREAM_KEEPALIVE_INTERVAL", 0.01):
+        assert await events.__anext__() == b": keepalive\n\n"
+    await events.aclose()
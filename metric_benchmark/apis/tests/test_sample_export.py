@@ -0,0 +1,103 @@
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import orjson
+import pyarrow as pa
+import pytest
+
+from metric_benchmark.apis.sample_export import (
+    MEASUREMENT_COLUMNS,
+    SAMPLE_COLUMNS,
+    ExportFormat,
+    encode_measurements,
+    encode_samples,
+)
+
+RUN_ID = uuid4()
+CHUNKS = [
+    [(RUN_ID, "LLM1", "tps", 80.5), (RUN_ID, "LLM2", "tps", 79.25)],
+    [(RUN_ID, "LLM1", "ttft", 1.07)],
+]
+ROWS = [
+    dict(zip(SAMPLE_COLUMNS, (str(run_id), llm_name, metric_name, value)))
+    for chunk in CHUNKS
+    for run_id, llm_name, metric_name, value in chunk
+]
+
+
+async def encode(export_format, chunks=CHUNKS):
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+
+    return [chunk async for chunk in encode_samples(stream(), export_format)]
+
+
+@pytest.mark.asyncio
+async def test_ndjson_encodes_a_line_per_sample():
+    encoded = await encode(ExportFormat.NDJSON)
+
+    assert len(encoded) == len(CHUNKS)
+    lines = b"".join(encoded).splitlines()
+    assert [orjson.loads(line) for line in lines] == ROWS
+
+
+@pytest.mark.asyncio
+async def test_csv_encodes_a_header_and_a_row_per_sample():
+    encoded = await encode(ExportFormat.CSV)
+
+    assert encoded[0] == b"run_id,llm_name,metric_name,value\r\n"
+    assert b"".join(encoded[1:]).decode().splitlines() == [
+        f"{RUN_ID},LLM1,tps,80.5",
+        f"{RUN_ID},LLM2,tps,79.25",
+        f"{RUN_ID},LLM1,ttft,1.07",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_arrow_encodes_a_record_batch_per_chunk():
+    encoded = await encode(ExportFormat.ARROW)
+
+    reader = pa.ipc.open_stream(b"".join(encoded))
+    batches = list(reader)
+    assert [batch.num_rows for batch in batches] == [2, 1]
+    assert pa.Table.from_batches(batches).to_pylist() == ROWS
+
+
+@pytest.mark.asyncio
+async def test_empty_export():
+    assert await encode(ExportFormat.NDJSON, []) == []
+    assert b"".join(await encode(ExportFormat.CSV, [])) == (
+        b"run_id,llm_name,metric_name,value\r\n"
+    )
+    reader = pa.ipc.open_stream(b"".join(await encode(ExportFormat.ARROW, [])))
+    assert reader.read_all().num_rows == 0
+    assert reader.schema.names == list(SAMPLE_COLUMNS)
+
+
+@pytest.mark.asyncio
+async def test_measurements_are_exported_with_their_timestamps():
+    measured_at = datetime(2026, 1, 1, 12, 30, tzinfo=timezone.utc)
+    chunks = [[("LLM1", "tps", 80.5, measured_at)]]
+
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+
+    async def encode_all(export_format):
+        return b"".join(
+            [chunk async for chunk in encode_measurements(stream(), export_format)]
+        )
+
+    row = dict(zip(MEASUREMENT_COLUMNS, chunks[0][0]))
+    assert orjson.loads(await encode_all(ExportFormat.NDJSON)) == {
+        **row,
+        "measured_at": "2026-01-01T12:30:00+00:00",
+    }
+    assert (await encode_all(ExportFormat.CSV)).decode().splitlines() == [
+        ",".join(MEASUREMENT_COLUMNS),
+        "LLM1,tps,80.5,2026-01-01 12:30:00+00:00",
+    ]
+    table = pa.ipc.open_stream(await encode_all(ExportFormat.ARROW)).read_all()
+    assert table.schema.field("measured_at").type == pa.timestamp("us", tz="UTC")
+    assert table.to_pylist() == [row]
@@ -0,0 +1,87 @@
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from telemetry import MetricsMiddleware, instrument_engine, key_family, metrics_response
+
+app = FastAPI()
+app.add_middleware(MetricsMiddleware)
+app.add_route("/metrics", metrics_response, include_in_schema=False)
+
+
+@app.get("/items/{item_id}")
+def read_item(item_id: int):
+    if item_id == 0:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return {"item_id": item_id}
+
+
+client = TestClient(app)
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_requests_are_recorded_by_route_template():
+    labels = {"method": "GET", "route": "/items/{item_id}"}
+    found = sample("http_request_duration_seconds_count", status="200", **labels)
+    not_found = sample("http_request_duration_seconds_count", status="404", **labels)
+
+    client.get("/items/1")
+    client.get("/items/2")
+    client.get("/items/0")
+
+    assert (
+        sample("http_request_duration_seconds_count", status="200", **labels)
+        == found + 2
+    )
+    assert (
+        sample("http_request_duration_seconds_count", status="404", **labels)
+        == not_found + 1
+    )
+
+
+def test_unmatched_paths_share_one_label():
+    labels = {"method": "GET", "route": "unmatched", "status": "404"}
+    before = sample("http_request_duration_seconds_count", **labels)
+
+    client.get("/unknown/1")
+    client.get("/unknown/2")
+
+    assert sample("http_request_duration_seconds_count", **labels) == before + 2
+
+
+def test_metrics_endpoint():
+    client.get("/items/1")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_request_duration_seconds_count{method="GET"' in response.text
+
+
+def test_key_family():
+    assert key_family("benchmarks") == "benchmarks"
+    assert key_family("benchmarks_metric:ttft") == "benchmarks_metric"
+    assert key_family("benchmarks_metric:ttft:p99") == "benchmarks_metric"
+
+
+def test_instrument_engine_records_statements():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine, "test")
+    labels = {"engine": "test"}
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        connection.execute(text("PRAGMA user_version"))
+        with pytest.raises(OperationalError):
+            connection.execute(text("SELECT * FROM missing"))
+        assert connection.info["query_start_times"] == []
+
+    assert sample("db_query_duration_seconds_count", operation="SELECT", **labels) == 1
+    assert sample("db_query_duration_seconds_count", operation="OTHER", **labels) == 1
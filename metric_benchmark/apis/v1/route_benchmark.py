@@ -1,25 +1,233 @@
-from fastapi import APIRouter, Depends, status
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
 
-from metric_benchmark.apis.auth import verify_api_key
-from metric_benchmark.apis.benchmark_service import BenchmarkService
+from fastapi import APIRouter, Depends, Header, Query, Request, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
+
+from database import AggregateStatistic
+from metric_benchmark.apis.auth import (
+    verify_api_key,
+    verify_ingest_api_key,
+    verify_stream_api_key,
+)
+from metric_benchmark.apis.benchmark_service import (
+    BenchmarkService,
+    benchmark_service_session,
+    get_benchmark_service,
+)
+from metric_benchmark.apis.http_cache import cached_json_response
+from metric_benchmark.apis.measurement_ingest import (
+    get_measurement_writer,
+    get_name_index,
+    ingest,
+    read_body,
+)
+from metric_benchmark.apis.ranking_cache import CachedValue
+from metric_benchmark.apis.ranking_stream import get_broadcaster, ranking_events
+from metric_benchmark.apis.sample_export import ExportFormat
+from redis_client import RedisKeys, metric_benchmarks_key
 
 router = APIRouter()
 
 
 @router.get("/rankings", status_code=status.HTTP_200_OK)
-def get_simulation_and_rankings(
-    benchmark_service: BenchmarkService = Depends(BenchmarkService),
+async def get_simulation_and_rankings(
+    if_none_match: Optional[str] = Header(None),
+    benchmark_service: BenchmarkService = Depends(get_benchmark_service),
     api_key: str = Depends(verify_api_key),
 ):
-    response = benchmark_service.get_simulation_and_rankings()
-    return response
+    response = await benchmark_service.get_simulation_and_rankings()
+    return cached_json_response(response, if_none_match)
 
 
 @router.get("/rankings/{metric_name}", status_code=status.HTTP_200_OK)
-def get_simulation_and_rankings_by_metric_name(
+async def get_simulation_and_rankings_by_metric_name(
+    metric_name: str,
+    statistic: AggregateStatistic = AggregateStatistic.MEAN,
+    if_none_match: Optional[str] = Header(None),
+    benchmark_service: BenchmarkService = Depends(get_benchmark_service),
+    api_key: str = Depends(verify_api_key),
+):
+    response = await benchmark_service.get_simulation_and_rankings_by_metric_name(
+        metric_name, statistic
+    )
+    return cached_json_response(response, if_none_match)
+
+
+@router.get(
+    "/history/{metric_name}",
+    status_code=status.HTTP_200_OK,
+    response_class=ORJSONResponse,
+)
+async def get_metric_history(
+    metric_name: str,
+    statistic: AggregateStatistic = AggregateStatistic.MEAN,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bucket_seconds: int = Query(3600, ge=60),
+    benchmark_service: BenchmarkService = Depends(get_benchmark_service),
+    api_key: str = Depends(verify_api_key),
+):
+    response = await benchmark_service.get_metric_history(
+        metric_name, statistic, start, end, bucket_seconds
+    )
+    return response
+
+
+@router.get("/stream", status_code=status.HTTP_200_OK)
+async def stream_rankings(
+    metric_name: Optional[str] = None,
+    statistic: AggregateStatistic = AggregateStatistic.MEAN,
+    last_event_id: Optional[str] = Header(None),
+    api_key: str = Depends(verify_stream_api_key),
+):
+    """
+    Streams the rankings, or those of a single metric, as server-sent events:
+    the current rankings, then the new rankings of every run as soon as the simulator publishes them.
+    The rankings are read with a session of their own, so an open stream does not hold a database connection.
+    The API key can also be sent as the `api_key` query parameter, for browsers' EventSource.
+    """
+
+    async def fetch() -> CachedValue:
+        async with benchmark_service_session() as benchmark_service:
+            if metric_name is None:
+                return await benchmark_service.get_simulation_and_rankings()
+            return await benchmark_service.get_simulation_and_rankings_by_metric_name(
+                metric_name, statistic
+            )
+
+    if metric_name is None:
+        key = RedisKeys.BENCHMARKS.value
+    else:
+        key = metric_benchmarks_key(metric_name, statistic.value)
+    announced = get_broadcaster().next_announcement()
+    # fetched before streaming, so an unknown metric is answered with a 404
+    initial = await fetch()
+    return StreamingResponse(
+        ranking_events(key, fetch, initial, announced, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/samples", status_code=status.HTTP_200_OK)
+async def export_samples(
+    format: ExportFormat = ExportFormat.NDJSON,
+    run_id: Optional[UUID] = None,
+    llm_name: Optional[str] = None,
+    metric_name: Optional[str] = None,
+    benchmark_service: BenchmarkService = Depends(get_benchmark_service),
+    api_key: str = Depends(verify_api_key),
+):
+    """
+    Exports the raw samples of a run, the current run by default, as NDJSON, CSV or an Arrow IPC stream.
+    The run is resolved before streaming, so the export is not affected by the current run changing.
+    """
+    run = await benchmark_service.get_sample_run(run_id)
+
+    async def samples():
+        # the export outlives the request session, it streams with a session of its own
+        async with benchmark_service_session() as export_service:
+            async for chunk in export_service.export_samples(
+                format, run.id, llm_name, metric_name
+            ):
+                yield chunk
+
+    return StreamingResponse(
+        samples(),
+        media_type=format.media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="samples-{run.id}.{format.value}"'
+        },
+    )
+
+
+@router.get("/measurements/rankings", status_code=status.HTTP_200_OK)
+async def get_measured_rankings(
+    if_none_match: Optional[str] = Header(None),
+    benchmark_service: BenchmarkService = Depends(get_benchmark_service),
+    api_key: str = Depends(verify_api_key),
+):
+    response = await benchmark_service.get_measured_rankings()
+    return cached_json_response(response, if_none_match)
+
+
+@router.get("/measurements/rankings/{metric_name}", status_code=status.HTTP_200_OK)
+async def get_measured_rankings_by_metric_name(
     metric_name: str,
-    benchmark_service: BenchmarkService = Depends(BenchmarkService),
+    statistic: AggregateStatistic = AggregateStatistic.MEAN,
+    if_none_match: Optional[str] = Header(None),
+    benchmark_service: BenchmarkService = Depends(get_benchmark_service),
     api_key: str = Depends(verify_api_key),
 ):
-    response = benchmark_service.get_simulation_and_rankings_by_metric_name(metric_name)
+    response = await benchmark_service.get_measured_rankings_by_metric_name(
+        metric_name, statistic
+    )
+    return cached_json_response(response, if_none_match)
+
+
+@router.get(
+    "/measurements/history/{metric_name}",
+    status_code=status.HTTP_200_OK,
+    response_class=ORJSONResponse,
+)
+async def get_measurement_history(
+    metric_name: str,
+    statistic: AggregateStatistic = AggregateStatistic.MEAN,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bucket_seconds: int = Query(3600, ge=60),
+    benchmark_service: BenchmarkService = Depends(get_benchmark_service),
+    api_key: str = Depends(verify_api_key),
+):
+    response = await benchmark_service.get_measurement_history(
+        metric_name, statistic, start, end, bucket_seconds
+    )
     return response
+
+
+@router.get("/measurements", status_code=status.HTTP_200_OK)
+async def export_measurements(
+    format: ExportFormat = ExportFormat.NDJSON,
+    llm_name: Optional[str] = None,
+    metric_name: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    api_key: str = Depends(verify_api_key),
+):
+    """
+    Exports the ingested measurements with the time they were measured, as NDJSON, CSV or an Arrow IPC stream.
+    """
+
+    async def measurements():
+        async with benchmark_service_session() as export_service:
+            async for chunk in export_service.export_measurements(
+                format, llm_name, metric_name, start, end
+            ):
+                yield chunk
+
+    return StreamingResponse(
+        measurements(),
+        media_type=format.media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="measurements.{format.value}"'
+        },
+    )
+
+
+@router.post(
+    "/measurements", status_code=status.HTTP_200_OK, response_class=ORJSONResponse
+)
+async def ingest_measurements(
+    request: Request,
+    api_key: str = Depends(verify_ingest_api_key),
+):
+    """
+    Adds an NDJSON batch of measurements, one {"llm", "metric", "value", "timestamp"} object per line,
+    and answers once they are written. The measurements are kept apart from the simulation runs, and
+    ranked under /measurements/rankings. The batches of concurrent requests are written together, and
+    a full queue is answered with a 503 to retry after the Retry-After delay.
+    """
+    body = await read_body(request)
+    return {"accepted": await ingest(body, get_name_index(), get_measurement_writer())}
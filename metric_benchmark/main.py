@@ -1,17 +1,112 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 from database import settings_config
+from metric_benchmark.apis.auth import is_admin_api_key
 from metric_benchmark.apis.base import api_router
+from metric_benchmark.apis.measurement_ingest import (
+    INGEST_DRAIN_TIMEOUT,
+    get_measurement_writer,
+)
+from metric_benchmark.apis.ranking_cache import listen_for_invalidations
+from metric_benchmark.apis.ranking_stream import get_broadcaster
+from redis_client import close_async_redis_client, get_async_redis_client
+from sampling_profiler import profiled
+from telemetry import MetricsMiddleware, metrics_response
+
+GZIP_MINIMUM_SIZE = int(os.getenv("GZIP_MINIMUM_SIZE", "1000"))
+STREAM_PATHS = ("/api/v1/benchmarks/stream",)
+PROFILED_PATH_PREFIX = "/api/v1/benchmarks/"
+PROFILE_HEADER = "x-profile"
+
+
+class StreamingGZipMiddleware(GZipMiddleware):
+    """
+    Compresses responses like GZipMiddleware, except those of the streaming paths: their events must reach
+    the client as they are sent, and every open stream would hold a compressor of its own.
+    """
+
+    def __init__(self, app: ASGIApp, excluded_paths=(), **kwargs) -> None:
+        super().__init__(app, **kwargs)
+        self.excluded_paths = frozenset(excluded_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles the requests of the paths under a prefix, except the excluded ones, and writes their profiles.
+    A PROFILE_SAMPLE_RATE fraction of the requests is profiled, and every request with an `X-Profile: 1`
+    header sent with an admin API key. Requests that are not profiled only pay for the checks.
+    """
+
+    def __init__(self, app: ASGIApp, path_prefix: str, excluded_paths=()) -> None:
+        self.app = app
+        self.path_prefix = path_prefix
+        self.excluded_paths = frozenset(excluded_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or not scope["path"].startswith(self.path_prefix)
+            or scope["path"] in self.excluded_paths
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        requested = headers.get(PROFILE_HEADER) == "1" and is_admin_api_key(
+            headers.get("x-api-key")
+        )
+        with profiled(f"{scope['method']} {scope['path']}", requested):
+            await self.app(scope, receive, send)
 
 
 def include_router(app):
     app.include_router(api_router)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # drop the rankings cached in this worker as soon as the simulator publishes new ones,
+    # and push them to the ranking streams open on this worker
+    invalidation_listener = asyncio.create_task(
+        listen_for_invalidations(
+            get_async_redis_client(), on_invalidation=get_broadcaster().announce
+        )
+    )
+    # coalesces the measurements posted to this worker into bulk writes
+    measurement_writer = asyncio.create_task(get_measurement_writer().run())
+
+    yield
+
+    # Shutdown
+    # write the measurements already accepted before closing the Redis client their announcement needs
+    await get_measurement_writer().close()
+    with suppress(asyncio.CancelledError, asyncio.TimeoutError):
+        await asyncio.wait_for(measurement_writer, INGEST_DRAIN_TIMEOUT)
+    invalidation_listener.cancel()
+    with suppress(asyncio.CancelledError):
+        await invalidation_listener
+    await close_async_redis_client()
+
+
 def start_application():
     app = FastAPI(
-        title=settings_config.PROJECT_NAME, version=settings_config.PROJECT_VERSION
+        title=settings_config.PROJECT_NAME,
+        version=settings_config.PROJECT_VERSION,
+        lifespan=lifespan,
     )
     origins = ["*"]
 
@@ -22,7 +117,22 @@ def start_application():
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    # compress the responses of clients accepting gzip once they are worth it
+    app.add_middleware(
+        StreamingGZipMiddleware,
+        excluded_paths=STREAM_PATHS,
+        minimum_size=GZIP_MINIMUM_SIZE,
+    )
+    # profile the requests including the compression of their responses
+    app.add_middleware(
+        ProfilingMiddleware,
+        path_prefix=PROFILED_PATH_PREFIX,
+        excluded_paths=STREAM_PATHS,
+    )
+    # outermost, so the recorded latencies include the other middlewares
+    app.add_middleware(MetricsMiddleware)
     include_router(app)
+    app.add_route("/metrics", metrics_response, include_in_schema=False)
     return app
 
 
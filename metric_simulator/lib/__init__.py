@@ -1,14 +1,5 @@
-from metric_simulator.lib.base import LLMBase, LLMType
-from metric_simulator.lib.claude.index import ClaudeLLM
-from metric_simulator.lib.llama.index import LLamaLLM
 from metric_simulator.lib.metric_generator import MetricGenerator
-from metric_simulator.lib.openai.index import OpenAILLM
 
 __all__ = [
-    "LLMBase",
-    "LLMType",
-    "OpenAILLM",
-    "LLamaLLM",
-    "ClaudeLLM",
     "MetricGenerator",
 ]
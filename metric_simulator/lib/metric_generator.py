@@ -1,61 +1,72 @@
-from metric_simulator.lib import ClaudeLLM, LLamaLLM, LLMType
-from metric_simulator.lib.openai.index import OpenAILLM
+from typing import Iterable, Sequence, Tuple
 
+import numpy as np
 
-class MetricGeneratorFactory:
-    @staticmethod
-    def get_llm(llm_type: LLMType, name: str, **kwargs):
-        """
-        Instantiates and returns the appropriate Language Learning Model (LLM) based on the specified LLM type.
-
-        Args:
-            llm_type (LLMType): The type of language model to use.
-            name (str): The name of the LLM instance.
-            **kwargs: Additional keyword arguments for initializing the specific LLM.
 
-        Returns:
-            OpenAILLM, LLamaLLM, or ClaudeLLM: An instance of the selected LLM based on the LLM type.
+class MetricGenerator:
+    """
+    A lookup table of the ranges of LLM and metric pairs, compiled from the registry of LLMs and metrics:
+    the rows of LLMRepository.get_metric_ranges, or of a registry file through registry_ranges.
+    The ranges of any number of pairs are looked up in one vectorized call, and carried by the work items
+    whose data points generate_items_data_points generates.
+    """
 
-        Raises:
-            ValueError: If the specified LLM type is unknown.
+    def __init__(self, rows: Iterable[Tuple[str, str, float, float]]):
         """
-        if llm_type == LLMType.OPENAI.value:
-            return OpenAILLM(name, **kwargs)
-        elif llm_type == LLMType.LLAMA.value:
-            return LLamaLLM(name, **kwargs)
-        elif llm_type == LLMType.CLAUDE.value:
-            return ClaudeLLM(name, **kwargs)
-        else:
-            raise ValueError("Unknown llm type")
+        Compiles the lookup table from (llm name, metric name, min value, max value) rows.
+        """
+        rows = list(rows)
+        self.llm_index = {}
+        self.metric_index = {}
+        for llm_name, metric_name, _, _ in rows:
+            self.llm_index.setdefault(llm_name, len(self.llm_index))
+            self.metric_index.setdefault(metric_name, len(self.metric_index))
 
+        # the min and max value of every pair, NaN for the pairs without a range
+        self.bounds = np.full((len(self.llm_index), len(self.metric_index), 2), np.nan)
+        for llm_name, metric_name, min_value, max_value in rows:
+            self.bounds[self.llm_index[llm_name], self.metric_index[metric_name]] = (
+                min_value,
+                max_value,
+            )
 
-class MetricGenerator:
-    def __init__(self, llm_type: LLMType, name: str, **kwargs):
-        self.llm = MetricGeneratorFactory.get_llm(llm_type, name, **kwargs)
+    def has_pairs(self, llm_names: Sequence[str], metrics: Sequence[str]) -> bool:
+        """
+        Returns whether the table has the range of every pair of the given LLMs and metrics.
+        """
+        try:
+            self.ranges(llm_names, metrics)
+        except ValueError:
+            return False
+        return True
 
-    def generate_data_points(self, metric: str):
+    def ranges(self, llm_names: Sequence[str], metrics: Sequence[str]) -> np.ndarray:
         """
-        Generates data points for a given metric using the underlying Language Learning Model (LLM).
-        Validates the metric name and raises an error if it is not recognized.
+        Looks up the ranges of every pair of the given LLMs and metrics.
 
         Args:
-            metric (str): The metric for which to generate data points.
+            llm_names (Sequence[str]): The names of the LLMs.
+            metrics (Sequence[str]): The names of the metrics.
 
         Returns:
-            list: A list of data points for the specified metric.
+            np.ndarray: A (len(llm_names) * len(metrics), 2) array of the min and max value of each pair,
+                the metrics of the first LLM first.
 
         Raises:
-            ValueError: If the specified metric is unknown.
+            ValueError: If one of the LLMs or metrics is unknown, or a pair has no range.
         """
-        # Mapping of metric names to methods
-        metric_methods = {
-            "ttft": self.llm.get_ttft,
-            "tps": self.llm.get_tps,
-            "e2e_latency": self.llm.get_e2e_latency,
-            "rps": self.llm.get_rps,
-        }
-        if metric not in metric_methods:
-            raise ValueError(f"Unknown metric: {metric}")
-
-        metric_values = metric_methods[metric]()
-        return metric_values
+        llm_rows = [_index(self.llm_index, "LLM", name) for name in llm_names]
+        metric_columns = [_index(self.metric_index, "metric", name) for name in metrics]
+        ranges = self.bounds[np.ix_(llm_rows, metric_columns)].reshape(-1, 2)
+        if np.isnan(ranges).any():
+            raise ValueError("Some LLM and metric pairs have no range")
+        return ranges
+
+
+def _index(index: dict, kind: str, name: str) -> int:
+    """
+    Returns the position of an LLM or metric in the table, raising a ValueError if it is unknown.
+    """
+    if name not in index:
+        raise ValueError(f"Unknown {kind}: {name}")
+    return index[name]
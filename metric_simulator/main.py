@@ -1,6 +1,6 @@
 import asyncio
 import os
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 from threading import Thread
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
@@ -17,7 +17,10 @@ from database import (
 from database.seed import seed_data
 from database.session import engine, get_db
 from logger import logging
-from metric_simulator.metric_service import MetricService
+from metric_simulator.metric_service import SIMULATION_DISTRIBUTED, MetricService
+from metric_simulator.work_queue import QUEUE_CONSUMERS, consumer_name
+from redis_client import close_async_redis_client
+from telemetry import MetricsMiddleware, metrics_response
 
 load_dotenv()
 
@@ -37,6 +40,8 @@ def start_application(lifespan):
         version=settings_config.PROJECT_VERSION,
         lifespan=lifespan,
     )
+    app.add_middleware(MetricsMiddleware)
+    app.add_route("/metrics", metrics_response, include_in_schema=False)
     create_tables()
     return app
 
@@ -69,6 +74,15 @@ async def lifespan(app: FastAPI):
 
     asyncio.create_task(run_simulate_data_points())
 
+    # retry the pairs that failed in the runs of every replica once they are due
+    background_tasks = [asyncio.create_task(metric_service.drain_retries())]
+    # write the work items of the distributed runs, whichever replica coordinates them
+    if SIMULATION_DISTRIBUTED:
+        background_tasks += [
+            asyncio.create_task(metric_service.consume_work_items(consumer_name(index)))
+            for index in range(QUEUE_CONSUMERS)
+        ]
+
     # Start the scheduler in a separate thread
     scheduler_thread = Thread(target=run_scheduler)
     scheduler_thread.start()
@@ -76,11 +90,17 @@ async def lifespan(app: FastAPI):
     yield
 
     # Shutdown
+    for task in background_tasks:
+        task.cancel()
+    for task in background_tasks:
+        with suppress(asyncio.CancelledError):
+            await task
     scheduler.shutdown()
     scheduler_thread.join(timeout=10)  # Wait up to 10 seconds for the thread to finish
     if scheduler_thread.is_alive():
         logging.info("Warning: Scheduler thread did not shut down cleanly")
     logging.info("Scheduler shutdown complete")
+    await close_async_redis_client()
 
 
 app = start_application(lifespan)
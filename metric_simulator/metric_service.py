@@ -1,19 +1,124 @@
+import asyncio
 import os
-from typing import Any
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import suppress
+from enum import Enum
+from itertools import groupby
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
 
-import redis
+import numpy as np
 from dotenv import load_dotenv
+from redis.asyncio.lock import Lock
+from redis.exceptions import LockError
 
-from database import LLMRepository, MetricRepository, SimulatorRepository
+from database import (
+    AggregateStatistic,
+    LLMRepository,
+    MetricRepository,
+    SimulationRunStatus,
+    SimulatorRepository,
+)
+from database.session import SessionLocal
 from logger import logging
 from metric_simulator.lib import MetricGenerator
-from metric_simulator.utils import retry_on_failure
-from redis_client import RedisClient, RedisKeys
+from metric_simulator.retry_queue import RETRY_POLL_INTERVAL, RetryQueue
+from metric_simulator.utils import (
+    generate_batch_data_points,
+    generate_data_points,
+    retry_on_failure,
+)
+from metric_simulator.work_queue import SIMULATION_RUN_TIMEOUT, WorkItem, WorkQueue
+from rankings import (
+    encode_cache_entry,
+    metric_rankings_payload,
+    rankings_payload,
+    render_payload,
+)
+from redis_client import (
+    RedisKeys,
+    get_async_redis_client,
+    get_redis_client,
+    metric_benchmarks_key,
+)
+from sampling_profiler import profiled
+from telemetry import (
+    SIMULATION_GENERATE_DURATION,
+    SIMULATION_INSERT_DURATION,
+    SIMULATION_ROWS_WRITTEN,
+    SIMULATION_RUN_DURATION,
+)
 
 load_dotenv()
 
 MAX_RETRIES = int(os.getenv("MAX_RETRIES", "2"))
 RETRY_DELAY = int(os.getenv("RETRY_DELAY", "60"))
+SIMULATION_WORKERS = int(os.getenv("SIMULATION_WORKERS", "1"))
+SIMULATION_DB_WRITERS = int(os.getenv("SIMULATION_DB_WRITERS", "4"))
+SIMULATION_EXECUTOR = os.getenv("SIMULATION_EXECUTOR", "process")
+SIMULATION_DISTRIBUTED = os.getenv("SIMULATION_DISTRIBUTED", "").lower() in (
+    "1",
+    "true",
+)
+PROFILE_RUNS = os.getenv("PROFILE_RUNS", "").lower() in ("1", "true")
+REGISTRY_TTL = float(os.getenv("REGISTRY_TTL", "300"))
+
+
+class SimulationExecutor(Enum):
+    """
+    Enum for defining the pools that generate data points when simulating concurrently.
+    """
+
+    PROCESS = "process"
+    THREAD = "thread"
+
+
+def generate_pair_data_points(item: WorkItem) -> np.ndarray:
+    """
+    Generates the data points of a single work item within the range it carries, recording how long it took.
+    """
+    with SIMULATION_GENERATE_DURATION.labels("pair").time():
+        return generate_data_points(
+            item.min_value, item.max_value, item.llm_name, item.metric_name
+        )
+
+
+def generate_items_data_points(items: Sequence[WorkItem]) -> np.ndarray:
+    """
+    Generates the data points of several work items in one batch, each within the range it carries.
+    Defined at module level so it can run in a process pool.
+
+    Args:
+        items (Sequence[WorkItem]): The LLM and metric pairs for which to generate data points.
+
+    Returns:
+        np.ndarray: A (len(items), 1000) array, one row of data points per item.
+    """
+    return generate_batch_data_points(
+        [(item.min_value, item.max_value) for item in items],
+        [(item.llm_name, item.metric_name) for item in items],
+    )
+
+
+def timed_generate_items_data_points(
+    items: Sequence[WorkItem],
+) -> Tuple[float, np.ndarray]:
+    """
+    Generates the data points of several work items like generate_items_data_points, and also returns
+    how long it took in seconds. The pool may run it in another process, which cannot record metrics
+    for this one.
+    """
+    start = time.perf_counter()
+    data_points = generate_items_data_points(items)
+    return time.perf_counter() - start, data_points
+
+
+def default_simulator_repository_factory() -> SimulatorRepository:
+    """
+    Returns a SimulatorRepository with its own database session.
+    """
+    return SimulatorRepository(SessionLocal())
 
 
 class MetricService:
@@ -26,81 +131,536 @@ class MetricService:
         llm_repository: LLMRepository,
         metric_repository: MetricRepository,
         simulator_repository: SimulatorRepository,
+        simulator_repository_factory: Optional[
+            Callable[[], SimulatorRepository]
+        ] = None,
+        work_queue: Optional[WorkQueue] = None,
+        retry_queue: Optional[RetryQueue] = None,
     ):
         """
         Initializes the MetricService with the provided repositories.
+        The simulator repository factory creates the repositories of the concurrent DB writers,
+        each of which needs its own session. The work queue distributes the runs across the
+        replicas, the retry queue holds the pairs to generate again, and both default to queues
+        shared through the process-wide async Redis client.
         """
         self.llm_repository = llm_repository
         self.metric_repository = metric_repository
         self.simulator_repository = simulator_repository
+        self.simulator_repository_factory = (
+            simulator_repository_factory or default_simulator_repository_factory
+        )
+        self._work_queue = work_queue
+        self._retry_queue = retry_queue
+        self._metric_generator = None
+        self._metric_generator_compiled_at = 0.0
 
-    @retry_on_failure(
-        redis_client=RedisClient(), max_retries=MAX_RETRIES, delay=RETRY_DELAY
-    )
-    async def generate_metric_data(
-        self, metric_generator: Any, metric_name: str, llm_name: str
-    ):
-        generated_metrics = metric_generator.generate_data_points(metric_name)
-        return generated_metrics
+    @property
+    def work_queue(self) -> WorkQueue:
+        # created on first use so the service does not connect to Redis unless runs are distributed
+        if self._work_queue is None:
+            self._work_queue = WorkQueue(get_async_redis_client())
+        return self._work_queue
+
+    @property
+    def retry_queue(self) -> RetryQueue:
+        if self._retry_queue is None:
+            self._retry_queue = RetryQueue(get_async_redis_client())
+        return self._retry_queue
+
+    def metric_generator(
+        self, llm_names: Sequence[str] = (), metrics: Sequence[str] = ()
+    ) -> MetricGenerator:
+        """
+        Returns the lookup table of the ranges of the LLM and metric pairs, compiled from the registry
+        in the database. The table is reused for REGISTRY_TTL seconds, and compiled again sooner if it
+        lacks one of the given pairs, e.g. for an LLM added since.
+
+        Args:
+            llm_names (Sequence[str]): The LLMs the table must have.
+            metrics (Sequence[str]): The metrics the table must have.
+
+        Returns:
+            MetricGenerator: The compiled lookup table.
+        """
+        if (
+            self._metric_generator is None
+            or time.monotonic() - self._metric_generator_compiled_at > REGISTRY_TTL
+            or not self._metric_generator.has_pairs(llm_names, metrics)
+        ):
+            self._metric_generator = MetricGenerator(
+                self.llm_repository.get_metric_ranges()
+            )
+            self._metric_generator_compiled_at = time.monotonic()
+        return self._metric_generator
+
+    @retry_on_failure(max_retries=MAX_RETRIES, delay=RETRY_DELAY)
+    async def generate_metric_data(self, item: WorkItem):
+        return generate_pair_data_points(item)
 
     async def simulate_data_points_with_retry(self):
-        redis_client = RedisClient()
+        """
+        Simulates data points under the run lock, so a single replica starts a run at a time.
+        The lock is renewed while the run is in progress, however long it takes, and expires after
+        SIMULATION_RUN_TIMEOUT seconds if its replica stops.
+        """
+        redis_client = get_async_redis_client()
         try:
-            with redis_client.redis.lock(
+            async with redis_client.redis.lock(
                 RedisKeys.RETRY_BENCHMARKS_LOCK.value,
-                timeout=MAX_RETRIES * RETRY_DELAY,
+                timeout=SIMULATION_RUN_TIMEOUT,
                 blocking=True,
                 blocking_timeout=10,
             ) as lock:
-                await self.simulate_data_points()
-        except redis.exceptions.LockError as lock_error:
+                renewal = asyncio.create_task(_keep_locked(lock))
+                try:
+                    await self.simulate_data_points()
+                finally:
+                    renewal.cancel()
+                    with suppress(asyncio.CancelledError):
+                        await renewal
+        except LockError as lock_error:
             logging.error(f"Redis lock error: {lock_error}")
         except Exception as e:
             logging.error(f"Error during simulating data points: {e}")
-        finally:
-            # Check if the lock exists and locked before trying to release
-            if "lock" in locals() and lock.locked():
-                try:
-                    lock.release()
-                except redis.exceptions.LockError:
-                    logging.info("Lock was already released")
 
     async def simulate_data_points(self):
         """
         Simulates data points for all LLMs and metrics.
-        It uses MetricGenerator to generate the data points and stores them with SimulatorRepository
-        """
-        llms = self.llm_repository.get_llms()
-        metrics = self.metric_repository.get_metrics()
-
-        # remove existing data points
-        self.remove_metrics()
-        redis_client = RedisClient()
-        for llm in llms:
-            metric_generator = MetricGenerator(llm.company_name, llm.name)
-            for metric in metrics:
-                generated_metrics = await self.generate_metric_data(
-                    metric_generator, metric.name, llm.name
+        The ranges of the pairs are looked up in the table compiled by metric_generator, and the data points
+        are generated in batches and stored with SimulatorRepository.
+        The data points are written under a new simulation run, which replaces the current run
+        atomically once it is complete. Readers keep seeing the previous run in the meantime.
+        With SIMULATION_WORKERS above 1 the LLMs are simulated concurrently, and with SIMULATION_DISTRIBUTED
+        set the LLM and metric pairs are shared with the other simulator replicas.
+        The pairs whose data points could not be generated are left out, and retried by drain_retries.
+        With PROFILE_RUNS set, or for a PROFILE_SAMPLE_RATE fraction of the runs, the run is profiled.
+        """
+        with profiled("simulation run", requested=PROFILE_RUNS):
+            start = time.perf_counter()
+            llms = self.llm_repository.get_llms()
+            metrics = self.metric_repository.get_metrics()
+            llm_names = [llm.name for llm in llms]
+            metric_names = [metric.name for metric in metrics]
+            ranges = self.metric_generator(llm_names, metric_names).ranges(
+                llm_names, metric_names
+            )
+
+            run = self.simulator_repository.create_run()
+            try:
+                items = _work_items(run.id, llms, metrics, ranges)
+                if SIMULATION_DISTRIBUTED:
+                    await self.simulate_distributed(run.id, items)
+                elif SIMULATION_WORKERS > 1:
+                    await self.simulate_concurrently(items)
+                else:
+                    await self.simulate_sequentially(items)
+                self.simulator_repository.complete_run(run.id)
+            except Exception:
+                self.simulator_repository.rollback()
+                self.simulator_repository.fail_run(run.id)
+                SIMULATION_RUN_DURATION.labels("failed").observe(
+                    time.perf_counter() - start
+                )
+                raise
+
+            self.publish_rankings(metrics)
+            SIMULATION_RUN_DURATION.labels("completed").observe(
+                time.perf_counter() - start
+            )
+
+        # remove the data points of previous runs
+        self.remove_stale_runs()
+
+    async def simulate_sequentially(self, items: List[WorkItem]):
+        """
+        Generates the data points of every LLM and metric pair in one batch, and writes them one after
+        another in a single transaction. If the batch fails, the pairs are generated one by one, so that
+        only the failed ones are left out and retried.
+
+        Args:
+            items (List[WorkItem]): The LLM and metric pairs of the run.
+        """
+        try:
+            with SIMULATION_GENERATE_DURATION.labels("run").time():
+                data_points = generate_items_data_points(items)
+        except Exception as e:
+            logging.error(
+                f"Error generating metrics in batch, retrying per pair: {str(e)}"
+            )
+            data_points = [await self.generate_metric_data(item) for item in items]
+
+        rows = 0
+        for item, generated_metrics in zip(items, data_points):
+            if generated_metrics is not None and len(generated_metrics):
+                rows += _add_metrics(
+                    self.simulator_repository,
+                    item.run_id,
+                    item.llm_id,
+                    item.metric_id,
+                    generated_metrics,
+                )
+        self.simulator_repository.commit()
+        SIMULATION_ROWS_WRITTEN.inc(rows)
+
+    async def simulate_concurrently(self, items: List[WorkItem]):
+        """
+        Generates the data points of each LLM in a pool of SIMULATION_WORKERS processes or
+        threads, and writes them with up to SIMULATION_DB_WRITERS repositories, one
+        transaction per LLM. The run stays invisible until it is completed, so the
+        transactions do not need to be the same.
+
+        Args:
+            items (List[WorkItem]): The LLM and metric pairs of the run, grouped by LLM.
+
+        Raises:
+            Exception: The first error raised while simulating an LLM, once all LLMs are done.
+        """
+        loop = asyncio.get_running_loop()
+        llm_items = [
+            list(group) for _, group in groupby(items, lambda item: item.llm_id)
+        ]
+
+        writers = [
+            self.simulator_repository_factory()
+            for _ in range(max(1, min(SIMULATION_DB_WRITERS, len(llm_items))))
+        ]
+        idle_writers = asyncio.Queue()
+        for writer in writers:
+            idle_writers.put_nowait(writer)
+
+        async def simulate_llm(items):
+            try:
+                duration, data_points = await loop.run_in_executor(
+                    generation_pool, timed_generate_items_data_points, items
+                )
+                SIMULATION_GENERATE_DURATION.labels("llm").observe(duration)
+            except Exception as e:
+                logging.error(
+                    f"Error generating metrics for LLM {items[0].llm_name} in batch, retrying per metric: {str(e)}"
+                )
+                data_points = [await self.generate_metric_data(item) for item in items]
+
+            writer = await idle_writers.get()
+            try:
+                return await loop.run_in_executor(
+                    write_pool, _write_items, writer, items, data_points
+                )
+            finally:
+                idle_writers.put_nowait(writer)
+
+        executor_class = (
+            ThreadPoolExecutor
+            if SIMULATION_EXECUTOR == SimulationExecutor.THREAD.value
+            else ProcessPoolExecutor
+        )
+        try:
+            with executor_class(
+                max_workers=SIMULATION_WORKERS
+            ) as generation_pool, ThreadPoolExecutor(
+                max_workers=len(writers)
+            ) as write_pool:
+                results = await asyncio.gather(
+                    *(simulate_llm(items) for items in llm_items),
+                    return_exceptions=True,
+                )
+        finally:
+            for writer in writers:
+                writer.close()
+
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+    async def simulate_distributed(self, run_id: UUID, items: List[WorkItem]):
+        """
+        Coordinates a run distributed across the simulator replicas: queues its work items, and waits
+        until the consumers of every replica, this one included, have written them. Each pair is written
+        in a transaction of its own by the replica that processed it.
+
+        Args:
+            run_id (UUID): The ID of the run the data points belong to.
+            items (List[WorkItem]): The LLM and metric pairs of the run.
+
+        Raises:
+            RuntimeError: If a work item failed on its last delivery.
+            TimeoutError: If the run is not finished within SIMULATION_RUN_TIMEOUT seconds.
+        """
+        await self.work_queue.enqueue(run_id, items)
+        try:
+            progress = await self.work_queue.wait(run_id)
+        finally:
+            # the items left of an unfinished run are discarded by the consumers
+            await self.work_queue.close_run(run_id)
+
+        if progress.failed:
+            raise RuntimeError(
+                f"{progress.failed} of the {progress.total} work items of run {run_id} failed"
+            )
+
+    async def consume_work_items(self, consumer: str):
+        """
+        Writes the work items of the distributed runs as one of the consumers of this replica, until
+        cancelled. The consumer writes with a repository of its own.
+
+        Args:
+            consumer (str): The name of the consumer, unique across the replicas.
+        """
+        writer = self.simulator_repository_factory()
+        try:
+            await self.work_queue.consume(
+                consumer, lambda item: self.simulate_work_item(item, writer)
+            )
+        finally:
+            writer.close()
+
+    async def simulate_work_item(
+        self, item: WorkItem, writer: SimulatorRepository
+    ) -> int:
+        """
+        Generates and writes the data points of a work item in one transaction of the writer.
+        A pair that was already written, by an earlier delivery of the item, is not written again.
+        Failures are not scheduled on the retry queue: they are raised to the work queue, which
+        delivers the item again and counts it as failed after its last delivery.
+
+        Args:
+            item (WorkItem): The LLM and metric pair to simulate.
+            writer (SimulatorRepository): The repository writing the data points.
+
+        Returns:
+            int: The number of data points written.
+        """
+        generated_metrics = generate_pair_data_points(item)
+        return await asyncio.to_thread(
+            _write_work_item, writer, item, generated_metrics
+        )
+
+    async def drain_retries(self):
+        """
+        Retries the pairs whose data points could not be generated once their retry is due, until
+        cancelled. Every replica drains the retry queue, with a repository of its own.
+        """
+        writer = self.simulator_repository_factory()
+        try:
+            while True:
+                try:
+                    await self.retry_due_pairs(writer)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    writer.rollback()
+                    logging.error(f"Error retrying simulation pairs: {e}")
+                await asyncio.sleep(RETRY_POLL_INTERVAL)
+        finally:
+            writer.close()
+
+    async def retry_due_pairs(self, writer: SimulatorRepository) -> int:
+        """
+        Generates and writes the pairs whose retry is due, each in a transaction of the writer.
+        A pair is written into its run while the run is in progress or current, and dropped once the
+        run failed or was replaced. If a pair was written into the current run, its rankings are
+        published again.
+
+        Args:
+            writer (SimulatorRepository): The repository writing the data points.
+
+        Returns:
+            int: The number of pairs written.
+        """
+        written_runs = set()
+        for retry in await self.retry_queue.claim_due():
+            if _accepts_retries(writer, retry.item.run_id):
+                if await self._simulate_pair(retry.item, writer, retry.attempt):
+                    written_runs.add(retry.item.run_id)
+            await self.retry_queue.remove(retry)
+
+        # a run completed before the pair was written does not include it in its rankings
+        current_run = writer.get_current_run()
+        if current_run is not None and current_run.id in written_runs:
+            # read with the writer, the session of the service is used by the runs meanwhile
+            self.publish_rankings(MetricRepository(writer.db).get_metrics(), writer)
+        writer.rollback()
+        return len(written_runs)
+
+    async def _simulate_pair(
+        self, item: WorkItem, writer: SimulatorRepository, attempt: int = 0
+    ) -> int:
+        generated_metrics = await self.generate_metric_data(item, attempt=attempt)
+        if generated_metrics is None or not len(generated_metrics):
+            return 0
+        return await asyncio.to_thread(
+            _write_work_item, writer, item, generated_metrics
+        )
+
+    def publish_rankings(
+        self, metrics: List[Any], repository: Optional[SimulatorRepository] = None
+    ) -> Optional[int]:
+        """
+        Computes the ranking payloads of the current run from its aggregates, for all metrics and
+        for each metric by every statistic, and publishes them to Redis in one transaction under the
+        next rankings generation, announcing it on the benchmarks channel. The benchmark API then serves
+        the new run without querying Postgres. If the publication fails, the generation is still incremented
+        and announced so the API recomputes the rankings.
+
+        Args:
+            metrics (List[Any]): The metrics to publish the rankings of.
+            repository (Optional[SimulatorRepository]): The repository to read the aggregates with.
+                Defaults to the simulator repository of the service.
+
+        Returns:
+            Optional[int]: The generation the rankings were published under, None if it failed.
+        """
+        redis_client = get_redis_client()
+        try:
+            bodies = {
+                key: render_payload(payload)
+                for key, payload in self.ranking_payloads(metrics, repository).items()
+            }
+            return redis_client.publish_versioned(
+                RedisKeys.BENCHMARKS_GENERATION.value,
+                lambda generation: {
+                    key: encode_cache_entry(body, generation)
+                    for key, body in bodies.items()
+                },
+                channel=RedisKeys.BENCHMARKS_CHANNEL.value,
+            )
+        except Exception as e:
+            logging.error(f"Error publishing rankings: {e}")
+            generation = redis_client.redis.incr(RedisKeys.BENCHMARKS_GENERATION.value)
+            redis_client.redis.publish(RedisKeys.BENCHMARKS_CHANNEL.value, generation)
+            return None
+
+    def ranking_payloads(
+        self, metrics: List[Any], repository: Optional[SimulatorRepository] = None
+    ) -> Dict[str, Any]:
+        """
+        Builds the ranking payloads of the current run, keyed by the cache key they are served from.
+        """
+        repository = repository or self.simulator_repository
+        payloads = {
+            RedisKeys.BENCHMARKS.value: rankings_payload(
+                repository.get_metric_rankings()
+            )
+        }
+        for metric in metrics:
+            for statistic in AggregateStatistic:
+                simulations = repository.get_metric_statistic_by_llm(
+                    metric.name, statistic
+                )
+                payloads[metric_benchmarks_key(metric.name, statistic.value)] = (
+                    metric_rankings_payload(metric.name, simulations, statistic)
                 )
-                if generated_metrics:
-                    self.simulator_repository.bulk_add_metrics(
-                        llm.id, metric.id, generated_metrics
-                    )
-                    redis_client.redis.delete(
-                        f"{RedisKeys.RETRY_BENCHMARKS.value}:{llm.id}:{metric.id}"
-                    )
-                    if redis_client.redis.exists(
-                        f"{RedisKeys.METRIC_BENCHMARKS.value}:{metric.name}"
-                    ):
-                        redis_client.delete_key(
-                            f"{RedisKeys.METRIC_BENCHMARKS.value}:{metric.name}"
-                        )
-
-        if redis_client.redis.exists(RedisKeys.BENCHMARKS.value):
-            redis_client.delete_key(RedisKeys.BENCHMARKS.value)
-
-    def remove_metrics(self):
+        return payloads
+
+    def remove_stale_runs(self):
+        """
+        Removes the data points of the runs that were replaced by the current run.
+        """
+        dropped_runs = self.simulator_repository.drop_stale_runs()
+        logging.info(f"Dropped {dropped_runs} stale simulation runs")
+
+    def remove_metrics(self, commit: bool = True):
         """
         Removes all metrics from the database.
         """
-        self.simulator_repository.remove_all_metrics()
+        self.simulator_repository.remove_all_metrics(commit=commit)
+
+
+async def _keep_locked(lock: Lock) -> None:
+    # renews the lock well before it expires, so it outlasts runs longer than its timeout
+    while True:
+        await asyncio.sleep(lock.timeout / 3)
+        try:
+            await lock.reacquire()
+        except Exception as e:
+            logging.error(f"Error renewing the run lock: {e}")
+
+
+def _accepts_retries(writer: SimulatorRepository, run_id: UUID) -> bool:
+    """
+    Returns whether the pairs of a run can still be written, while it is in progress or current.
+    """
+    run = writer.get_run(run_id)
+    accepts = run is not None and (
+        run.status == SimulationRunStatus.RUNNING.value or run.is_current
+    )
+    writer.rollback()
+    return accepts
+
+
+def _work_items(
+    run_id: UUID, llms: List[Any], metrics: List[Any], ranges: np.ndarray
+) -> List[WorkItem]:
+    """
+    Returns the work items of a run, the metrics of the first LLM first, with the range of each pair
+    as returned by MetricGenerator.ranges for the same LLMs and metrics.
+    """
+    pairs = [(llm, metric) for llm in llms for metric in metrics]
+    return [
+        WorkItem(run_id, llm.id, llm.name, metric.id, metric.name, min_value, max_value)
+        for (llm, metric), (min_value, max_value) in zip(pairs, ranges.tolist())
+    ]
+
+
+def _write_items(
+    writer: SimulatorRepository,
+    items: Sequence[WorkItem],
+    data_points: Sequence[Optional[np.ndarray]],
+) -> int:
+    """
+    Writes the data points of several work items in one transaction of the writer.
+    Returns the number of data points written.
+    """
+    rows = 0
+    try:
+        for item, generated_metrics in zip(items, data_points):
+            if generated_metrics is not None and len(generated_metrics):
+                rows += _add_metrics(
+                    writer, item.run_id, item.llm_id, item.metric_id, generated_metrics
+                )
+        writer.commit()
+    except Exception:
+        writer.rollback()
+        raise
+    SIMULATION_ROWS_WRITTEN.inc(rows)
+    return rows
+
+
+def _write_work_item(
+    writer: SimulatorRepository, item: WorkItem, generated_metrics: np.ndarray
+) -> int:
+    """
+    Writes the data points of a work item in one transaction of the writer, unless the pair was
+    already written. Returns the number of data points written.
+    """
+    try:
+        if not writer.lock_pair(item.run_id, item.llm_id, item.metric_id):
+            writer.rollback()
+            return 0
+        rows = _add_metrics(
+            writer, item.run_id, item.llm_id, item.metric_id, generated_metrics
+        )
+        writer.commit()
+    except Exception:
+        writer.rollback()
+        raise
+    SIMULATION_ROWS_WRITTEN.inc(rows)
+    return rows
+
+
+def _add_metrics(
+    repository: SimulatorRepository,
+    run_id: UUID,
+    llm_id: UUID,
+    metric_id: UUID,
+    generated_metrics: np.ndarray,
+) -> int:
+    """
+    Adds the data points of an LLM and metric pair to the open transaction of the repository,
+    recording how long it took. Returns the number of data points added.
+    """
+    with SIMULATION_INSERT_DURATION.time():
+        repository.bulk_add_metrics(
+            run_id, llm_id, metric_id, generated_metrics, commit=False
+        )
+    return len(generated_metrics)
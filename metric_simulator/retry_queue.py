@@ -0,0 +1,112 @@
+import json
+import os
+import random
+import time
+from typing import List, NamedTuple
+
+from dotenv import load_dotenv
+
+from metric_simulator.work_queue import WorkItem
+from redis_client import AsyncRedisClient, RedisKeys
+
+load_dotenv()
+
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "600"))
+RETRY_LEASE = float(os.getenv("RETRY_LEASE", "60"))
+RETRY_POLL_INTERVAL = float(os.getenv("RETRY_POLL_INTERVAL", "1"))
+
+# leases the due retries by moving them `lease` seconds into the future, so a single drainer takes each
+CLAIM_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[3])
+for _, member in ipairs(due) do
+    redis.call('ZADD', KEYS[1], 'XX', ARGV[2], member)
+end
+return due
+"""
+
+
+def backoff_delay(attempt: int, base: float, cap: float = RETRY_MAX_DELAY) -> float:
+    """
+    Returns the seconds to wait before an attempt, doubling from `base` for the first retry up to `cap`.
+    Half of the delay is random, so the retries of pairs that failed together are spread out.
+
+    Args:
+        attempt (int): The attempt to wait for, 1 for the first retry.
+        base (float): The delay before the first retry in seconds.
+        cap (float): The maximum delay in seconds.
+
+    Returns:
+        float: The delay in seconds.
+    """
+    delay = min(cap, base * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class Retry(NamedTuple):
+    """
+    A scheduled retry of a work item, the attempt counting from 0 for the first one.
+    """
+
+    member: str
+    item: WorkItem
+    attempt: int
+
+
+class RetryQueue:
+    """
+    The retries of the LLM and metric pairs whose data points could not be generated, in a Redis sorted set
+    scored by the time they are due, so a failed pair does not hold up the rest of its run.
+
+    Every simulator replica drains the queue. A drainer leases the retries it claims for `lease` seconds,
+    and removes each one once it is done. The retries of a drainer that stops are due again once their
+    lease expires.
+    """
+
+    def __init__(
+        self,
+        redis_client: AsyncRedisClient,
+        lease: float = RETRY_LEASE,
+        key: str = RedisKeys.RETRY_BENCHMARKS.value,
+    ):
+        """
+        Initializes the queue with the client it is shared through and the lease of a claim in seconds.
+        """
+        self.redis_client = redis_client
+        self.lease = lease
+        self.key = key
+        self._claim_due = redis_client.redis.register_script(CLAIM_DUE_SCRIPT)
+
+    async def schedule(self, item: WorkItem, attempt: int, delay: float) -> None:
+        """
+        Schedules an attempt of a work item in `delay` seconds.
+        """
+        member = json.dumps({**item.to_fields(), "attempt": attempt}, sort_keys=True)
+        await self.redis_client.redis.zadd(self.key, {member: time.time() + delay})
+
+    async def claim_due(self, limit: int = 10) -> List[Retry]:
+        """
+        Leases up to `limit` of the retries that are due, the earliest first.
+        """
+        now = time.time()
+        members = await self._claim_due(
+            keys=[self.key], args=[now, now + self.lease, limit]
+        )
+        return [_retry(member) for member in members]
+
+    async def remove(self, retry: Retry) -> None:
+        """
+        Removes a retry once it is done, whether it succeeded, was rescheduled or is no longer needed.
+        """
+        await self.redis_client.redis.zrem(self.key, retry.member)
+
+
+def _retry(member: bytes) -> Retry:
+    fields = json.loads(member)
+    attempt = int(fields.pop("attempt"))
+    return Retry(
+        member.decode(),
+        WorkItem.from_fields(
+            {key.encode(): value.encode() for key, value in fields.items()}
+        ),
+        attempt,
+    )
@@ -0,0 +1,120 @@
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest.mock import patch
+from uuid import uuid4
+
+import numpy as np
+import pytest
+
+from database.registry import load_registry, registry_ranges
+from metric_simulator.lib import MetricGenerator
+from metric_simulator.metric_service import (
+    _work_items,
+    generate_items_data_points,
+    generate_pair_data_points,
+)
+from metric_simulator.utils import generate_data_points
+
+LLMS = ["GPT-4o", "Llama 3.1 70B", "Claude 3.5 Sonnet"]
+METRICS = ["ttft", "tps", "e2e_latency", "rps"]
+
+
+@pytest.fixture(autouse=True)
+def seed():
+    with patch("metric_simulator.utils.SEED_VALUE", "3"):
+        yield
+
+
+@pytest.fixture
+def metric_generator():
+    return MetricGenerator(registry_ranges(load_registry()))
+
+
+def test_generate_data_points_is_deterministic():
+    first = generate_data_points(0.05, 2.0, "GPT-4o", "ttft")
+    second = generate_data_points(0.05, 2.0, "GPT-4o", "ttft")
+
+    assert isinstance(first, np.ndarray)
+    assert first.shape == (1000,)
+    np.testing.assert_array_equal(first, second)
+    assert first.min() >= 0.05 and first.max() <= 2.0
+    np.testing.assert_array_equal(first, np.round(first, 2))
+
+
+def test_generate_data_points_differs_per_pair():
+    ttft = generate_data_points(0, 1, "GPT-4o", "ttft")
+    tps = generate_data_points(0, 1, "GPT-4o", "tps")
+
+    assert not np.array_equal(ttft, tps)
+
+
+def work_items(metric_generator, llms, metrics):
+    """
+    Returns the work items of a run as the simulator builds them, with the ranges of the table.
+    """
+    return _work_items(
+        uuid4(),
+        [SimpleNamespace(id=uuid4(), name=llm) for llm in llms],
+        [SimpleNamespace(id=uuid4(), name=metric) for metric in metrics],
+        metric_generator.ranges(llms, metrics),
+    )
+
+
+def test_items_data_points_match_single_pairs(metric_generator):
+    items = work_items(metric_generator, ["GPT-4o"], METRICS)
+
+    batch = generate_items_data_points(items)
+
+    assert batch.shape == (len(METRICS), 1000)
+    for row, item in zip(batch, items):
+        np.testing.assert_array_equal(row, generate_pair_data_points(item))
+    np.testing.assert_array_equal(
+        batch[0], generate_data_points(0.05, 2.0, "GPT-4o", "ttft")
+    )
+
+
+def test_items_data_points_do_not_depend_on_split(metric_generator):
+    items = work_items(metric_generator, LLMS, METRICS)
+    all_data_points = generate_items_data_points(items)
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        rows = list(
+            executor.map(
+                lambda llm: generate_items_data_points(
+                    [item for item in items if item.llm_name == llm]
+                ),
+                reversed(LLMS),
+            )
+        )
+
+    assert all_data_points.shape == (len(LLMS) * len(METRICS), 1000)
+    np.testing.assert_array_equal(all_data_points, np.concatenate(rows[::-1]))
+
+
+def test_ranges_of_many_llms_are_looked_up_at_once():
+    llms = [f"llm-{index}" for index in range(300)]
+    metric_generator = MetricGenerator(
+        (llm, metric, index, index + 1)
+        for index, llm in enumerate(llms)
+        for metric in METRICS
+    )
+
+    ranges = metric_generator.ranges(llms[::-1], ["rps", "ttft"])
+    data_points = generate_items_data_points(
+        work_items(metric_generator, llms, METRICS)
+    ).reshape(300, len(METRICS), 1000)
+
+    assert ranges.shape == (600, 2)
+    np.testing.assert_array_equal(ranges[:2], [[299, 300], [299, 300]])
+    np.testing.assert_array_equal(ranges[-2:], [[0, 1], [0, 1]])
+    assert (data_points.min(axis=(1, 2)) >= np.arange(300)).all()
+    assert (data_points.max(axis=(1, 2)) <= np.arange(300) + 1).all()
+
+
+def test_unknown_llm_and_metric(metric_generator):
+    with pytest.raises(ValueError, match="Unknown metric: latency"):
+        metric_generator.ranges(["GPT-4o"], ["ttft", "latency"])
+    with pytest.raises(ValueError, match="Unknown LLM: GPT-5"):
+        metric_generator.ranges(["GPT-5"], ["ttft"])
+    assert not metric_generator.has_pairs(["GPT-5"], METRICS)
+    assert metric_generator.has_pairs(LLMS, METRICS)
@@ -1,8 +1,25 @@
-from unittest.mock import AsyncMock, Mock, patch
+import asyncio
+import json
+from contextlib import suppress
+from unittest.mock import AsyncMock, Mock, call, patch
 
 import pytest
+from fakeredis import aioredis as fake_aioredis
+from prometheus_client import REGISTRY
 
-from metric_simulator.metric_service import MAX_RETRIES, RETRY_DELAY, MetricService
+from metric_simulator.metric_service import (
+    MAX_RETRIES,
+    RETRY_DELAY,
+    MetricService,
+    _keep_locked,
+)
+from metric_simulator.retry_queue import Retry
+from metric_simulator.work_queue import SIMULATION_RUN_TIMEOUT, RunProgress, WorkItem
+from rankings import decode_cache_entry
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
 
 
 @pytest.fixture
@@ -20,58 +37,131 @@ def mock_simulator_repository():
     return Mock()
 
 
+@pytest.fixture
+def mock_retry_queue():
+    return AsyncMock()
+
+
 @pytest.fixture
 def metric_service(
-    mock_llm_repository, mock_metric_repository, mock_simulator_repository
+    mock_llm_repository,
+    mock_metric_repository,
+    mock_simulator_repository,
+    mock_retry_queue,
 ):
     return MetricService(
         llm_repository=mock_llm_repository,
         metric_repository=mock_metric_repository,
         simulator_repository=mock_simulator_repository,
+        retry_queue=mock_retry_queue,
     )
 
 
 @pytest.fixture
 def mock_redis_client():
-    with patch("metric_simulator.metric_service.RedisClient") as mock:
+    with patch("metric_simulator.metric_service.get_redis_client") as mock:
+        yield mock.return_value
+
+
+@pytest.fixture
+def mock_async_redis_client():
+    with patch("metric_simulator.metric_service.get_async_redis_client") as mock:
         yield mock.return_value
 
 
+ITEM = WorkItem(7, 1, "test_llm", 2, "test_metric", 1.0, 3.0)
+
+
+@pytest.fixture
+def mock_generate_data_points():
+    with patch("metric_simulator.metric_service.generate_data_points") as mock:
+        mock.return_value = [1, 2, 3]
+        yield mock
+
+
+@pytest.fixture
+def mock_generate_batch_data_points():
+    with patch("metric_simulator.metric_service.generate_batch_data_points") as mock:
+        mock.side_effect = lambda ranges, pairs: [[1, 2, 3]] * len(pairs)
+        yield mock
+
+
 @pytest.mark.asyncio
-async def test_generate_metric_data(metric_service):
-    mock_metric_generator = Mock()
-    mock_metric_generator.generate_data_points.return_value = [1, 2, 3]
-    metric_name = "test_metric"
-    llm_name = "test_llm"
+async def test_generate_metric_data(metric_service, mock_generate_data_points):
+    result = await metric_service.generate_metric_data(ITEM)
 
-    result = await metric_service.generate_metric_data(
-        mock_metric_generator, metric_name, llm_name
+    assert result == [1, 2, 3]
+    mock_generate_data_points.assert_called_once_with(
+        1.0, 3.0, "test_llm", "test_metric"
     )
 
-    assert result == [1, 2, 3]
-    mock_metric_generator.generate_data_points.assert_called_once_with(metric_name)
+
+@pytest.mark.asyncio
+async def test_generate_metric_data_schedules_a_retry(
+    metric_service, mock_retry_queue, mock_generate_data_points
+):
+    mock_generate_data_points.side_effect = RuntimeError("failed")
+    retries = sample("simulation_generate_retries_total", outcome="retried")
+
+    result = await metric_service.generate_metric_data(ITEM)
+
+    assert result is None
+    mock_generate_data_points.assert_called_once()
+    ((item, attempt, delay), _) = mock_retry_queue.schedule.await_args
+    assert (item, attempt) == (ITEM, 1)
+    assert RETRY_DELAY / 2 <= delay <= RETRY_DELAY
+    assert sample("simulation_generate_retries_total", outcome="retried") == retries + 1
+
+
+@pytest.mark.asyncio
+async def test_generate_metric_data_skips_after_the_last_retry(
+    metric_service, mock_retry_queue, mock_generate_data_points
+):
+    mock_generate_data_points.side_effect = RuntimeError("failed")
+    skipped = sample("simulation_generate_retries_total", outcome="skipped")
+
+    result = await metric_service.generate_metric_data(ITEM, attempt=MAX_RETRIES)
+
+    assert result is None
+    mock_retry_queue.schedule.assert_not_awaited()
+    assert sample("simulation_generate_retries_total", outcome="skipped") == skipped + 1
 
 
 @pytest.mark.asyncio
 async def test_simulate_data_points_with_retry_success(
-    metric_service, mock_redis_client
+    metric_service, mock_async_redis_client
 ):
-    mock_lock = AsyncMock()
-    mock_redis_client.redis.lock.return_value.__enter__.return_value = mock_lock
+    mock_async_redis_client.redis.lock = Mock(return_value=AsyncMock())
 
     with patch.object(
         metric_service, "simulate_data_points", new_callable=AsyncMock
     ) as mock_simulate:
         await metric_service.simulate_data_points_with_retry()
-        mock_redis_client.redis.lock.assert_called_once_with(
+        mock_async_redis_client.redis.lock.assert_called_once_with(
             "retry_benchmarks_lock",
-            timeout=MAX_RETRIES * RETRY_DELAY,
+            timeout=SIMULATION_RUN_TIMEOUT,
             blocking=True,
             blocking_timeout=10,
         )
         mock_simulate.assert_called_once()
 
 
+@pytest.mark.asyncio
+async def test_run_lock_is_renewed_while_the_run_is_in_progress():
+    redis = fake_aioredis.FakeRedis()
+    lock = redis.lock("retry_benchmarks_lock", timeout=0.1)
+    await lock.acquire()
+    renewal = asyncio.create_task(_keep_locked(lock))
+
+    await asyncio.sleep(0.3)
+
+    assert await lock.owned()
+    renewal.cancel()
+    with suppress(asyncio.CancelledError):
+        await renewal
+    await redis.aclose()
+
+
 @pytest.mark.asyncio
 async def test_simulate_data_points(
     metric_service,
@@ -79,37 +169,402 @@ async def test_simulate_data_points(
     mock_metric_repository,
     mock_simulator_repository,
     mock_redis_client,
+    mock_generate_batch_data_points,
 ):
     mock_llm = Mock()
     mock_llm.id = 1
     mock_llm.name = "TestLLM"
-    mock_llm.company_name = "TestCompany"
     mock_llm_repository.get_llms.return_value = [mock_llm]
+    mock_llm_repository.get_metric_ranges.return_value = [
+        ("TestLLM", "TestMetric", 1.0, 3.0)
+    ]
 
     mock_metric = Mock()
     mock_metric.id = 1
     mock_metric.name = "TestMetric"
     mock_metric_repository.get_metrics.return_value = [mock_metric]
 
-    with patch(
-        "metric_simulator.metric_service.MetricGenerator"
-    ) as mock_generator_class:
-        mock_generator = Mock()
-        mock_generator_class.return_value = mock_generator
-        mock_generator.generate_data_points.return_value = [1, 2, 3]
+    mock_run = Mock()
+    mock_run.id = 7
+    mock_simulator_repository.create_run.return_value = mock_run
+    mock_simulator_repository.drop_stale_runs.return_value = 1
+    mock_simulator_repository.get_metric_rankings.return_value = [
+        ("TestMetric", "TestLLM", 2.0, 1)
+    ]
+    mock_simulator_repository.get_metric_statistic_by_llm.return_value = [
+        ("TestLLM", 2.0)
+    ]
+
+    rows = sample("simulation_rows_written_total")
+    runs = sample("simulation_run_duration_seconds_count", status="completed")
+
+    await metric_service.simulate_data_points()
+
+    assert sample("simulation_rows_written_total") == rows + 3
+    assert (
+        sample("simulation_run_duration_seconds_count", status="completed") == runs + 1
+    )
+    mock_simulator_repository.remove_all_metrics.assert_not_called()
+    mock_simulator_repository.create_run.assert_called_once()
+    mock_generate_batch_data_points.assert_called_once_with(
+        [(1.0, 3.0)], [("TestLLM", "TestMetric")]
+    )
+    mock_simulator_repository.bulk_add_metrics.assert_called_once_with(
+        7, 1, 1, [1, 2, 3], commit=False
+    )
+    mock_simulator_repository.commit.assert_called_once()
+    mock_simulator_repository.complete_run.assert_called_once_with(7)
+    mock_simulator_repository.drop_stale_runs.assert_called_once()
+    mock_redis_client.redis.incr.assert_not_called()
+    mock_redis_client.redis.exists.assert_not_called()
+
+    version_key, build_mapping = mock_redis_client.publish_versioned.call_args.args
+    assert version_key == "benchmarks_generation"
+    published = {
+        key: decode_cache_entry(entry) for key, entry in build_mapping(5).items()
+    }
+    assert published["benchmarks"]["generation"] == 5
+    assert published["benchmarks"]["fresh_until"] is None
+    published = {key: json.loads(entry["value"]) for key, entry in published.items()}
+    assert published["benchmarks"] == [
+        {"TestMetric": [{"llm_name": "TestLLM", "mean_value": 2.0}]}
+    ]
+    assert published["benchmarks_metric:TestMetric"] == {
+        "TestMetric": [{"llm_name": "TestLLM", "mean_value": 2.0}]
+    }
+    assert published["benchmarks_metric:TestMetric:p99"] == {
+        "TestMetric": [{"llm_name": "TestLLM", "p99_value": 2.0}]
+    }
+    assert len(published) == 6
+
 
+@pytest.mark.asyncio
+async def test_simulate_data_points_failure_discards_run(
+    metric_service,
+    mock_llm_repository,
+    mock_metric_repository,
+    mock_simulator_repository,
+    mock_redis_client,
+    mock_generate_batch_data_points,
+):
+    mock_llm = Mock()
+    mock_llm.id = 1
+    mock_llm.name = "TestLLM"
+    mock_llm_repository.get_llms.return_value = [mock_llm]
+    mock_llm_repository.get_metric_ranges.return_value = [
+        ("TestLLM", "TestMetric", 1.0, 3.0)
+    ]
+
+    mock_metric = Mock()
+    mock_metric.id = 1
+    mock_metric.name = "TestMetric"
+    mock_metric_repository.get_metrics.return_value = [mock_metric]
+
+    mock_run = Mock()
+    mock_run.id = 7
+    mock_simulator_repository.create_run.return_value = mock_run
+    mock_simulator_repository.bulk_add_metrics.side_effect = RuntimeError("db down")
+
+    with pytest.raises(RuntimeError):
         await metric_service.simulate_data_points()
 
-        mock_simulator_repository.remove_all_metrics.assert_called_once()
-        mock_generator_class.assert_called_once_with("TestCompany", "TestLLM")
-        mock_generator.generate_data_points.assert_called_once_with("TestMetric")
-        mock_simulator_repository.bulk_add_metrics.assert_called_once_with(
-            1, 1, [1, 2, 3]
-        )
-        mock_redis_client.redis.delete.assert_called()
-        mock_redis_client.delete_key.assert_called()
+    mock_simulator_repository.rollback.assert_called_once()
+    mock_simulator_repository.fail_run.assert_called_once_with(7)
+    mock_simulator_repository.complete_run.assert_not_called()
+    mock_simulator_repository.drop_stale_runs.assert_not_called()
+    mock_redis_client.redis.incr.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_simulate_data_points_concurrently(
+    mock_llm_repository,
+    mock_metric_repository,
+    mock_simulator_repository,
+    mock_redis_client,
+    mock_generate_batch_data_points,
+):
+    mock_llms = []
+    for llm_id in (1, 2):
+        mock_llm = Mock()
+        mock_llm.id = llm_id
+        mock_llm.name = f"TestLLM{llm_id}"
+        mock_llms.append(mock_llm)
+    mock_llm_repository.get_llms.return_value = mock_llms
+    mock_llm_repository.get_metric_ranges.return_value = [
+        (mock_llm.name, "TestMetric", 1.0, 3.0) for mock_llm in mock_llms
+    ]
+
+    mock_metric = Mock()
+    mock_metric.id = 1
+    mock_metric.name = "TestMetric"
+    mock_metric_repository.get_metrics.return_value = [mock_metric]
+
+    mock_run = Mock()
+    mock_run.id = 7
+    mock_simulator_repository.create_run.return_value = mock_run
+    mock_simulator_repository.drop_stale_runs.return_value = 1
+    mock_simulator_repository.get_metric_rankings.return_value = []
+    mock_simulator_repository.get_metric_statistic_by_llm.return_value = []
+
+    mock_writer = Mock()
+    metric_service = MetricService(
+        llm_repository=mock_llm_repository,
+        metric_repository=mock_metric_repository,
+        simulator_repository=mock_simulator_repository,
+        simulator_repository_factory=lambda: mock_writer,
+    )
+
+    with patch("metric_simulator.metric_service.SIMULATION_WORKERS", 2), patch(
+        "metric_simulator.metric_service.SIMULATION_DB_WRITERS", 1
+    ), patch("metric_simulator.metric_service.SIMULATION_EXECUTOR", "thread"):
+        await metric_service.simulate_data_points()
+
+    mock_generate_batch_data_points.assert_has_calls(
+        [
+            call([(1.0, 3.0)], [("TestLLM1", "TestMetric")]),
+            call([(1.0, 3.0)], [("TestLLM2", "TestMetric")]),
+        ],
+        any_order=True,
+    )
+    mock_writer.bulk_add_metrics.assert_has_calls(
+        [
+            call(7, 1, 1, [1, 2, 3], commit=False),
+            call(7, 2, 1, [1, 2, 3], commit=False),
+        ],
+        any_order=True,
+    )
+    assert mock_writer.commit.call_count == 2
+    mock_writer.close.assert_called_once()
+    mock_simulator_repository.bulk_add_metrics.assert_not_called()
+    mock_simulator_repository.complete_run.assert_called_once_with(7)
+
+
+@pytest.mark.asyncio
+async def test_simulate_data_points_concurrently_failure_discards_run(
+    mock_llm_repository,
+    mock_metric_repository,
+    mock_simulator_repository,
+    mock_redis_client,
+    mock_generate_batch_data_points,
+):
+    mock_llm = Mock()
+    mock_llm.id = 1
+    mock_llm.name = "TestLLM"
+    mock_llm_repository.get_llms.return_value = [mock_llm]
+    mock_llm_repository.get_metric_ranges.return_value = [
+        ("TestLLM", "TestMetric", 1.0, 3.0)
+    ]
+
+    mock_metric = Mock()
+    mock_metric.id = 1
+    mock_metric.name = "TestMetric"
+    mock_metric_repository.get_metrics.return_value = [mock_metric]
+
+    mock_run = Mock()
+    mock_run.id = 7
+    mock_simulator_repository.create_run.return_value = mock_run
+
+    mock_writer = Mock()
+    mock_writer.bulk_add_metrics.side_effect = RuntimeError("db down")
+    metric_service = MetricService(
+        llm_repository=mock_llm_repository,
+        metric_repository=mock_metric_repository,
+        simulator_repository=mock_simulator_repository,
+        simulator_repository_factory=lambda: mock_writer,
+    )
+
+    with patch("metric_simulator.metric_service.SIMULATION_WORKERS", 2), patch(
+        "metric_simulator.metric_service.SIMULATION_EXECUTOR", "thread"
+    ):
+        with pytest.raises(RuntimeError):
+            await metric_service.simulate_data_points()
+
+    mock_writer.rollback.assert_called_once()
+    mock_writer.close.assert_called_once()
+    mock_simulator_repository.fail_run.assert_called_once_with(7)
+    mock_simulator_repository.complete_run.assert_not_called()
+
+
+@pytest.fixture
+def distributed_run(
+    mock_llm_repository, mock_metric_repository, mock_simulator_repository
+):
+    mock_llm = Mock()
+    mock_llm.id = 1
+    mock_llm.name = "TestLLM"
+    mock_llm_repository.get_llms.return_value = [mock_llm]
+    mock_llm_repository.get_metric_ranges.return_value = [
+        ("TestLLM", "TestMetric", 1.0, 3.0)
+    ]
+
+    mock_metric = Mock()
+    mock_metric.id = 1
+    mock_metric.name = "TestMetric"
+    mock_metric_repository.get_metrics.return_value = [mock_metric]
+
+    mock_run = Mock()
+    mock_run.id = 7
+    mock_simulator_repository.create_run.return_value = mock_run
+
+    with patch("metric_simulator.metric_service.SIMULATION_DISTRIBUTED", True):
+        yield AsyncMock()
+
+
+@pytest.mark.asyncio
+async def test_simulate_data_points_distributed(
+    distributed_run,
+    mock_llm_repository,
+    mock_metric_repository,
+    mock_simulator_repository,
+    mock_redis_client,
+):
+    work_queue = distributed_run
+    work_queue.wait.return_value = RunProgress(1, 1, 0)
+    metric_service = MetricService(
+        mock_llm_repository,
+        mock_metric_repository,
+        mock_simulator_repository,
+        work_queue=work_queue,
+    )
+
+    await metric_service.simulate_data_points()
+
+    work_queue.enqueue.assert_awaited_once_with(
+        7, [WorkItem(7, 1, "TestLLM", 1, "TestMetric", 1.0, 3.0)]
+    )
+    work_queue.close_run.assert_awaited_once_with(7)
+    mock_simulator_repository.bulk_add_metrics.assert_not_called()
+    mock_simulator_repository.complete_run.assert_called_once_with(7)
+    mock_simulator_repository.drop_stale_runs.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_simulate_data_points_distributed_failure_discards_run(
+    distributed_run,
+    mock_llm_repository,
+    mock_metric_repository,
+    mock_simulator_repository,
+    mock_redis_client,
+):
+    work_queue = distributed_run
+    work_queue.wait.return_value = RunProgress(1, 0, 1)
+    metric_service = MetricService(
+        mock_llm_repository,
+        mock_metric_repository,
+        mock_simulator_repository,
+        work_queue=work_queue,
+    )
+
+    with pytest.raises(RuntimeError):
+        await metric_service.simulate_data_points()
+
+    work_queue.close_run.assert_awaited_once_with(7)
+    mock_simulator_repository.fail_run.assert_called_once_with(7)
+    mock_simulator_repository.complete_run.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_simulate_work_item_writes_each_pair_once(
+    metric_service, mock_generate_data_points
+):
+    item = WorkItem(7, 1, "TestLLM", 2, "TestMetric", 1.0, 3.0)
+    writer = Mock()
+    writer.lock_pair.side_effect = [True, False]
+
+    assert await metric_service.simulate_work_item(item, writer) == 3
+    assert await metric_service.simulate_work_item(item, writer) == 0
+
+    mock_generate_data_points.assert_called_with(1.0, 3.0, "TestLLM", "TestMetric")
+    writer.lock_pair.assert_called_with(7, 1, 2)
+    writer.bulk_add_metrics.assert_called_once_with(7, 1, 2, [1, 2, 3], commit=False)
+    writer.commit.assert_called_once()
+    writer.rollback.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_simulate_work_item_failure_is_left_to_the_work_queue(
+    metric_service, mock_retry_queue, mock_generate_data_points
+):
+    mock_generate_data_points.side_effect = RuntimeError("failed")
+    writer = Mock()
+
+    with pytest.raises(RuntimeError):
+        await metric_service.simulate_work_item(ITEM, writer)
+
+    mock_retry_queue.schedule.assert_not_awaited()
+    writer.bulk_add_metrics.assert_not_called()
+
+
+def test_publish_rankings_failure_bumps_generation(
+    metric_service, mock_simulator_repository, mock_redis_client
+):
+    mock_simulator_repository.get_metric_rankings.return_value = []
+    mock_redis_client.publish_versioned.side_effect = RuntimeError("redis down")
+
+    assert metric_service.publish_rankings([]) is None
+
+    mock_redis_client.redis.incr.assert_called_once_with("benchmarks_generation")
 
 
 def test_remove_metrics(metric_service, mock_simulator_repository):
     metric_service.remove_metrics()
-    mock_simulator_repository.remove_all_metrics.assert_called_once()
+    mock_simulator_repository.remove_all_metrics.assert_called_once_with(commit=True)
+
+
+@pytest.mark.asyncio
+async def test_retry_due_pairs(
+    metric_service, mock_retry_queue, mock_generate_data_points
+):
+    running, current, failed = (
+        WorkItem(run_id, 1, "TestLLM", 2, "TestMetric", 1.0, 3.0)
+        for run_id in [7, 8, 9]
+    )
+    mock_retry_queue.claim_due.return_value = [
+        Retry(str(item.run_id), item, 1) for item in [running, current, failed]
+    ]
+    runs = {
+        7: Mock(status="running", is_current=False),
+        8: Mock(status="completed", is_current=True),
+        9: Mock(status="failed", is_current=False),
+    }
+    writer = Mock()
+    writer.get_run.side_effect = runs.get
+    writer.get_current_run.return_value = Mock(id=8)
+    writer.lock_pair.return_value = True
+
+    with patch.object(metric_service, "publish_rankings") as mock_publish:
+        assert await metric_service.retry_due_pairs(writer) == 2
+
+    writer.bulk_add_metrics.assert_has_calls(
+        [
+            call(7, 1, 2, [1, 2, 3], commit=False),
+            call(8, 1, 2, [1, 2, 3], commit=False),
+        ]
+    )
+    assert writer.bulk_add_metrics.call_count == 2
+    assert mock_retry_queue.remove.await_count == 3
+    mock_publish.assert_called_once()
+    assert mock_publish.call_args.args[1] is writer
+    # the metrics are read with the writer, not the session shared with the runs
+    metric_service.metric_repository.get_metrics.assert_not_called()
+    writer.db.query.assert_called()
+
+
+def test_metric_generator_is_compiled_again_for_a_new_llm(
+    metric_service, mock_llm_repository
+):
+    mock_llm_repository.get_metric_ranges.return_value = [
+        ("TestLLM", "TestMetric", 1.0, 3.0)
+    ]
+    metric_generator = metric_service.metric_generator(["TestLLM"], ["TestMetric"])
+    mock_llm_repository.get_metric_ranges.return_value.append(
+        ("NewLLM", "TestMetric", 2.0, 4.0)
+    )
+
+    assert metric_service.metric_generator(["TestLLM"], ["TestMetric"]) is (
+        metric_generator
+    )
+    assert metric_service.metric_generator(["NewLLM"], ["TestMetric"]).ranges(
+        ["NewLLM"], ["TestMetric"]
+    ).tolist() == [[2.0, 4.0]]
+    assert mock_llm_repository.get_metric_ranges.call_count == 2
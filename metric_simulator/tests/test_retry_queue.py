@@ -0,0 +1,51 @@
+import asyncio
+from uuid import uuid4
+
+import fakeredis
+import pytest
+import redis.asyncio as aioredis
+from fakeredis import aioredis as fake_aioredis
+
+from metric_simulator.retry_queue import RetryQueue, backoff_delay
+from metric_simulator.work_queue import WorkItem
+from redis_client import AsyncRedisClient
+
+
+@pytest.fixture
+def retry_queue():
+    redis_client = AsyncRedisClient(
+        aioredis.ConnectionPool(
+            connection_class=fake_aioredis.FakeConnection,
+            server=fakeredis.FakeServer(),
+        )
+    )
+    return RetryQueue(redis_client, lease=0.05)
+
+
+def work_item():
+    return WorkItem(uuid4(), uuid4(), "llm", uuid4(), "ttft", 0.05, 2.0)
+
+
+def test_backoff_delay_doubles_with_jitter_up_to_the_cap():
+    for _ in range(100):
+        assert 5 <= backoff_delay(1, 10, cap=60) <= 10
+        assert 20 <= backoff_delay(3, 10, cap=60) <= 40
+        assert 30 <= backoff_delay(10, 10, cap=60) <= 60
+
+
+@pytest.mark.asyncio
+async def test_due_retries_are_claimed_once_until_their_lease_expires(retry_queue):
+    item = work_item()
+    await retry_queue.schedule(item, 1, 0)
+    await retry_queue.schedule(work_item(), 1, 60)
+
+    (retry,) = await retry_queue.claim_due()
+    assert (retry.item, retry.attempt) == (item, 1)
+    assert await retry_queue.claim_due() == []
+
+    await asyncio.sleep(retry_queue.lease * 2)
+    assert await retry_queue.claim_due() == [retry]
+
+    await retry_queue.remove(retry)
+    await asyncio.sleep(retry_queue.lease * 2)
+    assert await retry_queue.claim_due() == []
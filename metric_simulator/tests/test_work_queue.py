@@ -0,0 +1,158 @@
+import asyncio
+from uuid import uuid4
+
+import fakeredis
+import pytest
+import redis.asyncio as aioredis
+from fakeredis import aioredis as fake_aioredis
+
+from metric_simulator.work_queue import RunProgress, WorkItem, WorkQueue
+from redis_client import AsyncRedisClient
+
+
+@pytest.fixture
+def redis_client():
+    return AsyncRedisClient(
+        aioredis.ConnectionPool(
+            connection_class=fake_aioredis.FakeConnection,
+            server=fakeredis.FakeServer(),
+        )
+    )
+
+
+@pytest.fixture
+def queue(redis_client):
+    return WorkQueue(redis_client, lease=0.05, max_deliveries=2, block=0.01, ttl=60)
+
+
+def work_items(run_id, count):
+    return [
+        WorkItem(run_id, uuid4(), f"llm-{index}", uuid4(), "ttft", 0.05, 2.0)
+        for index in range(count)
+    ]
+
+
+def test_work_item_fields_round_trip():
+    (item,) = work_items(uuid4(), 1)
+
+    fields = {key.encode(): value.encode() for key, value in item.to_fields().items()}
+
+    assert WorkItem.from_fields(fields) == item
+
+
+@pytest.mark.asyncio
+async def test_items_are_delivered_to_one_consumer_each(queue):
+    run_id = uuid4()
+    items = work_items(run_id, 2)
+    await queue.enqueue(run_id, items)
+
+    first_id, first = await queue.claim("a")
+    second_id, second = await queue.claim("b")
+
+    assert {first, second} == set(items)
+    assert await queue.claim("c") is None
+
+    await queue.complete(first_id, first)
+    assert await queue.progress(run_id) == RunProgress(2, 1, 0)
+    await queue.complete(second_id, second)
+    assert (await queue.wait(run_id, timeout=1)).finished
+
+
+@pytest.mark.asyncio
+async def test_stalled_item_is_reclaimed_after_its_lease(queue):
+    run_id = uuid4()
+    (item,) = work_items(run_id, 1)
+    await queue.enqueue(run_id, [item])
+    entry_id, _ = await queue.claim("stalled")
+
+    assert await queue.claim("other") is None
+    await asyncio.sleep(queue.lease * 2)
+
+    assert await queue.claim("other") == (entry_id, item)
+
+
+@pytest.mark.asyncio
+async def test_renewed_lease_is_not_reclaimed(queue):
+    run_id = uuid4()
+    await queue.enqueue(run_id, work_items(run_id, 1))
+    entry_id, _ = await queue.claim("busy")
+
+    for _ in range(4):
+        await asyncio.sleep(queue.lease / 2)
+        await queue.renew("busy", entry_id)
+        assert await queue.claim("other") is None
+
+
+@pytest.mark.asyncio
+async def test_consumers_share_a_run_and_retry_failed_items(queue):
+    run_id = uuid4()
+    items = work_items(run_id, 6)
+    await queue.enqueue(run_id, items)
+    processed = []
+    failing = {items[0].pair}
+
+    async def process(item):
+        await asyncio.sleep(0)
+        if item.pair in failing:
+            failing.remove(item.pair)
+            raise RuntimeError("failed")
+        processed.append(item)
+
+    consumers = [
+        asyncio.create_task(queue.consume(name, process)) for name in ["a", "b"]
+    ]
+    try:
+        progress = await queue.wait(run_id, timeout=5, poll_interval=0.01)
+    finally:
+        for consumer in consumers:
+            consumer.cancel()
+        await asyncio.gather(*consumers, return_exceptions=True)
+
+    assert progress == RunProgress(6, 6, 0)
+    assert sorted(processed) == sorted(items)
+
+
+@pytest.mark.asyncio
+async def test_item_is_given_up_after_its_last_delivery(queue, redis_client):
+    run_id = uuid4()
+    (item,) = work_items(run_id, 1)
+    await queue.enqueue(run_id, [item])
+
+    entry_id, _ = await queue.claim("a")
+    assert not await queue.fail(entry_id, item)
+    assert await queue.fail(entry_id, item)
+
+    assert await queue.progress(run_id) == RunProgress(1, 0, 1)
+    assert await redis_client.redis.xlen(queue.stream) == 0
+
+
+@pytest.mark.asyncio
+async def test_items_of_a_closed_run_are_discarded(queue, redis_client):
+    run_id = uuid4()
+    await queue.enqueue(run_id, work_items(run_id, 3))
+    await queue.close_run(run_id)
+    processed = []
+
+    async def process(item):
+        processed.append(item)
+
+    consumer = asyncio.create_task(queue.consume("a", process))
+    for _ in range(100):
+        await asyncio.sleep(0.01)
+        remaining = await redis_client.redis.xlen(queue.stream)
+        if not remaining:
+            break
+    consumer.cancel()
+    await asyncio.gather(consumer, return_exceptions=True)
+
+    assert remaining == 0
+    assert processed == []
+
+
+@pytest.mark.asyncio
+async def test_wait_times_out(queue):
+    run_id = uuid4()
+    await queue.enqueue(run_id, work_items(run_id, 1))
+
+    with pytest.raises(TimeoutError):
+        await queue.wait(run_id, timeout=0.05, poll_interval=0.01)
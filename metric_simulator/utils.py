@@ -1,48 +1,58 @@
-import asyncio
+import functools
 import hashlib
 import os
+from typing import Sequence, Tuple
 
 import numpy as np
 from dotenv import load_dotenv
 
 from logger import logging
-from redis_client import RedisKeys
+from metric_simulator.retry_queue import RETRY_MAX_DELAY, backoff_delay
+from telemetry import SIMULATION_RETRIES
 
 load_dotenv()
 
 SEED_VALUE = os.getenv("SEED", "")
 
 
-def retry_on_failure(redis_client, max_retries=5, delay=60):
+def retry_on_failure(max_retries=5, delay=60, max_delay=RETRY_MAX_DELAY):
+    """
+    Decorates the generation of the data points of a work item, so that a failed attempt is retried later
+    instead of holding up the run. The failure is scheduled on the retry queue of the service, after an
+    exponential backoff from `delay` seconds with jitter, and the decorated coroutine returns None.
+    The decorated coroutine takes the attempt as a keyword argument, 0 for the first one.
+    After max_retries retries, the pair is skipped.
+    """
+
     def decorator(func):
-        async def wrapper(metric_generator, metric_name, llm_name, *args, **kwargs):
-            retry_key = f"{RedisKeys.RETRY_BENCHMARKS.value}:{llm_name}:{metric_name}"
-            current_attempt = redis_client.redis.get(retry_key)
-            if current_attempt is None:
-                current_attempt = 0
+        @functools.wraps(func)
+        async def wrapper(service, item, attempt=0):
+            try:
+                return await func(service, item)
+            except Exception as e:
+                logging.error(
+                    f"Error generating metrics for LLM {item.llm_name} for metric {item.metric_name}, "
+                    f"attempt {attempt + 1}: {str(e)}"
+                )
+
+            if attempt >= max_retries:
+                SIMULATION_RETRIES.labels("skipped").inc()
+                logging.info(
+                    f"Max retries reached for LLM {item.llm_name} for metric {item.metric_name}, skipping."
+                )
+                return None
+
+            retry_delay = backoff_delay(attempt + 1, delay, max_delay)
+            try:
+                await service.retry_queue.schedule(item, attempt + 1, retry_delay)
+            except Exception as e:
+                SIMULATION_RETRIES.labels("skipped").inc()
+                logging.error(
+                    f"Error scheduling the retry of LLM {item.llm_name} for metric {item.metric_name}, "
+                    f"skipping: {str(e)}"
+                )
             else:
-                current_attempt = int(current_attempt)
-
-            while current_attempt <= max_retries:
-                try:
-                    return await func(
-                        metric_generator, metric_name, llm_name, *args, **kwargs
-                    )
-                except Exception as e:
-                    redis_client.redis.set(
-                        retry_key, current_attempt + 1, ex=60
-                    )  # Set expiry for 60 seconds
-                    logging.error(
-                        f"Error generating metrics for LLM {llm_name}, attempt {current_attempt + 1}: {str(e)}"
-                    )
-                    current_attempt += 1
-                    if current_attempt <= max_retries:
-                        # wait before retrying
-                        await asyncio.sleep(delay)
-
-            logging.info(
-                f"Max retries reached for LLM {llm_name} for metric {metric_name}, skipping."
-            )
+                SIMULATION_RETRIES.labels("retried").inc()
             return None
 
         return wrapper
@@ -50,26 +60,83 @@ def retry_on_failure(redis_client, max_retries=5, delay=60):
     return decorator
 
 
+def data_points_seed(llm_name: str, metric: str) -> np.random.SeedSequence:
+    """
+    Returns the seed sequence of the random stream of an LLM and metric pair.
+
+    With SEED set, the stream only depends on the SEED, the LLM name and the metric, so the
+    data points of a pair are the same whichever process or thread generates them.
+    Without SEED, every call returns a sequence seeded from fresh OS entropy.
+
+    Args:
+        llm_name (str): The name of the LLM.
+        metric (str): The name of the metric.
+
+    Returns:
+        np.random.SeedSequence: The seed sequence of the pair.
+    """
+    if not SEED_VALUE:
+        return np.random.SeedSequence()
+    unique_string = f"{llm_name}_{metric}_{SEED_VALUE}"
+    return np.random.SeedSequence(
+        int(hashlib.md5(unique_string.encode()).hexdigest(), 16)
+    )
+
+
+def generate_batch_data_points(
+    ranges: Sequence[Tuple[float, float]],
+    pairs: Sequence[Tuple[str, str]],
+    size: int = 1000,
+) -> np.ndarray:
+    """
+    Generates random data points for several LLM and metric pairs at once.
+
+    Each pair draws from its own generator, seeded with data_points_seed, into one row of
+    the result. The rows are then scaled to their ranges and rounded to two decimal places
+    in single vectorized operations.
+
+    Args:
+        ranges (Sequence[Tuple[float, float]]): The minimum and maximum value of each pair.
+        pairs (Sequence[Tuple[str, str]]): The LLM name and metric of each pair.
+        size (int, optional): The number of data points to generate per pair. Defaults to 1000.
+
+    Returns:
+        np.ndarray: A (len(pairs), size) array of data points, one row per pair.
+    """
+    if len(ranges) != len(pairs):
+        raise ValueError("ranges and pairs must have the same length")
+
+    data_points = np.empty((len(pairs), size))
+    for row, (llm_name, metric) in zip(data_points, pairs):
+        np.random.default_rng(data_points_seed(llm_name, metric)).random(out=row)
+
+    bounds = np.asarray(ranges, dtype=float).reshape(len(pairs), 2)
+    min_vals, max_vals = bounds[:, :1], bounds[:, 1:]
+    data_points *= max_vals - min_vals
+    data_points += min_vals
+    return np.round(data_points, 2, out=data_points)
+
+
 def generate_data_points(
     min_val: float, max_val: float, llm_name: str, metric: str, size: int = 1000
-) -> list:
+) -> np.ndarray:
     """
-    Generates a list of random data points within a specified range.
+    Generates an array of random data points within a specified range.
 
     This function generates a specified number of random data points between a minimum and maximum value,
-    rounded to two decimal places.
+    rounded to two decimal places. It draws the same values as the row of the pair in
+    generate_batch_data_points.
 
     Args:
         min_val (float): The minimum value of the range.
         max_val (float): The maximum value of the range.
+        llm_name (str): The name of the LLM the data points are generated for.
+        metric (str): The metric the data points are generated for.
         size (int, optional): The number of data points to generate. Defaults to 1000.
 
     Returns:
-        list: A list of generated data points.
+        np.ndarray: An array of generated data points.
     """
-    if SEED_VALUE:
-        unique_string = f"{llm_name}_{metric}_{SEED_VALUE}"
-        unique_seed = int(hashlib.md5(unique_string.encode()).hexdigest(), 16) % (2**32)
-        np.random.seed(unique_seed)
-
-    return np.round(np.random.uniform(min_val, max_val, size), 2).tolist()
+    return generate_batch_data_points([(min_val, max_val)], [(llm_name, metric)], size)[
+        0
+    ]
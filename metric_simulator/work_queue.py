@@ -0,0 +1,403 @@
+import asyncio
+import os
+import socket
+from contextlib import suppress
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+from uuid import UUID
+
+from dotenv import load_dotenv
+from redis.exceptions import ResponseError
+
+from logger import logging
+from redis_client import AsyncRedisClient, RedisKeys, simulation_run_key
+from telemetry import SIMULATION_WORK_ITEMS
+
+load_dotenv()
+
+QUEUE_LEASE = float(os.getenv("SIMULATION_QUEUE_LEASE", "30"))
+QUEUE_MAX_DELIVERIES = int(os.getenv("SIMULATION_QUEUE_MAX_DELIVERIES", "3"))
+QUEUE_CONSUMERS = int(os.getenv("SIMULATION_QUEUE_CONSUMERS", "2"))
+QUEUE_BLOCK = float(os.getenv("SIMULATION_QUEUE_BLOCK", "1"))
+QUEUE_POLL_INTERVAL = float(os.getenv("SIMULATION_QUEUE_POLL_INTERVAL", "0.5"))
+QUEUE_RECONNECT_DELAY = float(os.getenv("SIMULATION_QUEUE_RECONNECT_DELAY", "1"))
+SIMULATION_RUN_TIMEOUT = float(os.getenv("SIMULATION_RUN_TIMEOUT", "900"))
+
+# the sets and counters tracking the work items of a run, next to its manifest
+RUN_PARTS = ["done", "failed", "attempts"]
+
+
+class WorkItem(NamedTuple):
+    """
+    An LLM and metric pair of a distributed simulation run, the unit of work shared by the simulator replicas.
+    It carries the range of the pair from the registry the run was started with, so its data points are
+    generated alike whichever replica processes or retries it.
+    """
+
+    run_id: UUID
+    llm_id: UUID
+    llm_name: str
+    metric_id: UUID
+    metric_name: str
+    min_value: float
+    max_value: float
+
+    @property
+    def pair(self) -> str:
+        return f"{self.llm_id}:{self.metric_id}"
+
+    def to_fields(self) -> Dict[str, str]:
+        """
+        Returns the fields of the stream entry of the item.
+        """
+        return {field: str(value) for field, value in self._asdict().items()}
+
+    @classmethod
+    def from_fields(cls, fields: Dict[bytes, bytes]) -> "WorkItem":
+        """
+        Reads an item from the fields of its stream entry.
+        """
+        values = {key.decode(): value.decode() for key, value in fields.items()}
+        return cls(
+            run_id=UUID(values["run_id"]),
+            llm_id=UUID(values["llm_id"]),
+            llm_name=values["llm_name"],
+            metric_id=UUID(values["metric_id"]),
+            metric_name=values["metric_name"],
+            min_value=float(values["min_value"]),
+            max_value=float(values["max_value"]),
+        )
+
+
+class RunProgress(NamedTuple):
+    """
+    The number of work items of a run, and how many of them were written or failed.
+    """
+
+    total: int
+    done: int
+    failed: int
+
+    @property
+    def finished(self) -> bool:
+        return self.done + self.failed >= self.total
+
+
+def consumer_name(index: int = 0) -> str:
+    """
+    Returns the name of a consumer of this process, unique across the replicas.
+    """
+    return f"{socket.gethostname()}-{os.getpid()}-{index}"
+
+
+class WorkQueue:
+    """
+    A queue of the work items of distributed simulation runs, shared by every simulator replica through
+    a Redis stream and its consumer group.
+
+    Each item is delivered to a single consumer, which holds a lease on it while it is processed: the item
+    stays pending in the group until the consumer acknowledges it, and the consumer keeps resetting its idle
+    time meanwhile. An item idle for longer than the lease, because its consumer stopped or lost Redis, is
+    reclaimed by the next consumer reading the queue. An item whose processing failed is retried the same
+    way after the lease, until it has failed max_deliveries times. Acknowledged items are deleted from the
+    stream.
+
+    The progress of each run is tracked next to the stream, in the sets of the pairs written and of the pairs
+    that failed, so the coordinator of the run can tell when it is finished whichever replicas wrote it.
+    The keys of a run expire after `ttl` seconds, and the items of a run whose keys are gone are discarded
+    without being processed.
+    """
+
+    def __init__(
+        self,
+        redis_client: AsyncRedisClient,
+        lease: float = QUEUE_LEASE,
+        max_deliveries: int = QUEUE_MAX_DELIVERIES,
+        block: float = QUEUE_BLOCK,
+        ttl: int = int(SIMULATION_RUN_TIMEOUT + QUEUE_LEASE),
+        stream: str = RedisKeys.SIMULATION_WORK.value,
+        group: str = RedisKeys.SIMULATION_WORKERS_GROUP.value,
+    ):
+        """
+        Initializes the queue with the client it is shared through, the lease and the time a read blocks
+        for new items in seconds, and the expiry of the keys of a run in seconds.
+        """
+        self.redis_client = redis_client
+        self.lease = lease
+        self.max_deliveries = max_deliveries
+        self.block = block
+        self.ttl = ttl
+        self.stream = stream
+        self.group = group
+
+    async def create_group(self) -> None:
+        """
+        Creates the consumer group, and the stream with it, unless it exists.
+        """
+        try:
+            await self.redis_client.redis.xgroup_create(
+                self.stream, self.group, id="0", mkstream=True
+            )
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def enqueue(self, run_id: UUID, items: List[WorkItem]) -> None:
+        """
+        Adds the work items of a run to the queue, together with its manifest, in one transaction.
+
+        Args:
+            run_id (UUID): The ID of the run.
+            items (List[WorkItem]): The work items of the run.
+
+        Returns:
+            None
+        """
+        await self.create_group()
+        manifest_key = simulation_run_key(str(run_id))
+        async with self.redis_client.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(manifest_key, mapping={"total": len(items)})
+            pipe.expire(manifest_key, self.ttl)
+            for item in items:
+                pipe.xadd(self.stream, item.to_fields())
+            await pipe.execute()
+
+    async def progress(self, run_id: UUID) -> RunProgress:
+        """
+        Returns the progress of a run, which has no items once its keys are gone.
+        """
+        async with self.redis_client.redis.pipeline(transaction=False) as pipe:
+            pipe.hget(simulation_run_key(str(run_id)), "total")
+            pipe.scard(simulation_run_key(str(run_id), "done"))
+            pipe.scard(simulation_run_key(str(run_id), "failed"))
+            total, done, failed = await pipe.execute()
+        return RunProgress(int(total or 0), done, failed)
+
+    async def wait(
+        self,
+        run_id: UUID,
+        timeout: float = SIMULATION_RUN_TIMEOUT,
+        poll_interval: float = QUEUE_POLL_INTERVAL,
+    ) -> RunProgress:
+        """
+        Waits until every work item of a run is written or failed.
+
+        Args:
+            run_id (UUID): The ID of the run.
+            timeout (float): Seconds to wait at most.
+            poll_interval (float): Seconds between the reads of the progress of the run.
+
+        Returns:
+            RunProgress: The progress of the finished run.
+
+        Raises:
+            TimeoutError: If the run is not finished within the timeout.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            progress = await self.progress(run_id)
+            if progress.finished:
+                return progress
+            if loop.time() >= deadline:
+                raise TimeoutError(
+                    f"Only {progress.done + progress.failed} of the {progress.total} work items "
+                    f"of run {run_id} finished within {timeout}s"
+                )
+            await asyncio.sleep(poll_interval)
+
+    async def close_run(self, run_id: UUID) -> None:
+        """
+        Deletes the keys of a run, so its remaining items are discarded, and removes the consumers that
+        have been idle for longer than the keys of a run live, such as those of stopped replicas.
+        """
+        await self.redis_client.delete_keys(
+            simulation_run_key(str(run_id)),
+            *(simulation_run_key(str(run_id), part) for part in RUN_PARTS),
+        )
+        for consumer in await self.redis_client.redis.xinfo_consumers(
+            self.stream, self.group
+        ):
+            if not consumer["pending"] and consumer["idle"] > self.ttl * 1000:
+                await self.redis_client.redis.xgroup_delconsumer(
+                    self.stream, self.group, consumer["name"]
+                )
+
+    async def claim(self, consumer: str) -> Optional[Tuple[str, Optional[WorkItem]]]:
+        """
+        Leases the next work item to a consumer: an item whose lease expired, or else a new item, waiting
+        up to `block` seconds for one.
+
+        Args:
+            consumer (str): The name of the consumer.
+
+        Returns:
+            Optional[Tuple[str, Optional[WorkItem]]]: The ID of the stream entry and its item, which is
+                None if the entry was deleted meanwhile, or None if there is no item.
+        """
+        redis = self.redis_client.redis
+        _, entries, *_ = await redis.xautoclaim(
+            self.stream,
+            self.group,
+            consumer,
+            min_idle_time=int(self.lease * 1000),
+            count=1,
+        )
+        if entries:
+            SIMULATION_WORK_ITEMS.labels("reclaimed").inc()
+        else:
+            response = await redis.xreadgroup(
+                self.group,
+                consumer,
+                {self.stream: ">"},
+                count=1,
+                block=int(self.block * 1000),
+            )
+            entries = [
+                entry
+                for _, stream_entries in response or []
+                for entry in stream_entries
+            ]
+        if not entries:
+            return None
+        entry_id, fields = entries[0]
+        return entry_id, WorkItem.from_fields(fields) if fields else None
+
+    async def renew(self, consumer: str, entry_id: str) -> None:
+        """
+        Renews the lease of a consumer on a work item, resetting its idle time.
+        """
+        await self.redis_client.redis.xclaim(
+            self.stream,
+            self.group,
+            consumer,
+            min_idle_time=0,
+            message_ids=[entry_id],
+            justid=True,
+        )
+
+    async def is_active(self, run_id: UUID) -> bool:
+        """
+        Returns whether the items of a run are still to be processed.
+        """
+        return bool(
+            await self.redis_client.redis.exists(simulation_run_key(str(run_id)))
+        )
+
+    async def complete(self, entry_id: str, item: WorkItem) -> None:
+        """
+        Records a work item as written and acknowledges it, in one transaction.
+        """
+        done_key = simulation_run_key(str(item.run_id), "done")
+        async with self.redis_client.redis.pipeline(transaction=True) as pipe:
+            pipe.sadd(done_key, item.pair)
+            pipe.expire(done_key, self.ttl)
+            pipe.xack(self.stream, self.group, entry_id)
+            pipe.xdel(self.stream, entry_id)
+            await pipe.execute()
+
+    async def fail(self, entry_id: str, item: WorkItem) -> bool:
+        """
+        Counts a failed delivery of a work item. Once it failed max_deliveries times, it is recorded as
+        failed and acknowledged, otherwise it stays pending and is retried once its lease expires.
+
+        Returns:
+            bool: Whether the item was given up on.
+        """
+        attempts_key = simulation_run_key(str(item.run_id), "attempts")
+        failed_key = simulation_run_key(str(item.run_id), "failed")
+        async with self.redis_client.redis.pipeline(transaction=True) as pipe:
+            pipe.hincrby(attempts_key, item.pair, 1)
+            pipe.expire(attempts_key, self.ttl)
+            attempts, _ = await pipe.execute()
+        if attempts < self.max_deliveries:
+            return False
+
+        async with self.redis_client.redis.pipeline(transaction=True) as pipe:
+            pipe.sadd(failed_key, item.pair)
+            pipe.expire(failed_key, self.ttl)
+            pipe.xack(self.stream, self.group, entry_id)
+            pipe.xdel(self.stream, entry_id)
+            await pipe.execute()
+        return True
+
+    async def discard(self, entry_id: str) -> None:
+        """
+        Acknowledges a work item without processing it.
+        """
+        async with self.redis_client.redis.pipeline(transaction=True) as pipe:
+            pipe.xack(self.stream, self.group, entry_id)
+            pipe.xdel(self.stream, entry_id)
+            await pipe.execute()
+
+    async def consume(
+        self, consumer: str, process: Callable[[WorkItem], Awaitable[Any]]
+    ) -> None:
+        """
+        Processes the work items of the queue one at a time until cancelled, and reconnects after errors.
+        An item is acknowledged once it is processed, and counted as a failed delivery if processing
+        raises. Items of the runs that are no longer active are discarded.
+
+        Args:
+            consumer (str): The name of the consumer, unique across the replicas.
+            process (Callable[[WorkItem], Awaitable[Any]]): Writes the data points of a work item.
+                It may be called more than once for the same item.
+
+        Returns:
+            None
+        """
+        while True:
+            try:
+                await self.create_group()
+                while True:
+                    claimed = await self.claim(consumer)
+                    if claimed is not None:
+                        await self._process(consumer, *claimed, process)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Error consuming simulation work items: {e}")
+                await asyncio.sleep(QUEUE_RECONNECT_DELAY)
+
+    async def _process(
+        self,
+        consumer: str,
+        entry_id: str,
+        item: Optional[WorkItem],
+        process: Callable[[WorkItem], Awaitable[Any]],
+    ) -> None:
+        if item is None or not await self.is_active(item.run_id):
+            await self.discard(entry_id)
+            SIMULATION_WORK_ITEMS.labels("discarded").inc()
+            return
+
+        renewal = asyncio.create_task(self._keep_leased(consumer, entry_id))
+        try:
+            await process(item)
+        except Exception as e:
+            error = e
+        else:
+            error = None
+        finally:
+            renewal.cancel()
+            with suppress(asyncio.CancelledError):
+                await renewal
+
+        if error is None:
+            await self.complete(entry_id, item)
+            SIMULATION_WORK_ITEMS.labels("completed").inc()
+            return
+
+        gave_up = await self.fail(entry_id, item)
+        SIMULATION_WORK_ITEMS.labels("failed" if gave_up else "retried").inc()
+        logging.error(
+            f"Error simulating LLM {item.llm_name} for metric {item.metric_name}"
+            f"{', giving up' if gave_up else ', retrying once its lease expires'}: {error}"
+        )
+
+    async def _keep_leased(self, consumer: str, entry_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await self.renew(consumer, entry_id)
+            except Exception as e:
+                logging.error(f"Error renewing the lease of work item {entry_id}: {e}")
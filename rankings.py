@@ -0,0 +1,140 @@
+from datetime import datetime
+from itertools import groupby
+from typing import Any, Iterable, List, Optional, Tuple
+
+import orjson
+
+from database import AggregateStatistic
+
+
+def rankings_payload(
+    rankings: Iterable[Tuple[str, Optional[str], Optional[float], int]]
+) -> List[dict]:
+    """
+    Builds the payload of the rankings of every metric from the rows of get_metric_rankings.
+    Metrics without any simulations get an empty ranking.
+
+    Args:
+        rankings (Iterable[Tuple[str, Optional[str], Optional[float], int]]): The metric name,
+            LLM name, mean value and rank of each row, ordered by metric and rank.
+
+    Returns:
+        List[dict]: One {metric_name: ranking} dict per metric.
+    """
+    results = []
+    for metric_name, rows in groupby(rankings, key=lambda row: row[0]):
+        rounded_simulations = [
+            {"llm_name": row[1], "mean_value": round(row[2], 2)}
+            for row in rows
+            if row[1] is not None
+        ]
+        results.append({metric_name: rounded_simulations})
+    return results
+
+
+def metric_rankings_payload(
+    metric_name: str,
+    simulations: Iterable[Tuple[str, Optional[float]]],
+    statistic: AggregateStatistic = AggregateStatistic.MEAN,
+) -> dict:
+    """
+    Builds the payload of the rankings of a metric by a statistic from the rows of get_metric_statistic_by_llm.
+
+    Args:
+        metric_name (str): The name of the metric.
+        simulations (Iterable[Tuple[str, Optional[float]]]): The LLM name and statistic value of each row.
+        statistic (AggregateStatistic): The statistic the LLMs are ranked by.
+
+    Returns:
+        dict: The {metric_name: ranking} dict of the metric.
+    """
+    value_key = f"{statistic.value}_value"
+    rounded_simulations = [
+        {"llm_name": sim[0], value_key: round(sim[1], 2)}
+        for sim in simulations
+        if sim[1] is not None
+    ]
+    return {metric_name: rounded_simulations}
+
+
+def metric_history_payload(
+    metric_name: str,
+    history: Iterable[Tuple[str, datetime, Optional[float]]],
+    statistic: AggregateStatistic = AggregateStatistic.MEAN,
+) -> dict:
+    """
+    Builds the payload of the history of a metric by a statistic from the rows of get_metric_history.
+
+    Args:
+        metric_name (str): The name of the metric.
+        history (Iterable[Tuple[str, datetime, Optional[float]]]): The LLM name, bucket start and
+            statistic value of each row, ordered by LLM name and bucket.
+        statistic (AggregateStatistic): The statistic of the history.
+
+    Returns:
+        dict: The {metric_name: series} dict of the metric, with one time series per LLM.
+    """
+    value_key = f"{statistic.value}_value"
+    series = []
+    for llm_name, rows in groupby(history, key=lambda row: row[0]):
+        points = [
+            {"time": row[1].isoformat(), value_key: round(row[2], 2)}
+            for row in rows
+            if row[2] is not None
+        ]
+        series.append({"llm_name": llm_name, "series": points})
+    return {metric_name: series}
+
+
+def render_payload(value: Any) -> bytes:
+    """
+    Renders a ranking payload to the JSON bytes it is cached and served as.
+    """
+    return orjson.dumps(value)
+
+
+def render_data(body: bytes) -> bytes:
+    """
+    Wraps a rendered payload in the {"data": payload} body of the ranking responses, without parsing it.
+    """
+    return b'{"data":' + body + b"}"
+
+
+def encode_cache_entry(
+    body: bytes, generation: int, fresh_until: Optional[float] = None
+) -> bytes:
+    """
+    Encodes a rendered ranking payload with the generation it was computed from.
+
+    The entry is a JSON header line followed by the payload as rendered by render_payload, so
+    reading an entry only parses its header and the payload can be served as is.
+
+    Args:
+        body (bytes): The rendered payload.
+        generation (int): The generation of the rankings the payload was computed from.
+        fresh_until (Optional[float]): The timestamp the entry turns stale at. None keeps it fresh
+            until the generation changes, which is how the simulator publishes the rankings.
+
+    Returns:
+        bytes: The cache entry.
+    """
+    header = orjson.dumps({"generation": generation, "fresh_until": fresh_until})
+    return header + b"\n" + body
+
+
+def decode_cache_entry(cached_entry: Optional[bytes]) -> Optional[dict]:
+    """
+    Returns the header of the entry stored under a key with its rendered payload under "value",
+    None if it is missing or is not a cache entry.
+    """
+    if cached_entry is None:
+        return None
+    header, separator, body = cached_entry.partition(b"\n")
+    if not separator:
+        # entries cached as a single JSON document before payloads were stored rendered
+        return None
+    entry = orjson.loads(header)
+    if not isinstance(entry, dict) or "generation" not in entry:
+        return None
+    entry["value"] = body
+    return entry
@@ -1,37 +1,93 @@
 import os
 from enum import Enum
+from typing import Callable, Dict, List, Optional
 
 import redis
+import redis.asyncio as aioredis
 from dotenv import load_dotenv
 
 load_dotenv()
 
 REDIS_HOST = os.getenv("REDIS_HOST", "")
 REDIS_PORT = os.getenv("REDIS_PORT", "")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "5"))
+REDIS_SOCKET_CONNECT_TIMEOUT = float(os.getenv("REDIS_SOCKET_CONNECT_TIMEOUT", "5"))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
 
 
 class RedisKeys(Enum):
     BENCHMARKS = "benchmarks"
     METRIC_BENCHMARKS = "benchmarks_metric"
+    BENCHMARKS_GENERATION = "benchmarks_generation"
+    BENCHMARKS_CHANNEL = "benchmarks_updates"
+    MEASURED_BENCHMARKS = "measured_benchmarks"
+    MEASURED_METRIC_BENCHMARKS = "measured_benchmarks_metric"
     RETRY_BENCHMARKS = "retry_benchmarks"
     RETRY_BENCHMARKS_LOCK = "retry_benchmarks_lock"
+    SIMULATION_WORK = "simulation_work"
+    SIMULATION_WORKERS_GROUP = "simulation_workers"
+    SIMULATION_RUN = "simulation_run"
+
+
+def metric_benchmarks_key(metric_name: str, statistic: str = "mean") -> str:
+    """
+    Returns the key caching the rankings of a metric by the given statistic.
+    The mean rankings keep the key they were cached under before percentiles were added.
+    """
+    key = f"{RedisKeys.METRIC_BENCHMARKS.value}:{metric_name}"
+    if statistic == "mean":
+        return key
+    return f"{key}:{statistic}"
+
+
+def measured_metric_benchmarks_key(metric_name: str, statistic: str = "mean") -> str:
+    """
+    Returns the key caching the rankings of a metric by the given statistic of its measurements.
+    """
+    return f"{RedisKeys.MEASURED_METRIC_BENCHMARKS.value}:{metric_name}:{statistic}"
+
+
+def simulation_run_key(run_id: str, part: Optional[str] = None) -> str:
+    """
+    Returns the key tracking the work items of a distributed simulation run: its manifest, or one of
+    its sets and counters when a part is given, e.g. done for the set of the items written.
+    """
+    key = f"{RedisKeys.SIMULATION_RUN.value}:{run_id}"
+    if part is None:
+        return key
+    return f"{key}:{part}"
+
+
+def _connection_kwargs() -> dict:
+    return {
+        "host": REDIS_HOST,
+        "port": REDIS_PORT,
+        "max_connections": REDIS_MAX_CONNECTIONS,
+        "socket_timeout": REDIS_SOCKET_TIMEOUT,
+        "socket_connect_timeout": REDIS_SOCKET_CONNECT_TIMEOUT,
+        "health_check_interval": REDIS_HEALTH_CHECK_INTERVAL,
+    }
 
 
 class RedisClient:
     """
     A client for interacting with a Redis database.
+    Use get_redis_client to share a single connection pool across the process.
     """
 
-    def __init__(self):
+    def __init__(self, connection_pool: Optional[redis.ConnectionPool] = None):
         """
         Initializes a new instance of the RedisClient class.
-        Connects to a Redis server.
+        Connects to a Redis server through the given connection pool, or a new one.
         """
-        self.redis = redis.Redis(host=REDIS_HOST, port=REDIS_PORT)
+        if connection_pool is None:
+            connection_pool = redis.ConnectionPool(**_connection_kwargs())
+        self.redis = redis.Redis(connection_pool=connection_pool)
 
     def delete_key(self, key: str):
         """
-        Deletes a key from the Redis database if it exists and has a value.
+        Deletes a key from the Redis database. Missing keys are ignored.
 
         Args:
             key (str): The key to delete from the Redis database.
@@ -39,7 +95,244 @@ class RedisClient:
         Returns:
             None
         """
-        if self.redis.exists(key):
-            value = self.redis.get(key)
-            if value:
-                self.redis.delete(key)
+        self.redis.delete(key)
+
+    def delete_keys(self, *keys: str):
+        """
+        Deletes several keys from the Redis database in a single round trip.
+
+        Args:
+            *keys (str): The keys to delete from the Redis database.
+
+        Returns:
+            None
+        """
+        if keys:
+            self.redis.delete(*keys)
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        """
+        Retrieves the values of several keys in a single round trip.
+
+        Args:
+            keys (List[str]): The keys to retrieve from the Redis database.
+
+        Returns:
+            List[Optional[bytes]]: The values in the same order as the keys, None for missing keys.
+        """
+        if not keys:
+            return []
+        return self.redis.mget(keys)
+
+    def set_many(self, mapping: Dict[str, str], ex: Optional[int] = None):
+        """
+        Sets several keys in a single round trip.
+
+        Args:
+            mapping (Dict[str, str]): The keys and values to set in the Redis database.
+            ex (Optional[int]): Expiry of the keys in seconds. The keys do not expire if not provided.
+
+        Returns:
+            None
+        """
+        if not mapping:
+            return
+        if ex is None:
+            self.redis.mset(mapping)
+            return
+        with self.redis.pipeline(transaction=True) as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, value, ex=ex)
+            pipe.execute()
+
+    def incr_with_expiry(self, key: str, ex: int) -> int:
+        """
+        Increments a counter and refreshes its expiry atomically in a single round trip.
+
+        Args:
+            key (str): The key of the counter.
+            ex (int): Expiry of the counter in seconds.
+
+        Returns:
+            int: The value of the counter after the increment.
+        """
+        with self.redis.pipeline(transaction=True) as pipe:
+            pipe.incr(key)
+            pipe.expire(key, ex)
+            value, _ = pipe.execute()
+        return value
+
+    def publish_versioned(
+        self,
+        version_key: str,
+        build_mapping: Callable[[int], Dict[str, str]],
+        channel: Optional[str] = None,
+    ) -> int:
+        """
+        Sets several keys together with the next version of a version counter in one MULTI/EXEC,
+        so readers see either all the keys of the previous version or all the keys of the new one.
+        The transaction is retried if the counter changes before it executes.
+
+        Args:
+            version_key (str): The key of the version counter.
+            build_mapping (Callable[[int], Dict[str, str]]): Builds the keys and values to set
+                from the new version.
+            channel (Optional[str]): A pub/sub channel the new version is published to within
+                the same transaction.
+
+        Returns:
+            int: The new version.
+        """
+
+        def publish(pipe: redis.client.Pipeline) -> int:
+            version = int(pipe.get(version_key) or 0) + 1
+            mapping = build_mapping(version)
+            pipe.multi()
+            if mapping:
+                pipe.mset(mapping)
+            pipe.set(version_key, version)
+            if channel is not None:
+                pipe.publish(channel, version)
+            return version
+
+        return self.redis.transaction(publish, version_key, value_from_callable=True)
+
+
+class AsyncRedisClient:
+    """
+    An asyncio client for interacting with a Redis database.
+    Use get_async_redis_client to share a single connection pool across the process.
+    """
+
+    def __init__(self, connection_pool: Optional[aioredis.ConnectionPool] = None):
+        """
+        Initializes a new instance of the AsyncRedisClient class.
+        Connects to a Redis server through the given connection pool, or a new one.
+        """
+        if connection_pool is None:
+            connection_pool = aioredis.ConnectionPool(**_connection_kwargs())
+        self.redis = aioredis.Redis(connection_pool=connection_pool)
+
+    async def delete_keys(self, *keys: str):
+        """
+        Deletes several keys from the Redis database in a single round trip.
+
+        Args:
+            *keys (str): The keys to delete from the Redis database.
+
+        Returns:
+            None
+        """
+        if keys:
+            await self.redis.delete(*keys)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        """
+        Retrieves the values of several keys in a single round trip.
+
+        Args:
+            keys (List[str]): The keys to retrieve from the Redis database.
+
+        Returns:
+            List[Optional[bytes]]: The values in the same order as the keys, None for missing keys.
+        """
+        if not keys:
+            return []
+        return await self.redis.mget(keys)
+
+    async def set_many(self, mapping: Dict[str, str], ex: Optional[int] = None):
+        """
+        Sets several keys in a single round trip.
+
+        Args:
+            mapping (Dict[str, str]): The keys and values to set in the Redis database.
+            ex (Optional[int]): Expiry of the keys in seconds. The keys do not expire if not provided.
+
+        Returns:
+            None
+        """
+        if not mapping:
+            return
+        if ex is None:
+            await self.redis.mset(mapping)
+            return
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, value, ex=ex)
+            await pipe.execute()
+
+    async def set_many_if_version(
+        self,
+        mapping: Dict[str, str],
+        version_key: str,
+        version: int,
+        ex: Optional[int] = None,
+    ) -> bool:
+        """
+        Sets several keys in one MULTI/EXEC, provided a version counter still holds the given version.
+        The counter is watched until the transaction executes, so keys written under a newer version
+        by publish_versioned are never overwritten with values computed from an older one.
+
+        Args:
+            mapping (Dict[str, str]): The keys and values to set in the Redis database.
+            version_key (str): The key of the version counter.
+            version (int): The version the values were computed from.
+            ex (Optional[int]): Expiry of the keys in seconds. The keys do not expire if not provided.
+
+        Returns:
+            bool: Whether the keys were set.
+        """
+        if not mapping:
+            return True
+
+        async def set_if_version(pipe: aioredis.client.Pipeline) -> bool:
+            if int(await pipe.get(version_key) or 0) != version:
+                return False
+            pipe.multi()
+            for key, value in mapping.items():
+                pipe.set(key, value, ex=ex)
+            return True
+
+        return await self.redis.transaction(
+            set_if_version, version_key, value_from_callable=True
+        )
+
+    async def close(self):
+        """
+        Closes the client and disconnects every connection of its pool.
+        """
+        await self.redis.aclose(close_connection_pool=True)
+
+
+_redis_client: Optional[RedisClient] = None
+_async_redis_client: Optional[AsyncRedisClient] = None
+
+
+def get_redis_client() -> RedisClient:
+    """
+    Returns the process-wide RedisClient, creating its connection pool on first use.
+    """
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = RedisClient()
+    return _redis_client
+
+
+def get_async_redis_client() -> AsyncRedisClient:
+    """
+    Returns the process-wide AsyncRedisClient, creating its connection pool on first use.
+    """
+    global _async_redis_client
+    if _async_redis_client is None:
+        _async_redis_client = AsyncRedisClient()
+    return _async_redis_client
+
+
+async def close_async_redis_client():
+    """
+    Closes the process-wide AsyncRedisClient if it was created.
+    """
+    global _async_redis_client
+    if _async_redis_client is not None:
+        await _async_redis_client.close()
+        _async_redis_client = None
@@ -0,0 +1,102 @@
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+from uuid import uuid4
+
+from dotenv import load_dotenv
+from pyinstrument import Profiler
+from pyinstrument.renderers import SpeedscopeRenderer
+
+from logger import logging
+
+load_dotenv()
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# held while a profile is recorded and written, profilers running concurrently in a process slow each other down
+_profiling = threading.Lock()
+# renders and writes the profiles, so the event loop is not blocked while they are written
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profile-writer")
+
+
+def should_profile(requested: bool = False) -> bool:
+    """
+    Returns whether to profile an operation: always when it was requested, otherwise for a
+    PROFILE_SAMPLE_RATE fraction of the operations. With the default rate of 0 it never samples.
+    """
+    return requested or (
+        PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+    )
+
+
+@contextmanager
+def profiled(
+    name: str, requested: bool = False, directory: Optional[str] = None
+) -> Iterator[Optional[Profiler]]:
+    """
+    Profiles the block with a statistical profiler if should_profile selects it, and writes the profile
+    in the speedscope format, which https://www.speedscope.app renders as a flame graph, to a file
+    named after the operation.
+
+    The profiler only samples the task or thread that entered the block, so the profile of a request
+    does not include the requests it ran concurrently with. Work handed to threads or processes is
+    not sampled, only the time spent waiting for it. A process records one profile at a time, blocks
+    selected while another one is profiled or written run without profiling. Profiles are written in
+    the background, see wait_for_profiles.
+
+    Args:
+        name (str): The operation profiled, e.g. the method and path of a request.
+        requested (bool): Whether profiling was requested for this operation, regardless of the sample rate.
+        directory (Optional[str]): The directory of the profiles. Defaults to PROFILE_DIR.
+
+    Yields:
+        Optional[Profiler]: The running profiler, or None when the block is not profiled.
+    """
+    if not should_profile(requested) or not _profiling.acquire(blocking=False):
+        yield None
+        return
+
+    try:
+        profiler = Profiler(interval=PROFILE_INTERVAL, async_mode="enabled")
+        profiler.start()
+    except Exception:
+        _profiling.release()
+        raise
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        _writer.submit(_write_profile, profiler, name, directory or PROFILE_DIR)
+
+
+def _write_profile(profiler: Profiler, name: str, directory: str) -> None:
+    path = _profile_path(name, directory)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(profiler.output(SpeedscopeRenderer()))
+        logging.info(f"Wrote the profile of {name} to {path}")
+    except Exception as e:
+        logging.error(f"Error writing the profile of {name}: {e}")
+    finally:
+        _profiling.release()
+
+
+def wait_for_profiles() -> None:
+    """
+    Waits until the profiles recorded so far are written.
+    """
+    _writer.submit(lambda: None).result()
+
+
+def _profile_path(name: str, directory: str) -> Path:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_") or "profile"
+    timestamp = time.strftime("%Y%m%dT%H%M%S")
+    return Path(directory) / f"{slug}-{timestamp}-{uuid4().hex[:8]}.speedscope.json"
@@ -0,0 +1,208 @@
+import time
+from typing import Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# the statements labelled by their own name, any other statement is labelled OTHER
+QUERY_OPERATIONS = frozenset(
+    ["SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "CREATE", "DROP", "ALTER"]
+)
+
+# buckets from a cached response to a cold rankings query
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+# buckets from writing a single pair to a whole simulation run
+SIMULATION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time until the response to a request starts, by route template.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "ranking_cache_lookups_total",
+    "Lookups of the ranking cache by key family. The result is local_hit or redis_hit for fresh values, "
+    "stale when a stale value is served while it is recomputed, and miss when the request waits for it.",
+    ["family", "result"],
+)
+QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Duration of the SQL statements executed by SQLAlchemy, by statement type.",
+    ["engine", "operation"],
+    buckets=LATENCY_BUCKETS,
+)
+SIMULATION_RUN_DURATION = Histogram(
+    "simulation_run_duration_seconds",
+    "Duration of the simulation runs, from creating the run to publishing its rankings.",
+    ["status"],
+    buckets=SIMULATION_BUCKETS,
+)
+SIMULATION_GENERATE_DURATION = Histogram(
+    "simulation_generate_duration_seconds",
+    "Time to generate the data points of an LLM and metric pair, or in a batch of every metric of an LLM "
+    "or of every pair of a run.",
+    ["unit"],
+    buckets=LATENCY_BUCKETS,
+)
+SIMULATION_INSERT_DURATION = Histogram(
+    "simulation_insert_duration_seconds",
+    "Time to write the data points of an LLM and metric pair.",
+    buckets=LATENCY_BUCKETS,
+)
+SIMULATION_ROWS_WRITTEN = Counter(
+    "simulation_rows_written_total", "Data points written by the simulator."
+)
+SIMULATION_RETRIES = Counter(
+    "simulation_generate_retries_total",
+    "Failed attempts to generate the data points of a pair, scheduled for a retry or skipped after the last attempt.",
+    ["outcome"],
+)
+SIMULATION_WORK_ITEMS = Counter(
+    "simulation_work_items_total",
+    "Work items of distributed simulation runs handled by this replica, by outcome: completed, retried, "
+    "failed after the last delivery, discarded for a finished run, or reclaimed from a stalled consumer.",
+    ["outcome"],
+)
+MEASUREMENTS_INGESTED = Counter(
+    "measurements_ingested_total",
+    "Measurements received by the ingestion API, by outcome: written, overloaded when the request timed out "
+    "waiting for room in the queue, or failed when they could not be written.",
+    ["outcome"],
+)
+MEASUREMENTS_PENDING = Gauge(
+    "measurements_pending",
+    "Measurements queued or being written by the measurement writer of this process.",
+)
+MEASUREMENT_FLUSH_SIZE = Histogram(
+    "measurement_flush_size",
+    "Number of measurements written by each COPY of the measurement writer.",
+    buckets=(10, 100, 1000, 5000, 10000, 25000, 50000, 100000, 250000),
+)
+
+
+class MetricsMiddleware:
+    """
+    Records the duration of every HTTP request until its response starts, labelled with the template of
+    the route it matched, so the paths of a route share one series. Streaming responses are timed until
+    their headers are sent, not for as long as they stay open.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        recorded = False
+
+        def record(status: int) -> None:
+            nonlocal recorded
+            recorded = True
+            REQUEST_DURATION.labels(
+                scope["method"], _route_template(scope), str(status)
+            ).observe(time.perf_counter() - start)
+
+        async def send_and_record(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                record(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_record)
+        except Exception:
+            if not recorded:
+                record(500)
+            raise
+
+
+def _route_template(scope: Scope) -> str:
+    # the router stores the matched route in the scope, unmatched paths share one label
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def metrics_response(request: Request) -> Response:
+    """
+    Serves the metrics of this process in the Prometheus text format.
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+def key_family(key: str) -> str:
+    """
+    Returns the family of a cache key, the part before its first colon, e.g. benchmarks_metric for
+    the keys of every metric and statistic.
+    """
+    return key.split(":", 1)[0]
+
+
+def record_cache_lookup(key: str, result: str) -> None:
+    CACHE_LOOKUPS.labels(key_family(key), result).inc()
+
+
+def instrument_engine(engine: Engine, name: Optional[str] = None) -> None:
+    """
+    Records the duration of every statement the engine executes. The start times are kept on the
+    connection in a stack, since statements can run while another statement's cursor is open.
+    For an AsyncEngine, pass its sync_engine.
+
+    Args:
+        engine (Engine): The engine to instrument.
+        name (Optional[str]): The engine label. Defaults to the name of the engine's driver.
+    """
+    label = name or engine.dialect.driver
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["query_start_times"].pop()
+        QUERY_DURATION.labels(label, _operation(statement)).observe(
+            time.perf_counter() - start
+        )
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        # a failed statement never reaches after_cursor_execute
+        if context.connection is not None:
+            start_times = context.connection.info.get("query_start_times")
+            if start_times:
+                start_times.pop()
+
+
+def _operation(statement: str) -> str:
+    words = statement.split(None, 1)
+    operation = words[0].upper() if words else ""
+    return operation if operation in QUERY_OPERATIONS else "OTHER"